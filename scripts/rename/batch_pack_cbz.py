@@ -58,6 +58,9 @@ CBZ 输出位置（默认）：
     例如：python batch_pack_cbz.py "D:\\漫画库"
     或在目标文件夹内直接运行：python batch_pack_cbz.py
 
+基准测试：同目录下的 bench_batch_pack_cbz.py 生成合成漫画库并对扫描、预览、打包、
+更新、删除等场景计时，输出 JSON 结果（性能改动前后对比用）
+
 使用方法：
 python batch_pack_cbz.py [根目录] [选项]
 - 不传根目录时询问执行位置：默认（脚本所在目录）/ 手动输入 / 弹出窗口选择
@@ -65,7 +68,7 @@ python batch_pack_cbz.py [根目录] [选项]
 复制到目标目录运行（依赖自动自举）：
 - 脚本头部含 PEP 723 依赖声明，用 uv 直接运行即可自动安装 Pillow 并执行：
     uv run batch_pack_cbz.py
-- 若用系统 python 直接运行，需先安装 Pillow（见下方依赖说明）
+- 若用系统 python 直接运行，建议安装 Pillow（见下方依赖说明）
 
 命令行选项：
   root                根目录（缺省询问：默认脚本目录 / 手动输入 / 弹窗选择）
@@ -83,10 +86,94 @@ python batch_pack_cbz.py [根目录] [选项]
                       （数字后缀）/ ask 逐文件询问（缺省交互式询问）
   -d, --delete        打包成功后自动删除源文件夹（不询问）
   -k, --keep          打包后保留源文件夹（不询问，默认行为）
+  -j, --jobs N        并行打包进程数（缺省 1 串行；0 表示 CPU 核数）；卷号输入、
+                      语言选择、冲突询问等交互在打包前统一完成，输出顺序不变；
+                      --update 时为并行更新的进程数（缺省 1；--lang / --volume
+                      需要交互时总是串行）；--verify 时为校验进程数（缺省 CPU 核数）
+  --pillow            强制用 Pillow 读取图片宽高（旧行为；缺省只解析文件头，
+                      识别失败时才回退到 Pillow）
+  --no-cache          不使用页面元数据缓存（每次重新读取图片宽高）
+  --cache-file 文件   页面元数据缓存位置（缺省 %LOCALAPPDATA% 或
+                      $XDG_CACHE_HOME/batch_pack_cbz/page_cache.sqlite）
+  --cache-stats       结束时输出页面缓存命中统计
+  --profile 配置      打包时按设备配置转码页面（需要 Pillow，只缩小不放大，横向跨页
+                      按旋转后的分辨率限制；重新编码后反而更大的页保留原图）：
+                        kindle-pw5  1236×1648 灰度 JPEG q80（墨水屏）
+                        tablet-2k   1600×2560 JPEG q85
+                        webp-q85    原分辨率 WebP q85
+                      ComicInfo.xml 的页面大小/宽高按转码结果填写；串行时页面在
+                      CPU 核数个进程中并行转码
+  --optimize-lossless 无损优化页面（打包与 --update 均可用，像素不变，多进程并行）：
+                      JPEG 在段级别删除 EXIF/XMP/缩略图/IPTC/注释与 sRGB ICC（不解码，
+                      EXIF 方向非缺省时保留 EXIF）；PNG 删除文本/时间块、IDAT 以 zlib 最高
+                      级别重新压缩；三通道相同的 RGB PNG 转为灰度（需要 Pillow）；
+                      输出每个 CBZ 节省的字节数。--update 时总是整体重写 CBZ
+  --resume            续传上次中断（Ctrl+C / 掉电 / 磁盘写满）的打包：每次打包在缓存目录的
+                      journals/ 下记录计划、进行中与已完成的文件夹（逐条 fsync）；续传时
+                      跳过已完成、页面未变且 CBZ 通过完整性检查的文件夹，继续其余文件夹，
+                      删除模式下补删上次已完成但未删除的源文件夹。CBZ 总是先写临时文件、
+                      fsync 后原子替换到最终路径，中断不会留下截断的 CBZ；源文件夹只在其
+                      CBZ 通过完整性检查（大小、目录、条目数与日志一致）后删除
+  --incremental       增量打包（配合 -k 定期运行）：每个 CBZ 的 zip 注释中记录打包指纹
+                      （页面名/大小/mtime + title/series/writer/volume/语言）；
+                      指纹未变的文件夹直接跳过，不读取任何图片数据
+  --scan-threads N    并发扫描目录的线程数（缺省 8；SMB/NFS 网络共享上每次列目录
+                      都有网络往返，可调大到 32-64；1 为逐目录扫描），结束时显示扫描速率；
+                      -d 删除源文件夹时同样按此线程数并行（每个文件夹只列一次，
+                      Linux / macOS 用目录 fd + unlinkat），结束时显示删除速率（文件/秒）
   -y, --yes           跳过所有确认（打包确认、覆盖确认）
   --dry-run           仅预览计划内容，不实际创建 CBZ
   -u, --update        更新已有 CBZ 的 ComicInfo.xml（扫描 root 下所有 .cbz，重新生成
-                      并替换；支持与打包一致的 --lang / --volume，图片原样保留）
+                      并替换；支持与打包一致的 --lang / --volume，图片原样保留）；
+                      缺省原地修补（只追加新 ComicInfo.xml 与目录，几 KB I/O），
+                      中断后下次运行自动回滚；每个 CBZ 只 mmap 打开一次，只解析
+                      central directory；未变化页面的宽高沿用已有 ComicInfo.xml，
+                      只探测新增 / 变化的页（--pillow 时全部重新探测）；新 XML 与
+                      已有 XML 相同时跳过写入，重复运行只读 XML
+  --compact           更新模式下整体重写 CBZ，清除原地修补残留的无效字节
+                      （残留超过文件大小 10% 时自动压实）
+  --since TIME        更新模式只处理此后修改过的 CBZ（2026-10-01 / 12h / 7d）
+  --glob PATTERN      更新模式只处理相对路径或文件名匹配的 CBZ（可重复）
+  --series TEXT       更新模式只处理系列名包含该文本的 CBZ（不区分大小写）
+  --missing-lang      更新模式只处理 ComicInfo.xml 中没有 LanguageISO 的 CBZ
+                      （--since / --glob / --series 在打开任何归档前筛选）
+  --append-to CBZ     将 root 内的图片作为新页原地追加到已有 CBZ 末尾
+                      （页码接续，保留原 ComicInfo.xml 字段并更新 Pages）
+  --watch             监视模式（下载工具持续往 root 放入新文件夹时使用）：Linux 用 inotify
+                      （ctypes 调用 libc，空闲时不占 CPU），其余平台轮询目录 mtime；
+                      新增 / 变化的漫画文件夹在静默窗口内无任何文件变化、且不含
+                      .part / .crdownload 等下载临时文件时，按启动时选定的 --lang /
+                      --volume / --conflict / -d 设置只打包这些文件夹（不重新扫描整棵树，
+                      总是增量打包）；启动前已存在的文件夹不处理，不重命名文件夹
+  --watch-quiet 秒    监视模式的静默窗口（缺省 10）
+  --watch-interval 秒 无 inotify 时的轮询间隔（缺省 5）
+  --profile-report [JSON]
+                      打包结束时输出分阶段计时表：扫描、元数据推导、卷号推断、打包计划、
+                      写入归档（含页面解析 / 页面处理 / XML 生成）、文件夹重命名、删除源
+                      文件夹各自的墙钟与 CPU 时间、读写字节与读写系统调用次数（Linux），
+                      以及最慢的 10 个文件夹与峰值内存；给出文件名时另写 JSON，
+                      同时是 Chrome trace（chrome://tracing / Perfetto 打开）
+  --verify            校验 root 下所有 CBZ（root 也可以是单个 .cbz）；删除源文件夹或同步到
+                      备份前使用，多进程并行（-j，缺省 CPU 核数）：
+                      central directory 与本地文件头一致、条目数据区不重叠；每个条目的
+                      CRC32（STORED 条目对 mmap 原地计算，不复制数据）；ComicInfo.xml 的
+                      PageCount、<Pages> 页数、ImageSize 与图片条目一致，ImageWidth /
+                      ImageHeight 与实际宽高一致。输出吞吐量与有问题的 CBZ 列表，
+                      有问题时退出码为 1
+  --find-duplicates   查找 root 下重复的卷（只读）：CBZ 与散图文件夹的页面指纹为
+                      (大小, CRC32)，CBZ 直接取 central directory 中的 CRC，不读页面数据；
+                      散图按 大小 → 开头 64 KB → 整页 逐级过滤。报告完全重复（如带/不带
+                      (C108)、[DL] 的同一卷）、近似重复（共同页面 ≥ 90%，如多一张封面）
+                      与跨来源重复页面可回收的空间
+  --catalog [FILE]    建立 / 增量刷新书库目录（SQLite，缺省 root/.cbz_catalog.sqlite）：
+                      每个 CBZ 的路径、大小、mtime、作者、系列、卷号、语言、页数、
+                      每页大小与宽高、STORED 封面的偏移与长度；按 (大小, mtime)
+                      只重新读取变化的 CBZ（只读 central directory 与 ComicInfo.xml）。
+                      目录存在时打包、--update、--append-to 写出 CBZ 后随手登记
+  --catalog-query 名称
+                      刷新后执行内置查询：missing-lang（无 LanguageISO）、
+                      missing-volume（无卷号）、volume-gaps（系列缺卷）、
+                      no-dimensions（有页面缺少宽高）
 
 交互式流程：
 - 开头询问执行位置（root）：1 默认脚本所在目录（回车）/ 2 手动输入 / 3 弹出窗口选择
@@ -99,8 +186,20 @@ python batch_pack_cbz.py [根目录] [选项]
 - 以上各项均可通过命令行选项直接指定
   （root / --lang / --volume / -d / -k / --conflict）
 
+页面元数据缓存：
+- 图片宽高缓存在 SQLite 中：文件按 (设备, inode, 大小, mtime_ns)、CBZ 内条目按
+  (CRC32, 大小) 识别；打包、--update、--append-to 共用，重复运行几乎不再读取图片
+- 超过 100 万条时按最近使用时间淘汰；--no-cache 关闭，--cache-stats 查看命中率
+
+退出码：
+- 0：全部成功；1：有文件夹打包失败、CBZ 更新 / 追加失败、--verify 发现问题或发生错误；
+  130：被 Ctrl+C 中断
+
 依赖：
-- Pillow（读取图片宽高）
+- 图片宽高默认由内置文件头解析读取（只读前几 KB，不解码像素）：
+  JPEG（SOF）、PNG（IHDR）、WebP（VP8/VP8L/VP8X）、GIF、BMP、AVIF/HEIF（ispe）
+- Pillow（可选）：内置解析无法识别的格式（TIFF/ICO 等）回退使用；--pillow 强制使用。
+  未安装时打包与 --update 仍可运行，仅无法识别格式的页不写宽高
 - 复制脚本到任意目录后，推荐用 uv 直接运行（自动创建临时环境并安装 Pillow，不污染目标目录）：
     uv run batch_pack_cbz.py
 - 或在仓库脚本环境安装依赖：
@@ -111,15 +210,43 @@ from __future__ import annotations
 
 import argparse
 import contextlib
+import copy
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import hashlib
 import io
+import json
+import mmap
 import os
 import platform
 import re
+import select
 import shutil
+import sqlite3
+import struct
 import sys
+import threading
+import time
+import tracemalloc
 import unicodedata
 import zipfile
+import zlib
+from collections.abc import Callable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from datetime import datetime
 from pathlib import Path
+from stat import S_ISREG
+from typing import BinaryIO
+from xml.etree import ElementTree
 from xml.sax.saxutils import escape
 
 # Windows 下强制 UTF-8 输出，避免 ✓ / ▸ 等符号在 GBK 编码下崩溃
@@ -127,9 +254,14 @@ if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8", errors="replace")
 
 try:
-    from PIL import Image
+    import resource
+except ImportError:  # Windows 无 resource 模块，峰值内存改用 tracemalloc
+    resource = None
+
+try:
+    from PIL import Image, ImageChops, ImageOps
 except ImportError:  # pragma: no cover - 便于给出友好提示
-    Image = None
+    Image = ImageChops = ImageOps = None
 
 # 支持的图片格式（与 batch_rename_images.py 保持一致）
 IMAGE_EXTENSIONS = {
@@ -360,66 +492,186 @@ def detect_volume(name: str) -> tuple[str, int | None]:
     return name, None
 
 
-def infer_volumes(metas: list[dict]) -> dict[Path, int | None]:
+class VolumeEntry:
+    """
+    卷号推断的输入记录：key（文件夹 / CBZ 路径）、series_key（系列分组键）、
+    explicit（显式卷号，detect_volume 的结果，每条只检测一次）
+
+    使用 __slots__：十万级条目时每条只占固定的几个槽位，内存随条目数线性增长
+    """
+
+    __slots__ = ("key", "series_key", "explicit")
+
+    def __init__(self, key: Path, series_key: str, explicit: int | None):
+        self.key = key
+        self.series_key = series_key
+        self.explicit = explicit
+
+
+class _SeriesVolumes:
+    """单个系列的聚合：无显式卷号的条目数与最大显式卷号（一遍累加，不保留成员列表）"""
+
+    __slots__ = ("no_vol", "max_vol")
+
+    def __init__(self) -> None:
+        self.no_vol = 0
+        self.max_vol = 0
+
+
+def infer_series_volumes(entries: list[VolumeEntry]) -> dict[Path, int | None]:
     """
-    推断每个漫画文件夹的卷号（含"无卷号推断为第 1 卷"的规则）
+    系列级卷号推断（打包与 --update 共用的唯一实现）
 
     规则：
     1. 显式卷号：从标题检测（末尾 " 1"、"#1"、"Vol.1" 或内嵌 "3〜"），检测到则使用
     2. 推断卷号：同一系列（series_key）下存在大于 1 的显式卷号，
-       且"无显式卷号"的漫画恰好只有 1 本时，将该本推断为第 1 卷
+       且"无显式卷号"的条目恰好只有 1 个时，将该条推断为第 1 卷
        （例：系列同时有 系列A2、系列A3 时，"系列A" 推断为 Vol.1）
     3. 其余情况无卷号（None，不生成 <Volume>）
 
-    metas: derive_metadata 结果，须含 "folder"、"title"、"series_key"
+    两遍线性扫描：第一遍按系列累加（无卷号数、最大卷号），第二遍逐条判定，
+    时间与内存均为 O(条目数)，与单个系列的卷数无关
 
     Returns:
-        {folder: 卷号或 None}
+        {key: 卷号或 None}
     """
-    explicit = {m["folder"]: detect_volume(m["title"])[1] for m in metas}
-    groups: dict[str, list[Path]] = {}
-    for m in metas:
-        groups.setdefault(m["series_key"], []).append(m["folder"])
+    groups: dict[str, _SeriesVolumes] = {}
+    for entry in entries:
+        group = groups.get(entry.series_key)
+        if group is None:
+            group = groups[entry.series_key] = _SeriesVolumes()
+        if entry.explicit is None:
+            group.no_vol += 1
+        elif entry.explicit > group.max_vol:
+            group.max_vol = entry.explicit
 
     result: dict[Path, int | None] = {}
-    for m in metas:
-        folder = m["folder"]
-        vol = explicit[folder]
+    for entry in entries:
+        vol = entry.explicit
         if vol is None:
-            siblings = groups[m["series_key"]]
-            no_vol = [p for p in siblings if explicit[p] is None]
-            has_vol = [explicit[p] for p in siblings if explicit[p] is not None]
-            if len(no_vol) == 1 and has_vol and max(has_vol) > 1:
+            group = groups[entry.series_key]
+            if group.no_vol == 1 and group.max_vol > 1:
                 vol = 1
-        result[folder] = vol
+        result[entry.key] = vol
     return result
 
 
+def infer_volumes(metas: list[dict]) -> dict[Path, int | None]:
+    """
+    推断每个漫画文件夹的卷号（规则见 infer_series_volumes）
+
+    metas: derive_metadata 结果，须含 "folder"、"title"、"series_key"
+
+    Returns:
+        {folder: 卷号或 None}
+    """
+    return infer_series_volumes(
+        [VolumeEntry(m["folder"], m["series_key"], detect_volume(m["title"])[1]) for m in metas]
+    )
+
+
 def get_image_files(folder: Path) -> list[Path]:
     """获取文件夹中直接包含的图片文件（未排序）"""
     return [f for f in folder.iterdir() if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS]
 
 
-def find_comic_folders(root: Path) -> list[tuple[Path, int]]:
+def walk_directories(root: Path, list_dir, threads: int = 1):
     """
-    递归查找所有"直接包含图片"的文件夹
+    并发遍历目录树：list_dir(目录) -> (子目录列表, 结果)，逐个产出 (目录, 结果)
 
-    Returns:
-        [(文件夹路径, 相对根目录的深度)]，深度 0 表示根目录本身
+    threads > 1 时用线程池同时列出多个目录（列目录 / stat 在等待 I/O 时释放 GIL），
+    NAS / SMB / NFS 上每次列目录的网络往返可以重叠，不再按目录数串行累加；
+    产出顺序为完成顺序，调用方自行排序。无法读取的目录（OSError）静默跳过
+
+    注意：与 batch_rename_images.py 中的 walk_directories 逐字相同（两个脚本各自独立运行，
+    不共享模块），修改时必须同时修改两处
+    """
+    if threads <= 1:
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                subdirs, result = list_dir(directory)
+            except OSError:
+                continue
+            stack.extend(subdirs)
+            yield directory, result
+        return
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = {pool.submit(list_dir, root): root}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory = pending.pop(future)
+                try:
+                    subdirs, result = future.result()
+                except OSError:
+                    continue
+                for sub in subdirs:
+                    pending[pool.submit(list_dir, sub)] = sub
+                yield directory, result
+
+
+def _list_library_dir(folder: Path) -> tuple[list[Path], tuple[list, list[Path]]]:
+    """scan_library 的单目录列举：一次 scandir，图片 stat 一次"""
+    subdirs: list[Path] = []
+    images: list[tuple[Path, os.stat_result]] = []
+    others: list[Path] = []
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(Path(entry.path))
+            elif entry.is_file():
+                suffix = os.path.splitext(entry.name)[1].lower()
+                if suffix in IMAGE_EXTENSIONS:
+                    images.append((Path(entry.path), entry.stat()))
+                elif suffix != ".cbz" and not entry.name.startswith(_CATALOG_NAME):
+                    others.append(Path(entry.path))  # 书库目录及其 -wal / -shm 不算源文件
+    return subdirs, (images, others)
+
+
+def scan_library(root: Path, threads: int = 1, stats: dict | None = None) -> dict[Path, dict]:
     """
-    comics: list[tuple[Path, int]] = []
+    单次 os.scandir 遍历建立库索引：每个目录只列一次，每张图片只 stat 一次
 
-    if get_image_files(root):
-        comics.append((root, 0))
+    预览、打包、删除前检查、重命名阶段都从索引读取，不再重复列目录 / stat
+    （与 os.walk 一致：不进入符号链接目录，无权限的目录静默跳过）
+    threads > 1 时并发列目录（--scan-threads，见 walk_directories）
+    stats: 传入 dict 时填入 "dirs"（扫描目录数）与 "seconds"（用时）
 
-    for dirpath, _dirnames, _filenames in os.walk(root):
-        folder = Path(dirpath)
-        if folder == root:
-            continue
-        if get_image_files(folder):
+    Returns:
+        {文件夹: {"depth": 相对根目录的深度,
+                  "images": [(图片路径, stat_result), ...]（按名称自然升序）,
+                  "others": [非图片、非 CBZ 文件路径, ...]}}
+        只收录直接包含图片的文件夹
+    """
+    start = time.perf_counter()
+    index: dict[Path, dict] = {}
+    dirs = 0
+    for folder, (images, others) in walk_directories(root, _list_library_dir, threads):
+        dirs += 1
+        if images:
+            images.sort(key=lambda item: natural_key(item[0].name))
             depth = len(folder.relative_to(root).parts)
-            comics.append((folder, depth))
+            index[folder] = {"depth": depth, "images": images, "others": others}
+    if stats is not None:
+        stats["dirs"] = dirs
+        stats["seconds"] = time.perf_counter() - start
+    return index
+
+
+def find_comic_folders(root: Path, index: dict[Path, dict] | None = None) -> list[tuple[Path, int]]:
+    """
+    递归查找所有"直接包含图片"的文件夹
 
+    index: scan_library 的结果（缺省时现场扫描）
+
+    Returns:
+        [(文件夹路径, 相对根目录的深度)]，深度 0 表示根目录本身
+    """
+    if index is None:
+        index = scan_library(root)
+    comics = [(folder, info["depth"]) for folder, info in index.items()]
     # 按相对路径自然升序（同系列聚在一起，系列内按名称/卷号排序）
     comics.sort(key=lambda item: natural_key(str(item[0].relative_to(root))))
     return comics
@@ -523,20 +775,597 @@ def derive_metadata(folder: Path, root: Path, depth: int) -> dict[str, str]:
     }
 
 
-def read_image_size(src: Path | bytes) -> tuple[int | None, int | None]:
-    """读取图片宽高（src 为文件路径或字节流，失败时返回 (None, None)）"""
+def comic_meta(folder: Path, root: Path, depth: int, images: list) -> dict:
+    """
+    预览 / 打包计划用的单个漫画元数据：derive_metadata 结果 + "folder"、"depth"、
+    "images"（[(图片路径, stat_result), ...]）、"series_key"、"series_display"
+    """
+    meta: dict = derive_metadata(folder, root, depth)
+    meta["folder"] = folder
+    meta["depth"] = depth
+    meta["images"] = images
+    # series 分组键：两层结构用外层系列文件夹路径，单层结构每本自成一组
+    meta["series_key"] = str(folder.parent) if depth >= 2 else str(folder)
+    # 系列头显示名：两层用外层文件夹名（含 [作者]），单层用本文件夹名
+    meta["series_display"] = folder.parent.name if depth >= 2 else folder.name
+    return meta
+
+
+# 头部解析每次读取的字节数（PNG/GIF/BMP/WebP 的宽高都在前 30 字节内）
+_PROBE_CHUNK = 4096
+
+# ISOBMFF（AVIF/HEIF）头部读取上限：meta 盒一般位于文件开头几 KB 内
+_ISOBMFF_HEAD = 65536
+
+# JPEG SOF 标记（C4 DHT、C8 JPG、CC DAC 不是帧头）
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _probe_jpeg(f, buf: bytes) -> tuple[int, int] | None:
+    """
+    逐段跳过 JPEG 标记段直到 SOF 帧头，读取宽高
+
+    只读取段头：大段（如 EXIF/ICC 的 APPn）按长度 seek 跳过，不读入内容
+    """
+    base, pos = 0, 2  # buf[0] 的绝对偏移、当前解析位置（跳过 SOI）
+    while True:
+        if pos + 9 > len(buf):
+            base += pos
+            f.seek(base)
+            buf, pos = f.read(_PROBE_CHUNK), 0
+            if len(buf) < 9:
+                return None
+        if buf[pos] != 0xFF:
+            return None
+        marker = buf[pos + 1]
+        if marker == 0xFF:  # 填充字节
+            pos += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # 无长度的独立标记
+            pos += 2
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / SOS：之后不会再有帧头
+            return None
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", buf[pos + 5 : pos + 9])
+            return width, height
+        pos += 2 + struct.unpack(">H", buf[pos + 2 : pos + 4])[0]
+
+
+def _iter_boxes(data: bytes, start: int, end: int):
+    """遍历 ISOBMFF 盒：产出 (类型, 内容起点, 内容终点)"""
+    while start + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[start : start + 8])
+        header = 8
+        if size == 1:
+            if start + 16 > end:
+                return
+            size = struct.unpack(">Q", data[start + 8 : start + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            return
+        yield box_type, start + header, min(start + size, end)
+        start += size
+
+
+def _probe_isobmff(data: bytes) -> tuple[int, int] | None:
+    """
+    从 AVIF/HEIF 的 meta/iprp/ipco 中读取 ispe（图像空间尺寸）
+
+    可能有多个 ispe（网格分块、缩略图），取面积最大者作为整图尺寸
+    """
+    best = None
+    for box, s, e in _iter_boxes(data, 0, len(data)):
+        if box != b"meta":
+            continue
+        # meta 为 FullBox：内容前有 4 字节 version/flags
+        for box2, s2, e2 in _iter_boxes(data, s + 4, e):
+            if box2 != b"iprp":
+                continue
+            for box3, s3, e3 in _iter_boxes(data, s2, e2):
+                if box3 != b"ipco":
+                    continue
+                for box4, s4, e4 in _iter_boxes(data, s3, e3):
+                    if box4 == b"ispe" and e4 - s4 >= 12:
+                        size = struct.unpack(">II", data[s4 + 4 : s4 + 12])
+                        if best is None or size[0] * size[1] > best[0] * best[1]:
+                            best = size
+    return best
+
+
+def probe_image_size(f) -> tuple[int, int] | None:
+    """
+    只解析文件头读取图片宽高（不解码像素，不依赖 Pillow）
+
+    f: 可 read/seek 的二进制文件对象（文件、io.BytesIO、zip 条目等）
+    支持：JPEG（SOF）、PNG（IHDR）、WebP（VP8/VP8L/VP8X）、GIF、BMP、
+    AVIF/HEIF（ISOBMFF ispe）；无法识别或数据不完整时返回 None
+    """
+    head = f.read(_PROBE_CHUNK)
+    size = None
+    if head[:8] == b"\x89PNG\r\n\x1a\n" and head[12:16] == b"IHDR":
+        size = struct.unpack(">II", head[16:24])
+    elif head[:6] in (b"GIF87a", b"GIF89a"):
+        size = struct.unpack("<HH", head[6:10])
+    elif head[:2] == b"BM" and len(head) >= 26:
+        if struct.unpack("<I", head[14:18])[0] == 12:  # OS/2 BITMAPCOREHEADER
+            size = struct.unpack("<HH", head[18:22])
+        else:
+            width, height = struct.unpack("<ii", head[18:26])
+            size = (width, abs(height))  # 高度为负表示自上而下存储
+    elif head[:4] == b"RIFF" and head[8:12] == b"WEBP" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+            width, height = struct.unpack("<HH", head[26:30])
+            size = (width & 0x3FFF, height & 0x3FFF)
+        elif chunk == b"VP8L" and head[20] == 0x2F:
+            bits = int.from_bytes(head[21:25], "little")
+            size = ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+        elif chunk == b"VP8X":
+            size = (
+                int.from_bytes(head[24:27], "little") + 1,
+                int.from_bytes(head[27:30], "little") + 1,
+            )
+    elif head[:3] == b"\xff\xd8\xff":
+        size = _probe_jpeg(f, head)
+    elif head[4:8] == b"ftyp":
+        size = _probe_isobmff(head + f.read(_ISOBMFF_HEAD - len(head)))
+    if size is None or size[0] <= 0 or size[1] <= 0:
+        return None
+    return size[0], size[1]
+
+
+def read_image_size(
+    src: Path | bytes | BinaryIO, force_pillow: bool = False
+) -> tuple[int | None, int | None]:
+    """
+    读取图片宽高（src 为文件路径、字节流或可 seek 的文件对象，失败时返回 (None, None)）
+
+    先用 probe_image_size 只读文件头；识别失败（TIFF/ICO/SVG、损坏文件等）
+    时再回退到 Pillow。force_pillow=True 时直接使用 Pillow（旧行为，--pillow）
+    src 为文件路径且启用了页面缓存时，先查缓存（见 page_info）
+    """
+    if isinstance(src, (str, Path)) and _page_cache is not None:
+        _, width, height = page_info(Path(src), force_pillow)
+        return width, height
+    return _read_image_size_uncached(src, force_pillow)
+
+
+def _read_image_size_uncached(
+    src: Path | bytes | BinaryIO, force_pillow: bool = False
+) -> tuple[int | None, int | None]:
+    """read_image_size 的实际读取逻辑（不查缓存）"""
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        src = io.BytesIO(src)
+    if not force_pillow:
+        try:
+            if hasattr(src, "read"):
+                size = probe_image_size(src)
+                src.seek(0)
+            else:
+                with open(src, "rb", buffering=0) as f:
+                    size = probe_image_size(f)
+            if size is not None:
+                return size
+        except (OSError, ValueError, struct.error):
+            pass
     if Image is None:
         return None, None
     try:
-        if isinstance(src, bytes):
-            with Image.open(io.BytesIO(src)) as im:
-                return im.width, im.height
         with Image.open(src) as im:
             return im.width, im.height
     except Exception:
         return None, None
 
 
+# ---- 页面元数据缓存（SQLite）----
+# 同一张图的宽高只需读取一次：打包预览、正式打包、之后的 --update 都复用缓存结果
+
+# 缓存条目上限：超出时按最近使用时间淘汰（LRU），约 60 字节/条
+_CACHE_MAX_ENTRIES = 1_000_000
+
+# 当前进程使用的缓存（main / 进程池初始化时打开，None 表示不使用缓存）
+_page_cache: PageCache | None = None
+
+
+def default_cache_path() -> Path:
+    """缓存文件默认位置：%LOCALAPPDATA% 或 $XDG_CACHE_HOME（缺省 ~/.cache）下"""
+    if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        base = Path(os.environ["LOCALAPPDATA"])
+    else:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return base / "batch_pack_cbz" / "page_cache.sqlite"
+
+
+class PageCache:
+    """
+    图片宽高持久化缓存：key -> (宽, 高, 字节数)
+
+    key 两种：
+    - 文件系统中的图片："f:设备:inode:大小:mtime_ns"（文件被修改/替换后自然失效）
+    - CBZ 内的条目："z:CRC32:大小"（取自 central directory，按内容识别，
+      同一张图无论在哪个 CBZ、是否改名都能命中）
+    命中的条目在 flush 时刷新使用时间；close 时超过上限的旧条目按 LRU 淘汰。
+    WAL 模式下多个打包进程（--jobs）可同时读写
+    """
+
+    def __init__(self, path: Path, max_entries: int = _CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.generation = int(time.time())
+        self.hits = 0
+        self.misses = 0
+        self._pending: dict[str, tuple[int, int, int]] = {}
+        self._touched: set[str] = set()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, width INTEGER, "
+            "height INTEGER, size INTEGER, used INTEGER) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_used ON pages(used)")
+        self.conn.commit()
+
+    def get(self, key: str) -> tuple[int, int, int] | None:
+        """查询缓存，返回 (宽, 高, 字节数) 或 None"""
+        row = self._pending.get(key)
+        if row is None:
+            row = self.conn.execute(
+                "SELECT width, height, size FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.add(key)
+        return row[0], row[1], row[2]
+
+    def put(self, key: str, width: int, height: int, size: int) -> None:
+        """记录一条结果（flush 时批量写入）"""
+        self._pending[key] = (width, height, size)
+
+    def flush(self) -> None:
+        """批量写入新条目并刷新命中条目的使用时间（一个事务）"""
+        if not (self._pending or self._touched):
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                ((k, w, h, s, self.generation) for k, (w, h, s) in self._pending.items()),
+            )
+            self.conn.executemany(
+                "UPDATE pages SET used = ? WHERE key = ? AND used < ?",
+                ((self.generation, k, self.generation) for k in self._touched),
+            )
+        self._pending.clear()
+        self._touched.clear()
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self, evict: bool = True) -> None:
+        """写入剩余结果；evict=True 时按 LRU 淘汰超出上限的条目"""
+        self.flush()
+        if evict:
+            excess = self.count() - self.max_entries
+            if excess > 0:
+                with self.conn:
+                    self.conn.execute(
+                        "DELETE FROM pages WHERE key IN "
+                        "(SELECT key FROM pages ORDER BY used LIMIT ?)",
+                        (excess,),
+                    )
+        self.conn.close()
+
+
+def open_page_cache(path: Path | None) -> None:
+    """打开当前进程的页面缓存（path 为 None 或打开失败时不使用缓存）"""
+    global _page_cache
+    if path is None:
+        return
+    try:
+        _page_cache = PageCache(path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"[提示] 页面缓存不可用（{e}），本次不使用缓存")
+        _page_cache = None
+
+
+def close_page_cache(evict: bool = True) -> None:
+    """关闭当前进程的页面缓存"""
+    global _page_cache
+    if _page_cache is not None:
+        with contextlib.suppress(sqlite3.Error):
+            _page_cache.close(evict)
+        _page_cache = None
+
+
+def print_cache_stats() -> None:
+    """输出页面缓存统计（--cache-stats）"""
+    cache = _page_cache
+    if cache is None:
+        print("页面缓存: 未启用")
+        return
+    cache.flush()
+    total = cache.hits + cache.misses
+    rate = f"{cache.hits / total:.1%}" if total else "-"
+    size_kb = (
+        sum(
+            p.stat().st_size
+            for p in (cache.path, cache.path.with_name(cache.path.name + "-wal"))
+            if p.exists()
+        )
+        / 1024
+    )
+    print(
+        f"页面缓存: 命中 {cache.hits} / 未命中 {cache.misses}（命中率 {rate}），"
+        f"共 {cache.count()} 条，{size_kb:.0f} KB — {cache.path}"
+    )
+
+
+# ---- 分阶段计时（--profile-report）----
+# 阶段键与显示名（报告按此顺序输出）
+PROFILE_PHASES = {
+    "scan": "扫描",
+    "metadata": "元数据推导",
+    "volume": "卷号推断",
+    "plan": "打包计划",
+    "write": "写入归档",
+    "probe": "  页面解析",
+    "process": "  页面处理",
+    "xml": "  XML 生成",
+    "rename": "文件夹重命名",
+    "delete": "删除源文件夹",
+}
+# 报告中列出的最慢文件夹数
+_PROFILE_SLOWEST = 10
+
+# 当前进程的计时器（--profile-report 时创建，None 表示不计时）
+_profiler: Profiler | None = None
+
+
+def _io_counters() -> dict[str, int] | None:
+    """
+    当前进程累计的读写字节数与读写类系统调用次数（Linux /proc/self/io 的
+    rchar / wchar / syscr / syscw，含命中页缓存的读写）；其他平台返回 None
+    """
+    try:
+        with open("/proc/self/io", "rb") as f:
+            fields = dict(line.split(b": ") for line in f.read().splitlines())
+    except (OSError, ValueError):
+        return None
+    return {
+        "read_bytes": int(fields[b"rchar"]),
+        "write_bytes": int(fields[b"wchar"]),
+        "read_calls": int(fields[b"syscr"]),
+        "write_calls": int(fields[b"syscw"]),
+    }
+
+
+class Profiler:
+    """
+    分阶段累计 墙钟时间 / CPU 时间（当前线程）/ 读写字节 / 读写系统调用次数，
+    同时记录 Chrome trace 事件（chrome://tracing、Perfetto 可直接打开）
+
+    读写计数为进程级差值：流水线内各线程并发的阶段（页面解析 / 页面处理）不计读写；
+    并行打包（--jobs）时子进程各有一个计时器，结果经 drain / merge 汇总到主进程
+    """
+
+    def __init__(self, worker: bool = False):
+        self.worker = worker
+        self.phases: dict[str, dict] = {}
+        self.events: list[dict] = []
+        self.folders: list[tuple[float, str]] = []
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        if resource is None and not worker:
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, detail: str | None = None, io: bool = True):
+        """计时一个阶段（可在任意线程中使用）；detail 为 trace 事件名（缺省阶段显示名）"""
+        io0 = _io_counters() if io else None
+        cpu0 = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - cpu0
+            io1 = _io_counters() if io0 is not None else None
+            counters = {k: io1[k] - io0[k] for k in io0} if io1 is not None else {}
+            self._add(name, 1, wall, cpu, counters)
+            event = {
+                "name": detail or PROFILE_PHASES.get(name, name).strip(),
+                "cat": name,
+                "ph": "X",
+                "ts": round(start * 1e6),
+                "dur": round(wall * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+            }
+            if counters:
+                event["args"] = counters
+            with self._lock:
+                self.events.append(event)
+
+    def _add(self, name: str, count: int, wall: float, cpu: float, counters: dict) -> None:
+        with self._lock:
+            stat = self.phases.setdefault(name, {"count": 0, "wall": 0.0, "cpu": 0.0})
+            stat["count"] += count
+            stat["wall"] += wall
+            stat["cpu"] += cpu
+            for key, value in counters.items():
+                stat[key] = stat.get(key, 0) + value
+
+    def drain(self) -> dict:
+        """取出并清空已记录的阶段与事件（子进程随打包结果返回给主进程）"""
+        with self._lock:
+            data = {"phases": self.phases, "events": self.events}
+            self.phases, self.events = {}, []
+        return data
+
+    def merge(self, data: dict) -> None:
+        """合并子进程 drain 的结果"""
+        for name, stat in data["phases"].items():
+            counters = {k: v for k, v in stat.items() if k not in ("count", "wall", "cpu")}
+            self._add(name, stat["count"], stat["wall"], stat["cpu"], counters)
+        with self._lock:
+            self.events.extend(data["events"])
+
+    def peak_memory(self) -> tuple[str, int] | None:
+        """峰值内存：(说明, 字节数)；有 resource 时为本进程与子进程的峰值 RSS"""
+        if resource is not None:
+            # ru_maxrss 在 macOS 上单位为字节，其余平台为 KB
+            unit = 1 if sys.platform == "darwin" else 1024
+            own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+            children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+            return (
+                ("峰值 RSS（主进程 / 子进程最大）", max(own, children))
+                if children
+                else (
+                    "峰值 RSS",
+                    own,
+                )
+            )
+        if tracemalloc.is_tracing():
+            return "Python 堆峰值（tracemalloc）", tracemalloc.get_traced_memory()[1]
+        return None
+
+    def report(self, path: Path | None = None) -> None:
+        """输出阶段表、最慢文件夹与峰值内存；path 非空时另写 JSON（同时是 Chrome trace）"""
+        total = time.perf_counter() - self.start
+        times = os.times()
+        print()
+        print("=" * 84)
+        print(
+            f"分阶段计时：总用时 {total:.2f} 秒，CPU {times.user + times.system:.2f} 秒"
+            f"（子进程 {times.children_user + times.children_system:.2f} 秒）"
+        )
+        print("（缩进的阶段包含在写入归档中；并行 / 流水线内的阶段为各线程、进程累计值）")
+        print("-" * 84)
+        columns = (
+            ("次数", 6),
+            ("墙钟(s)", 9),
+            ("CPU(s)", 8),
+            ("读(MB)", 9),
+            ("写(MB)", 9),
+            ("读调用", 9),
+            ("写调用", 9),
+        )
+        # 表头含全角字符，按显示宽度左填充以与数值列右对齐
+        print(_pad("阶段", 16) + "".join(" " * (1 + w - _disp_width(t)) + t for t, w in columns))
+        for name, label in PROFILE_PHASES.items():
+            stat = self.phases.get(name)
+            if stat is None:
+                continue
+            io_cols = (
+                f"{stat['read_bytes'] / (1 << 20):>9.1f} {stat['write_bytes'] / (1 << 20):>9.1f} "
+                f"{stat['read_calls']:>9} {stat['write_calls']:>9}"
+                if "read_bytes" in stat
+                else f"{'-':>9} {'-':>9} {'-':>9} {'-':>9}"
+            )
+            print(
+                f"{_pad(label, 16)} {stat['count']:>6} {stat['wall']:>9.3f} {stat['cpu']:>8.3f} "
+                f"{io_cols}"
+            )
+        slowest = sorted(self.folders, reverse=True)[:_PROFILE_SLOWEST]
+        if slowest:
+            print("-" * 84)
+            print(f"最慢的 {len(slowest)} 个文件夹：")
+            for seconds, folder in slowest:
+                print(f"  {seconds:8.3f}s  {folder}")
+        peak = self.peak_memory()
+        if peak is not None:
+            print(f"{peak[0]}: {peak[1] / (1 << 20):.1f} MB")
+        print("=" * 84)
+        if path is not None:
+            data = {
+                "total_seconds": total,
+                "phases": self.phases,
+                "slowest_folders": [{"folder": f, "seconds": t} for t, f in slowest],
+                "peak_memory_bytes": peak[1] if peak else None,
+                "traceEvents": self.events,
+                "displayTimeUnit": "ms",
+            }
+            path.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+            print(f"计时结果已写入 {path}（Chrome trace 格式，可在 chrome://tracing 打开）")
+
+
+def profile_phase(name: str, detail: str | None = None, io: bool = True):
+    """未启用 --profile-report 时为空上下文，否则为 _profiler.phase"""
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.phase(name, detail, io)
+
+
+def _file_cache_key(st: os.stat_result) -> str:
+    """文件系统图片的缓存键：设备号 + inode + 大小 + 修改时间（任一变化即视为新文件）"""
+    return f"f:{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def page_info(
+    img: Path, force_pillow: bool = False, st: os.stat_result | None = None
+) -> tuple[int, int | None, int | None]:
+    """
+    读取文件系统中图片的 (字节数, 宽, 高)，优先查页面缓存
+
+    st: 已有的 stat 结果（避免重复 stat）；force_pillow 时不读缓存（仍写入）
+    """
+    st = st or img.stat()
+    cache = _page_cache
+    key = _file_cache_key(st)
+    if cache is not None and not force_pillow:
+        hit = cache.get(key)
+        if hit is not None:
+            return st.st_size, hit[0], hit[1]
+    width, height = _read_image_size_uncached(img, force_pillow)
+    if cache is not None and width is not None and height is not None:
+        cache.put(key, width, height, st.st_size)
+    return st.st_size, width, height
+
+
+def _entry_cache_key(info: zipfile.ZipInfo) -> str:
+    """CBZ 条目的页面缓存 key（CRC32 + 大小，取自 central directory，不读页面数据）"""
+    return f"z:{info.CRC:08x}:{info.file_size}"
+
+
+def entry_info(
+    zf: zipfile.ZipFile | CbzReader,
+    info: zipfile.ZipInfo,
+    force_pillow: bool = False,
+    lookup: bool = True,
+) -> tuple[int, int | None, int | None]:
+    """
+    读取 CBZ 内图片条目的 (字节数, 宽, 高)，优先查页面缓存（按 CRC32 + 大小识别内容）
+
+    未命中时只读条目开头几 KB 解析宽高（CbzReader 的 STORED 条目直接读映射，不复制整页）
+    lookup=False：调用方已查过缓存，直接探测（结果仍写入缓存）
+    """
+    cache = _page_cache
+    key = _entry_cache_key(info)
+    if cache is not None and lookup and not force_pillow:
+        hit = cache.get(key)
+        if hit is not None:
+            return info.file_size, hit[0], hit[1]
+    with zf.open(info) as f:
+        width, height = _read_image_size_uncached(f, force_pillow)
+    if cache is not None and width is not None and height is not None:
+        cache.put(key, width, height, info.file_size)
+    return info.file_size, width, height
+
+
+def _init_pack_worker(cache_path: Path | None, profiling: bool = False) -> None:
+    """进程池初始化：每个打包进程打开自己的页面缓存连接（--profile-report 时另建计时器）"""
+    global _profiler
+    open_page_cache(cache_path)
+    if profiling:
+        _profiler = Profiler(worker=True)
+
+
 def build_comic_info_xml(
     title: str,
     series: str,
@@ -590,26 +1419,581 @@ def build_comic_info_xml(
     return "\n".join(lines)
 
 
-def create_cbz(images: list[Path], cbz_path: Path, xml_content: str) -> None:
-    """将图片打包为 CBZ（ZIP_STORED 无压缩，漫画阅读器兼容性最佳）"""
+# ---- 转码配置（--profile）----
+# 打包时将页面缩小到目标设备分辨率内并重新编码：format 输出格式（Pillow 名称）、
+# suffix CBZ 内扩展名、max_size 竖向页面的最大 (宽, 高)（None 不缩放）、quality 编码质量、
+# grayscale 是否转为灰度（墨水屏）
+TRANSCODE_PROFILES: dict[str, dict] = {
+    "kindle-pw5": {
+        "desc": "Kindle Paperwhite 5：1236×1648 灰度 JPEG q80",
+        "format": "JPEG",
+        "suffix": ".jpg",
+        "max_size": (1236, 1648),
+        "quality": 80,
+        "grayscale": True,
+    },
+    "tablet-2k": {
+        "desc": "2K 平板：1600×2560 JPEG q85",
+        "format": "JPEG",
+        "suffix": ".jpg",
+        "max_size": (1600, 2560),
+        "quality": 85,
+        "grayscale": False,
+    },
+    "webp-q85": {
+        "desc": "原分辨率 WebP q85",
+        "format": "WEBP",
+        "suffix": ".webp",
+        "max_size": None,
+        "quality": 85,
+        "grayscale": False,
+    },
+}
+
+
+def transcode_page(data: bytes, profile: str) -> tuple[bytes, str] | None:
+    """
+    按转码配置处理单页：缩小到配置分辨率内并重新编码（可在进程池中运行）
+
+    只缩小不放大；横向页面（跨页）按旋转 90° 后的分辨率限制缩放；
+    EXIF 方向先应用到像素，透明背景铺白
+    Returns:
+        (新数据, CBZ 内扩展名)；无法解码、动图、16 位/浮点图，
+        或未缩小且重新编码后反而更大时返回 None（保留原图）
+    """
+    spec = TRANSCODE_PROFILES[profile]
+    try:
+        with Image.open(io.BytesIO(data)) as src:
+            if getattr(src, "is_animated", False) or src.mode in ("I", "I;16", "F"):
+                return None
+            im = ImageOps.exif_transpose(src)
+            if im.mode in ("RGBA", "LA", "PA") or (im.mode == "P" and "transparency" in im.info):
+                im = im.convert("RGBA")
+                im = Image.alpha_composite(Image.new("RGBA", im.size, "white"), im)
+            gray = spec["grayscale"] or im.mode in ("1", "L", "LA")
+            im = im.convert("L" if gray else "RGB")
+
+            resized = False
+            if spec["max_size"] is not None:
+                max_w, max_h = spec["max_size"]
+                if im.width > im.height:
+                    max_w, max_h = max_h, max_w
+                scale = min(max_w / im.width, max_h / im.height)
+                if scale < 1:
+                    new_size = (max(1, round(im.width * scale)), max(1, round(im.height * scale)))
+                    im = im.resize(new_size, Image.LANCZOS)
+                    resized = True
+            buf = io.BytesIO()
+            im.save(buf, spec["format"], quality=spec["quality"])
+    except Exception:
+        return None
+    out = buf.getvalue()
+    if not resized and len(out) >= len(data):
+        return None
+    return out, spec["suffix"]
+
+
+# ---- 无损优化（--optimize-lossless）----
+# 只改字节不改像素：JPEG 在段级别删除元数据（不解码），PNG 重新压缩 IDAT 并删除文本 / 时间等
+# 辅助块，RGB 实为灰度的 PNG 转为单通道（需要 Pillow）
+
+# JPEG 中可删除的 APP / COM 段：EXIF（含缩略图）、XMP、Photoshop IRB（IPTC、缩略图）、注释、
+# JFXX 缩略图；ICC 仅在是 sRGB（与缺省解释一致）时删除，其余色彩空间的 ICC 影响显示颜色，保留
+_JPEG_STRIP_PREFIXES = {
+    0xE0: (b"JFXX\0",),
+    0xE1: (b"Exif\0", b"http://ns.adobe.com/xap/1.0/\0", b"http://ns.adobe.com/xmp/extension/\0"),
+    0xED: (b"Photoshop 3.0\0",),
+}
+_JPEG_ICC_PREFIX = b"ICC_PROFILE\0"
+# PNG 中可删除的辅助块（iCCP 同上：仅 sRGB 时删除；eXIf 带非缺省方向时保留）
+_PNG_STRIP_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"tIME", b"eXIf"}
+# 可安全转为灰度 PNG 的块（其余块如 gAMA / cHRM / 非 sRGB 的 iCCP 会随转换丢失，遇到则不转）
+_PNG_GRAY_SAFE_CHUNKS = {b"IHDR", b"IDAT", b"IEND", b"sRGB", b"pHYs"}
+
+
+def _exif_orientation(tiff: bytes) -> int | None:
+    """从 EXIF（TIFF 结构）的 IFD0 读取方向标签（0x0112），不存在或损坏时返回 None"""
+    try:
+        order = {b"II": "<", b"MM": ">"}[tiff[:2]]
+        (ifd,) = struct.unpack(order + "I", tiff[4:8])
+        (count,) = struct.unpack(order + "H", tiff[ifd : ifd + 2])
+        for i in range(count):
+            entry = ifd + 2 + 12 * i
+            tag, _, _, value = struct.unpack(order + "HHIH", tiff[entry : entry + 10])
+            if tag == 0x0112:
+                return value
+    except (KeyError, struct.error):
+        pass
+    return None
+
+
+def _icc_is_srgb(profile: bytes) -> bool:
+    """ICC 配置是否为 sRGB（RGB 色彩空间且描述中含 sRGB），是则删除后显示不变"""
+    # 描述在 v2 的 desc 中为 ASCII，在 v4 的 mluc 中为 UTF-16BE
+    return profile[16:20] == b"RGB " and (
+        b"sRGB" in profile or "sRGB".encode("utf-16-be") in profile
+    )
+
+
+def strip_jpeg_metadata(data: bytes) -> bytes | None:
+    """
+    在段级别删除 JPEG 元数据（不解码像素，扫描数据原样保留）
+
+    EXIF 方向不是 1 时保留 EXIF 段（删除后页面会转向）
+    Returns:
+        删除后的数据；结构无法识别时返回 None
+    """
+    pos = 2
+    segments: list[tuple[int, bytes]] = []
+    while True:
+        if pos + 4 > len(data) or data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # 填充字节
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / SOS：之后是扫描数据，原样保留
+            tail = data[pos:]
+            break
+        length = int.from_bytes(data[pos + 2 : pos + 4], "big")
+        if length < 2 or pos + 2 + length > len(data):
+            return None
+        segments.append((marker, data[pos : pos + 2 + length]))
+        pos += 2 + length
+
+    icc = b"".join(
+        seg[4 + len(_JPEG_ICC_PREFIX) + 2 :]
+        for marker, seg in segments
+        if marker == 0xE2 and seg[4:].startswith(_JPEG_ICC_PREFIX)
+    )
+    out = [data[:2]]
+    for marker, seg in segments:
+        payload = seg[4:]
+        if marker == 0xFE:
+            continue
+        if marker == 0xE2 and payload.startswith(_JPEG_ICC_PREFIX) and _icc_is_srgb(icc):
+            continue
+        rotated = payload.startswith(b"Exif\0") and _exif_orientation(payload[6:]) not in (None, 1)
+        if not rotated and any(payload.startswith(p) for p in _JPEG_STRIP_PREFIXES.get(marker, ())):
+            continue
+        out.append(seg)
+    out.append(tail)
+    return b"".join(out)
+
+
+def optimize_png(data: bytes) -> bytes | None:
+    """
+    无损优化 PNG：删除文本 / 时间 / sRGB ICC 等辅助块，IDAT 以 zlib 最高级别重新压缩
+    （扫描行滤波不变）；RGB / RGBA 实为灰度（三通道相同）时转为 L / LA（需要 Pillow）
+
+    Returns:
+        优化后的数据（取各方案中最小者，可能不小于原数据）；结构无法识别时返回 None
+    """
+    pos = 8
+    chunks: list[tuple[bytes, bytes]] = []
+    idat: list[bytes] = []
+    while pos + 12 <= len(data):
+        length = int.from_bytes(data[pos : pos + 4], "big")
+        ctype = data[pos + 4 : pos + 8]
+        body = data[pos + 8 : pos + 8 + length]
+        if len(body) != length:
+            return None
+        pos += 12 + length
+        if ctype == b"IDAT":
+            if not idat:
+                chunks.append((ctype, b""))  # 占位：合并后的 IDAT 写在第一个 IDAT 的位置
+            idat.append(body)
+        elif ctype == b"eXIf" and _exif_orientation(body) not in (None, 1):
+            chunks.append((ctype, body))
+        elif ctype in _PNG_STRIP_CHUNKS:
+            continue
+        elif ctype == b"iCCP":
+            try:
+                profile = zlib.decompress(body[body.index(b"\0") + 2 :])
+            except (ValueError, zlib.error):
+                return None
+            if not _icc_is_srgb(profile):
+                chunks.append((ctype, body))
+        else:
+            chunks.append((ctype, body))
+        if ctype == b"IEND":
+            break
+    if not idat:
+        return None
+    try:
+        packed = zlib.compress(zlib.decompress(b"".join(idat)), 9)
+    except zlib.error:
+        return None
+
+    out = [data[:8]]
+    for ctype, body in chunks:
+        bodies = (
+            ([packed] if len(packed) < sum(map(len, idat)) else idat)
+            if ctype == b"IDAT"
+            else [body]
+        )
+        for b in bodies:
+            out.append(len(b).to_bytes(4, "big") + ctype + b)
+            out.append(zlib.crc32(b, zlib.crc32(ctype)).to_bytes(4, "big"))
+    best = b"".join(out)
+
+    # 灰度检测：IHDR 颜色类型 2（RGB）/ 6（RGBA）、8 位，且没有会随转换丢失的块
+    ihdr = chunks[0][1] if chunks and chunks[0][0] == b"IHDR" else b""
+    if (
+        Image is not None
+        and len(ihdr) == 13
+        and ihdr[8] == 8
+        and ihdr[9] in (2, 6)
+        and all(ctype in _PNG_GRAY_SAFE_CHUNKS for ctype, _ in chunks)
+    ):
+        gray = _png_to_gray(data)
+        if gray is not None and len(gray) < len(best):
+            best = gray
+    return best
+
+
+def _png_to_gray(data: bytes) -> bytes | None:
+    """三通道完全相同的 RGB / RGBA PNG 转为 L / LA（透明度全不透明时去掉），否则返回 None"""
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            bands = im.split()
+            if (
+                ImageChops.difference(bands[0], bands[1]).getbbox()
+                or ImageChops.difference(bands[1], bands[2]).getbbox()
+            ):
+                return None
+            if im.mode == "RGBA" and bands[3].getextrema() != (255, 255):
+                gray = Image.merge("LA", (bands[0], bands[3]))
+            else:
+                gray = bands[0]
+            params = {"dpi": im.info["dpi"]} if "dpi" in im.info else {}
+            buf = io.BytesIO()
+            gray.save(buf, "PNG", optimize=True, **params)
+    except Exception:
+        return None
+    return buf.getvalue()
+
+
+def optimize_page_lossless(data: bytes) -> bytes | None:
+    """无损优化单页（JPEG / PNG，可在进程池中运行）：返回更小的新数据，无法变小时返回 None"""
+    if data[:3] == b"\xff\xd8\xff":
+        out = strip_jpeg_metadata(data)
+    elif data[:8] == b"\x89PNG\r\n\x1a\n":
+        out = optimize_png(data)
+    else:
+        return None
+    return out if out is not None and len(out) < len(data) else None
+
+
+def process_page(
+    data: bytes, profile: str | None, optimize: bool
+) -> tuple[bytes, str | None] | None:
+    """
+    打包时的页面处理（可在进程池中运行）：先按 profile 转码，未转码的页再做无损优化
+
+    Returns:
+        (新数据, 新扩展名；None 表示扩展名不变)；原样保留时返回 None
+    """
+    if profile is not None:
+        result = transcode_page(data, profile)
+        if result is not None:
+            return result
+    if optimize:
+        out = optimize_page_lossless(data)
+        if out is not None:
+            return out, None
+    return None
+
+
+def _format_saved(saved: int) -> str:
+    """节省字节数的简短表示"""
+    if saved >= 1 << 20:
+        return f"{saved / (1 << 20):.1f} MB"
+    return f"{saved / 1024:.0f} KB"
+
+
+# CBZ 写入：页面数据的读取 / CRC 计算 / 写出
+_COPY_CHUNK = 1 << 20  # 分块读写大小（内存占用上限与文件大小无关）
+_PAGE_INMEMORY_LIMIT = 16 << 20  # 不超过此大小的页面整读进内存（一次读取同时得到 CRC 与数据）
+_PAGE_READAHEAD = 8  # 写入端之前最多预读的页面数（内存上限约 _PAGE_READAHEAD × 上一项）
+_PAGE_READ_THREADS = 4  # 预读 / CRC 线程数（zlib.crc32 与文件读取都会释放 GIL）
+
+
+def _read_page(
+    img: Path,
+    probe: bool = True,
+    force_pillow: bool = False,
+    profile: str | None = None,
+    optimize: bool = False,
+    page_pool: Executor | None = None,
+) -> tuple[os.stat_result, int, bytes | None, tuple[int | None, int | None] | None, str]:
+    """
+    读取一页供写入 CBZ：返回 (stat, CRC32, 数据, 宽高, CBZ 内扩展名)
+
+    小文件一次整读，CRC、宽高解析与写出共用同一份数据；超过 _PAGE_INMEMORY_LIMIT 的大文件
+    只按大块流式计算 CRC，数据为 None，由写入端用 copy_file_range / sendfile 在内核中复制
+    probe: 是否读取宽高（页面缓存命中时为 False，宽高返回 None）
+    profile / optimize: 转码配置名 / 无损优化（整读后经 process_page 处理，
+    CRC 与宽高按处理结果计算）；page_pool 为页面处理进程池（None 时在当前线程处理）
+    """
+    suffix = img.suffix.lower()
+    process = profile is not None or optimize
+    with open(img, "rb") as f:
+        st = os.fstat(f.fileno())
+        if process or st.st_size <= _PAGE_INMEMORY_LIMIT:
+            data = f.read()
+            if process:
+                with profile_phase("process", io=False):
+                    if page_pool is not None:
+                        result = page_pool.submit(process_page, data, profile, optimize).result()
+                    else:
+                        result = process_page(data, profile, optimize)
+                if result is not None:
+                    data, suffix = result[0], result[1] or suffix
+                # 转码后宽高改变，不能沿用缓存的源文件宽高
+                probe = probe or profile is not None
+            size = None
+            if probe:
+                with profile_phase("probe", io=False):
+                    size = _read_image_size_uncached(data, force_pillow)
+            return st, zlib.crc32(data), data, size, suffix
+        crc = 0
+        while chunk := f.read(_COPY_CHUNK * 4):
+            crc = zlib.crc32(chunk, crc)
+    size = None
+    if probe:
+        with profile_phase("probe", io=False):
+            size = _read_image_size_uncached(img, force_pillow)
+    return st, crc, None, size, suffix
+
+
+def _copy_file_data(img: Path, fp: BinaryIO, size: int) -> None:
+    """
+    将文件前 size 字节复制到 fp 当前位置：依次尝试 copy_file_range、sendfile（内核内复制，
+    不经过用户态缓冲），不可用或报错（跨文件系统、网络盘等）时退回分块读写
+    """
+    fp.flush()
+    pos = fp.tell()
+    copied = 0
+    with open(img, "rb") as src:
+        in_fd, out_fd = src.fileno(), fp.fileno()
+        for method in ("copy_file_range", "sendfile"):
+            if not hasattr(os, method) or copied >= size:
+                continue
+            try:
+                while copied < size:
+                    if method == "copy_file_range":
+                        n = os.copy_file_range(in_fd, out_fd, size - copied, copied, pos + copied)
+                    else:
+                        os.lseek(out_fd, pos + copied, os.SEEK_SET)
+                        n = os.sendfile(out_fd, in_fd, copied, size - copied)
+                    if n == 0:
+                        break
+                    copied += n
+                break
+            except OSError:
+                continue
+        if copied < size:
+            src.seek(copied)
+            fp.seek(pos + copied)
+            while copied < size and (chunk := src.read(min(_COPY_CHUNK, size - copied))):
+                fp.write(chunk)
+                copied += len(chunk)
+    if copied != size:
+        raise OSError(f"文件在打包过程中被修改: {img}")
+    # 内核复制绕过了 fp 的缓冲层，显式定位到数据末尾以同步其写入位置
+    fp.seek(pos + size)
+
+
+def _begin_raw_entry(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo) -> BinaryIO:
+    """在 zf 当前写入位置写出本地文件头（CRC/大小须已填好），返回底层文件对象供写数据"""
+    fp = zf.fp
+    fp.seek(zf.start_dir)
+    zinfo.header_offset = fp.tell()
+    fp.write(zinfo.FileHeader(zinfo.file_size > zipfile.ZIP64_LIMIT))
+    return fp
+
+
+def _end_raw_entry(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo) -> None:
+    """登记已写完数据的条目到 central directory（按 zipfile 的写入流程维护内部状态）"""
+    zf.start_dir = zf.fp.tell()
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+
+
+def create_cbz(
+    images: list[tuple[Path, os.stat_result]],
+    cbz_path: Path,
+    build_xml: Callable[[list[tuple[int, int | None, int | None]]], str],
+    comment: bytes = b"",
+    force_pillow: bool = False,
+    profile: str | None = None,
+    optimize: bool = False,
+    page_pool: Executor | None = None,
+) -> int:
+    """
+    将图片打包为 CBZ（ZIP_STORED 无压缩，漫画阅读器兼容性最佳）
+
+    images: [(图片路径, 扫描时的 stat)]，按页序排列
+    build_xml: 由全部页面的 (字节数, 宽, 高) 生成 ComicInfo.xml
+    comment: zip 归档注释（写入打包指纹，供 --incremental 判断是否需要重新打包）
+    force_pillow: 强制用 Pillow 读取宽高（--pillow）
+    profile: 转码配置名（--profile，见 TRANSCODE_PROFILES）；optimize: 无损优化
+    （--optimize-lossless）。页面在读取线程中处理（有 page_pool 时提交到该进程池），
+    ImageSize / 宽高取处理后的结果
+
+    流水线：后台线程预读页面（最多领先写入端 _PAGE_READAHEAD 页），对同一份数据计算 CRC32
+    并解析宽高（页面缓存命中则跳过），写入端按顺序直接写出完整的本地文件头与数据，
+    大文件用 copy_file_range / sendfile 复制。每页只从磁盘读取一次，读取与写出互相重叠。
+    宽高要等所有页面读完才齐全，ComicInfo.xml 写在数据末尾，在 central directory 中排在首位。
+    输出仍是标准 zip（无 data descriptor，超过 4 GiB 自动使用 ZIP64）
+
+    Returns:
+        相对源文件节省的字节数（转码 / 无损优化）
+    """
+    # 缓存的是源文件宽高，转码时不适用（无损优化不改变宽高）
+    cache = _page_cache if profile is None else None
+    keys = [_file_cache_key(st) for _, st in images]
+    # force_pillow 时不读缓存（仍写入），与 page_info 一致
+    cached = [cache.get(key) if cache is not None and not force_pillow else None for key in keys]
+    readahead, threads = _PAGE_READAHEAD, _PAGE_READ_THREADS
+    if page_pool is not None:
+        # 每个读取线程同一时刻只等待一页处理：线程数决定进程池的实际并发
+        readahead = threads = max(readahead, 2 * (os.cpu_count() or 1))
+
+    def submit(i: int) -> Future:
+        return pool.submit(
+            _read_page,
+            images[i][0],
+            cached[i] is None,
+            force_pillow,
+            profile,
+            optimize,
+            page_pool,
+        )
+
     digits = max(3, len(str(len(images))))
-    with zipfile.ZipFile(str(cbz_path), "w", zipfile.ZIP_STORED) as zf:
+    image_infos: list[tuple[int, int | None, int | None]] = []
+    saved = 0
+    with (
+        zipfile.ZipFile(str(cbz_path), "w", zipfile.ZIP_STORED) as zf,
+        ThreadPoolExecutor(max_workers=threads) as pool,
+    ):
+        zf.comment = comment
+        pending = [submit(i) for i in range(min(readahead, len(images)))]
+        for i, (img, _) in enumerate(images):
+            st, crc, data, size, suffix = pending[i].result()
+            pending[i] = None  # 及时释放已写出页面的数据
+            if i + readahead < len(images):
+                pending.append(submit(i + readahead))
+            file_size = len(data) if data is not None else st.st_size
+            saved += st.st_size - file_size
+
+            date_time = time.localtime(st.st_mtime)[:6]
+            if date_time[0] < 1980:  # zip 时间戳无法表示 1980 年以前
+                date_time = (1980, 1, 1, 0, 0, 0)
+            zinfo = zipfile.ZipInfo(f"{str(i + 1).zfill(digits)}{suffix}", date_time)
+            zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+            zinfo.compress_type = zipfile.ZIP_STORED
+            zinfo.file_size = zinfo.compress_size = file_size
+            zinfo.CRC = crc
+
+            fp = _begin_raw_entry(zf, zinfo)
+            if data is not None:
+                fp.write(data)
+            else:
+                _copy_file_data(img, fp, st.st_size)
+            _end_raw_entry(zf, zinfo)
+
+            # 页面缓存只在写入端（当前线程）访问：SQLite 连接不能跨线程使用
+            if cached[i] is not None:
+                width, height = cached[i][:2]
+            else:
+                width, height = size
+                if cache is not None and width is not None and height is not None:
+                    cache.put(keys[i], width, height, st.st_size)
+            # 同时按写出的内容（CRC32 + 大小）记录，--update 据此识别未变的页
+            if _page_cache is not None and width is not None and height is not None:
+                _page_cache.put(_entry_cache_key(zinfo), width, height, file_size)
+            image_infos.append((file_size, width, height))
+
+        with profile_phase("xml", io=False):
+            xml_content = build_xml(image_infos)
         zf.writestr("ComicInfo.xml", xml_content)
-        for i, img in enumerate(images):
-            arcname = f"{str(i + 1).zfill(digits)}{img.suffix.lower()}"
-            zf.write(str(img), arcname)
+        zf.filelist.insert(0, zf.filelist.pop())
+    return saved
+
+
+# 打包指纹：写在 CBZ 的 zip 注释中（"batch_pack_cbz fingerprint=<sha1>"），
+# 生成规则变化时提升版本号，使旧指纹全部失效
+_FINGERPRINT_PREFIX = b"batch_pack_cbz fingerprint="
+_FINGERPRINT_VERSION = 1
+
+
+def folder_fingerprint(
+    pages: list[tuple[str, int, int]],
+    meta: dict,
+    volume: int | None,
+    lang_iso: str | None,
+    profile: str | None = None,
+    optimize: bool = False,
+) -> bytes:
+    """
+    计算文件夹的打包指纹（不读取图片内容）
+
+    pages: [(文件名, 字节数, mtime_ns), ...]，顺序即页码顺序
+    meta: derive_metadata 结果（使用 title / series / writer）
+    指纹覆盖页面列表与最终写入 ComicInfo.xml 的 title / series / writer / volume / language，
+    任一变化都会使 CBZ 需要重新打包；使用转码配置（--profile）/ 无损优化时也计入
+    （均未使用时指纹与未引入这两项前一致，已有 CBZ 不会因此重新打包）
+    """
+    h = hashlib.sha1(f"v{_FINGERPRINT_VERSION}\n".encode())
+    for name, size, mtime_ns in pages:
+        h.update(f"{name}\0{size}\0{mtime_ns}\n".encode())
+    fields = [meta["title"], meta["series"], meta["writer"], volume, lang_iso]
+    if profile is not None:
+        fields.append(profile)
+    if optimize:
+        fields.append("optimize-lossless")
+    h.update(json.dumps(fields, ensure_ascii=False).encode())
+    return _FINGERPRINT_PREFIX + h.hexdigest().encode("ascii")
+
+
+def read_cbz_fingerprint(cbz: Path) -> bytes | None:
+    """
+    读取 CBZ 的打包指纹（只读文件末尾的 EOCD 记录与注释，不解析 central directory）
+
+    文件不存在、无指纹或不是 zip 时返回 None
+    """
+    try:
+        with open(cbz, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            tail_len = min(size, zipfile.sizeEndCentDir + 1024)
+            f.seek(size - tail_len)
+            tail = f.read(tail_len)
+    except OSError:
+        return None
+    pos = tail.rfind(zipfile.stringEndArchive)
+    if pos < 0 or len(tail) < pos + zipfile.sizeEndCentDir:
+        return None
+    comment_len = struct.unpack("<H", tail[pos + 20 : pos + 22])[0]
+    comment = tail[pos + zipfile.sizeEndCentDir : pos + zipfile.sizeEndCentDir + comment_len]
+    return comment if comment.startswith(_FINGERPRINT_PREFIX) else None
 
 
-def find_available_path(path: Path) -> Path:
+def find_available_path(path: Path, taken: set[Path] | None = None) -> Path:
     """
     生成不冲突的输出路径：同名时追加 " (1)"、" (2)"... 数字后缀
 
+    taken: 已被打包计划占用（尚未写出）的路径，视同已存在
+
     例：
     "作品A.cbz" 已存在        -> "作品A (1).cbz"
     "作品A (1).cbz" 也已存在   -> "作品A (2).cbz"
     "作品A.cbz" 不存在        -> "作品A.cbz"
     """
-    if not path.exists():
+    taken = taken or set()
+    if not (path in taken or path.exists()):
         return path
     stem = path.stem
     suffix = path.suffix
@@ -617,17 +2001,640 @@ def find_available_path(path: Path) -> Path:
     i = 1
     while True:
         candidate = parent / f"{stem} ({i}){suffix}"
-        if not candidate.exists():
+        if not (candidate in taken or candidate.exists()):
             return candidate
         i += 1
 
 
-def ask_folder_dialog(initial_dir: Path) -> Path | None:
+def resolve_conflict(cbz_path: Path, conflict_mode: str, taken: set[Path]) -> Path | None:
     """
-    弹出系统文件夹选择窗口，返回所选目录
+    CBZ 文件名冲突处理（--conflict 决定：覆盖 / 自动重命名 / 逐文件询问）
 
-    - 基于 tkinter（Python 标准库，跨平台），Windows 下为原生文件夹对话框
-    - 无 tkinter / 无图形环境 / 用户取消时返回 None
+    taken 中的路径（计划中已分配给前面的文件夹）视同已存在
+    Returns:
+        最终输出路径；用户选择跳过时返回 None
+    """
+    if not (cbz_path in taken or cbz_path.exists()):
+        return cbz_path
+    if conflict_mode == "overwrite":
+        return cbz_path  # 直接覆盖
+    if conflict_mode == "rename":
+        new_path = find_available_path(cbz_path, taken)
+        print(f"  ↪ 文件名冲突，自动重命名为: {new_path.name}")
+        return new_path
+    print(f"  ⚠ {cbz_path.name} 已存在，如何处理？")
+    print("    1. 覆盖   2. 自动重命名   3. 手动输入文件名   4. 跳过")
+    ch = ask_option("    请选择 (1-4，直接回车默认跳过): ", {"1", "2", "3", "4"}, "4")
+    if ch == "1":
+        return cbz_path
+    if ch == "2":
+        new_path = find_available_path(cbz_path, taken)
+        print(f"  ↪ 自动重命名为: {new_path.name}")
+        return new_path
+    if ch == "3":
+        while True:
+            new_name = input("    请输入新文件名（含扩展名，直接回车跳过）: ").strip()
+            if not new_name:
+                break
+            new_path = cbz_path.parent / new_name
+            if new_path in taken or new_path.exists():
+                print(f"    ⚠ {new_name} 也已存在，请换一个名字")
+                continue
+            return new_path
+    print(f"  ⚠ 跳过: {cbz_path.name}")
+    return None
+
+
+def plan_pack(
+    metas: list[dict],
+    root_dir: Path,
+    out_dir: Path | None,
+    volume_mode: str,
+    volume_map: dict[Path, int | None],
+    language_iso_mode: str,
+    lang_fixed: str | None,
+    conflict_mode: str,
+    incremental: bool = False,
+    profile: str | None = None,
+    optimize: bool = False,
+) -> list[dict]:
+    """
+    生成打包计划：逐文件夹解析元数据、卷号、语言、输出路径与冲突处理
+
+    所有交互（卷号输入、语言选择、冲突询问）都在这里按打包顺序完成，
+    之后的打包阶段不再读取用户输入，可串行也可多进程并行执行
+    incremental=True（--incremental）时，已有 CBZ 的打包指纹与文件夹当前指纹一致
+    （页面列表/大小/mtime 与元数据均未变）的文件夹标记为 "uptodate"，不再打包
+    profile / optimize: 转码配置名（--profile）/ 无损优化（--optimize-lossless），
+    记入每个任务并参与打包指纹
+
+    metas: 预览阶段已收集的元数据（derive_metadata 结果 + "folder"、"depth"、
+    "images"（scan_library 索引中的 [(图片路径, stat_result), ...]）），按打包顺序
+
+    Returns:
+        [task, ...]，顺序与 metas 一致；task 含 "folder"、"depth"、"status"
+        （"pack" 待打包 / "uptodate" 已是最新 / "skip" 用户跳过 / "error" 出错，
+        "error" 字段为原因），待打包项另含 "meta"、"images"、"volume"、"lang_iso"、"cbz_path"、
+        "profile"、"optimize"
+    """
+    tasks: list[dict] = []
+    taken: set[Path] = set()
+    for source in metas:
+        folder, depth = source["folder"], source["depth"]
+        task: dict = {"folder": folder, "depth": depth, "status": "pack"}
+        tasks.append(task)
+        try:
+            meta = {k: source[k] for k in ("writer", "title", "series", "cbz_name")}
+
+            # ---- Volume 处理（复用抽象函数，与更新模式一致）----
+            clean, volume = resolve_volume(
+                meta["title"], meta["cbz_name"], volume_mode, volume_map.get(folder)
+            )
+            meta["title"] = clean
+            if depth <= 1:
+                meta["series"] = clean  # 一层时 title == series
+
+            # ---- LanguageISO 逐文件夹处理（复用抽象函数）----
+            lang_iso = choose_language(meta["cbz_name"], language_iso_mode, lang_fixed)
+
+            # 决定 CBZ 输出位置：
+            # - 两层结构（漫画在 series 内）：放 series 文件夹内，与漫画文件夹同级，不嵌套
+            # - 单层结构（单个漫画直接含图）：放漫画文件夹内部，避免上移到根目录
+            if out_dir:
+                cbz_dir = out_dir
+            elif depth >= 2:
+                cbz_dir = folder.parent
+            else:
+                cbz_dir = folder
+            cbz_path = cbz_dir / f"{meta['cbz_name']}.cbz"
+
+            # 增量模式：用索引中的 stat（不读取图片内容）计算指纹，与已有 CBZ 一致则跳过
+            if incremental and cbz_path not in taken:
+                pages = [(img.name, st.st_size, st.st_mtime_ns) for img, st in source["images"]]
+                fingerprint = folder_fingerprint(pages, meta, volume, lang_iso, profile, optimize)
+                if read_cbz_fingerprint(cbz_path) == fingerprint:
+                    task["status"] = "uptodate"
+                    task["cbz_path"] = cbz_path
+                    taken.add(cbz_path)
+                    continue
+
+            cbz_path = resolve_conflict(cbz_path, conflict_mode, taken)
+            if cbz_path is None:
+                task["status"] = "skip"
+                continue
+            taken.add(cbz_path)
+            task.update(
+                meta=meta,
+                images=source["images"],
+                volume=volume,
+                lang_iso=lang_iso,
+                cbz_path=cbz_path,
+                profile=profile,
+                optimize=optimize,
+            )
+        except Exception as e:
+            task["status"] = "error"
+            task["error"] = str(e)
+    return tasks
+
+
+# ---- 打包日志（崩溃后 --resume 续传）----
+# 日志放在页面缓存旁（不写进漫画库，避免被当作源文件夹中的非图片文件删除）
+_JOURNAL_VERSION = 1
+
+# 写入后立即 fsync 的记录：续传与删除源文件夹依赖它们；其余记录只 flush，
+# 由之后的这些记录（或 sync）一并落盘
+_JOURNAL_SYNC_EVENTS = frozenset({"done", "deleting", "deleted"})
+
+
+def pack_journal_path(root: Path) -> Path:
+    """root 对应的打包日志位置：缓存目录下 journals/<根目录路径的哈希>.jsonl"""
+    digest = hashlib.sha1(str(root).encode("utf-8")).hexdigest()[:16]
+    return default_cache_path().parent / "journals" / f"{digest}.jsonl"
+
+
+def _fsync_path(path: Path) -> None:
+    """把文件内容刷到磁盘（掉电后 os.replace 不会换上不完整的文件）"""
+    with open(path, "r+b") as f:
+        os.fsync(f.fileno())
+
+
+def _fsync_dir(path: Path) -> None:
+    """刷新目录项（让 os.replace 的结果落盘）；Windows 不支持打开目录，忽略"""
+    with contextlib.suppress(OSError):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _pages_digest(images: list[tuple[Path, os.stat_result]]) -> str:
+    """页面列表摘要（名称 / 大小 / mtime）：续传时判断已完成的文件夹之后是否又有变化"""
+    pages = [(img.name, st.st_size, st.st_mtime_ns) for img, st in images]
+    return hashlib.sha1(json.dumps(pages).encode("utf-8")).hexdigest()
+
+
+def _remap_path(path: Path, renames: dict[Path, Path]) -> Path:
+    """按文件夹重命名记录（旧路径 -> 新路径）换算路径"""
+    for old, new in renames.items():
+        if path == old or old in path.parents:
+            return new / path.relative_to(old)
+    return path
+
+
+def verify_packed_cbz(cbz: Path, record: dict) -> bool:
+    """
+    删除源文件夹 / 续传跳过前的完整性检查（只读 central directory，不读页面数据）：
+    文件大小与日志一致、目录可解析、条目为全部页面 + ComicInfo.xml
+    """
+    try:
+        if cbz.stat().st_size != record["size"]:
+            return False
+        with CbzReader(cbz) as reader:
+            names = reader.namelist()
+    except (OSError, zipfile.BadZipFile):
+        return False
+    return len(names) == record["pages"] + 1 and "ComicInfo.xml" in names
+
+
+def load_pack_journal(path: Path) -> dict | None:
+    """
+    读取上次未正常结束的打包日志（不存在时返回 None）
+
+    掉电时最后一行可能不完整，解析失败的行忽略。文件夹重命名记录会应用到此前的
+    文件夹 / CBZ 路径上
+
+    Returns:
+        {"planned": 计划打包数, "done": {文件夹: 完成记录}, "deleted": {已删除的文件夹},
+         "deleting": {开始删除但未完成的文件夹}, "staging": [开始但未完成的临时文件, ...]}
+    """
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return None
+    state: dict = {"planned": 0, "done": {}, "deleted": set(), "deleting": set(), "staging": []}
+    started: dict[Path, Path] = {}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        event = record.get("event")
+        if event == "plan":
+            state["planned"] += 1
+        elif event == "start":
+            started[Path(record["folder"])] = Path(record["staging"])
+        elif event == "done":
+            folder = Path(record["folder"])
+            started.pop(folder, None)
+            state["done"][folder] = record
+        elif event == "deleting":
+            state["deleting"].add(Path(record["folder"]))
+        elif event == "deleted":
+            state["deleting"].discard(Path(record["folder"]))
+            state["deleted"].add(Path(record["folder"]))
+        elif event == "rename":
+            renames = {Path(record["old"]): Path(record["new"])}
+            remapped: dict[Path, dict] = {}
+            for folder, rec in state["done"].items():
+                new_folder = _remap_path(folder, renames)
+                remapped[new_folder] = dict(
+                    rec,
+                    folder=str(new_folder),
+                    cbz=str(_remap_path(Path(rec["cbz"]), renames)),
+                )
+            state["done"] = remapped
+            for key in ("deleting", "deleted"):
+                state[key] = {_remap_path(folder, renames) for folder in state[key]}
+            started = {
+                _remap_path(folder, renames): _remap_path(staging, renames)
+                for folder, staging in started.items()
+            }
+    state["staging"] = list(started.values())
+    return state
+
+
+class PackJournal:
+    """
+    打包日志（JSON Lines，done / deleting / deleted 记录写入后 fsync，其余只 flush）：
+
+    - {"event": "run"}：开始一次打包（记录版本与根目录）
+    - {"event": "plan"}：计划打包的文件夹
+    - {"event": "start"}：开始打包（进行中，记录临时文件路径，续传时清理）
+    - {"event": "done"}：CBZ 已 fsync 并原子替换到位（记录页数 / 大小 / 页面摘要）
+    - {"event": "rename"}：文件夹重命名（之后的记录使用新路径）
+    - {"event": "deleting"} / {"event": "deleted"}：开始删除 / 已删除源文件夹（只删了一部分的
+      文件夹续传时只补完删除，不会用残留页面重新打包）
+
+    正常结束时删除日志文件；中断（Ctrl+C、掉电、磁盘写满）后日志保留，下次 --resume 续传
+    """
+
+    def __init__(self, path: Path, root: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.done: dict[Path, dict] = {}
+        self.f = open(path, "w", encoding="utf-8")  # noqa: SIM115 - 整个打包过程保持打开
+        self.record("run", version=_JOURNAL_VERSION, root=str(root), time=time.time())
+
+    def record(self, event: str, **fields) -> None:
+        """
+        追加一条记录；done / deleting / deleted 记录立即落盘（fsync），其余只 flush
+        （丢失时续传只会多打包 / 多留临时文件，不会误删源文件夹）。
+        done 记录同时保留在内存中供删除阶段检查
+        """
+        fields = {k: str(v) if isinstance(v, Path) else v for k, v in fields.items()}
+        self.f.write(json.dumps({"event": event, **fields}, ensure_ascii=False) + "\n")
+        self.f.flush()
+        if event in _JOURNAL_SYNC_EVENTS:
+            os.fsync(self.f.fileno())
+        if event == "done":
+            self.done[Path(fields["folder"])] = fields
+
+    def sync(self) -> None:
+        """把已写入的记录一次性落盘（如写完全部 plan 记录后）"""
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def finish(self) -> None:
+        """正常结束：关闭并删除日志"""
+        self.f.close()
+        with contextlib.suppress(OSError):
+            self.path.unlink()
+
+
+def pack_folder(
+    task: dict,
+    dest: Path | None = None,
+    force_pillow: bool = False,
+    page_pool: Executor | None = None,
+) -> dict:
+    """
+    按计划打包单个文件夹：读取图片元数据、生成 ComicInfo.xml 并写出 CBZ
+
+    不做任何交互，可在子进程中运行（--jobs 并行）
+    dest: 临时文件路径，写完并 fsync 后由调用方原子替换为 task["cbz_path"]
+    （缺省时写到同目录的临时文件并在这里替换），中断时最终路径上不会留下不完整的 CBZ
+    force_pillow: 强制用 Pillow 读取宽高（--pillow）
+    page_pool: 按 task["profile"] / task["optimize"] 处理页面时使用的进程池
+    （None 时在读取线程中处理）
+
+    Returns:
+        {"pages": 打包的页数, "size": CBZ 字节数, "hits" / "misses": 页面缓存命中 / 未命中数,
+         "saved": 节省的字节数, "seconds": 用时, "profile": 子进程计时器 drain 的结果或 None}；
+        缓存计数与计时供并行时汇总到主进程
+    """
+    start = time.perf_counter()
+    cache = _page_cache
+    hits0, misses0 = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    meta = task["meta"]
+    # 图片来自扫描索引：已按名称自然升序（命名已由重命名脚本保证顺序），stat 已缓存
+    images: list[tuple[Path, os.stat_result]] = task["images"]
+    pages = [(img.name, st.st_size, st.st_mtime_ns) for img, st in images]
+
+    def build_xml(image_infos: list[tuple[int, int | None, int | None]]) -> str:
+        return build_comic_info_xml(
+            meta["title"],
+            meta["series"],
+            meta["writer"],
+            image_infos,
+            volume=task["volume"],
+            language_iso=task["lang_iso"],
+        )
+
+    cbz_path: Path = task["cbz_path"]
+    cbz_path.parent.mkdir(parents=True, exist_ok=True)
+    profile, optimize = task.get("profile"), task.get("optimize", False)
+    fingerprint = folder_fingerprint(
+        pages, meta, task["volume"], task["lang_iso"], profile, optimize
+    )
+    # 读取页面、（转码 / 无损优化、）解析宽高（优先查页面缓存）与写出 CBZ 在同一条流水线中完成
+    staging = dest or cbz_path.with_name(f"{cbz_path.name}.{os.getpid()}.tmp")
+    try:
+        with profile_phase("write", cbz_path.name):
+            saved = create_cbz(
+                images,
+                staging,
+                build_xml,
+                fingerprint,
+                force_pillow,
+                profile,
+                optimize,
+                page_pool,
+            )
+            _fsync_path(staging)
+        size = staging.stat().st_size
+        if dest is None:
+            os.replace(staging, cbz_path)
+            _fsync_dir(cbz_path.parent)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            staging.unlink()
+        raise
+    result = {"pages": len(images), "size": size, "hits": 0, "misses": 0, "saved": saved}
+    if cache is not None:
+        cache.flush()
+        result.update(hits=cache.hits - hits0, misses=cache.misses - misses0)
+    result["seconds"] = time.perf_counter() - start
+    result["profile"] = _profiler.drain() if _profiler is not None and _profiler.worker else None
+    return result
+
+
+def run_pack_plan(
+    tasks: list[dict],
+    root_dir: Path,
+    jobs: int = 1,
+    force_pillow: bool = False,
+    journal: PackJournal | None = None,
+) -> tuple[list[Path], list[Path], list[Path]]:
+    """
+    执行打包计划，返回 (成功文件夹列表, 失败文件夹列表, 已是最新而跳过的文件夹列表)
+
+    jobs > 1 时用进程池并行打包：各进程写临时文件，主进程按计划顺序
+    收集结果、改名为最终 CBZ 并打印，输出顺序与成功/失败统计与串行一致
+    （多个文件夹写同一路径时，结果也与串行相同：后者覆盖前者）
+    每个 CBZ 都先写临时文件、fsync 后再原子替换到最终路径；journal 非空时记录
+    计划 / 开始 / 完成，中断后可 --resume 续传
+    串行且需要处理页面（task["profile"] / task["optimize"]）时，页面提交到按 CPU 核数
+    创建的页面处理进程池；并行时各打包进程已占满 CPU，页面在各自的读取线程中处理
+    """
+    success_folders: list[Path] = []
+    fail_folders: list[Path] = []
+    uptodate_folders: list[Path] = []
+    futures: dict[int, tuple[Future, Path]] = {}
+    pool = page_pool = None
+    if jobs <= 1 and any(task.get("profile") or task.get("optimize") for task in tasks):
+        page_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+    if jobs > 1:
+        cache_path = _page_cache.path if _page_cache is not None else None
+        pool = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_pack_worker,
+            initargs=(cache_path, _profiler is not None),
+        )
+    if journal is not None:
+        for task in tasks:
+            if task["status"] == "pack":
+                journal.record("plan", folder=task["folder"], cbz=task["cbz_path"])
+        journal.sync()  # 全部计划一次 fsync
+    try:
+        if pool is not None:
+            for i, task in enumerate(tasks):
+                if task["status"] == "pack":
+                    cbz_path = task["cbz_path"]
+                    staging = cbz_path.with_name(f"{cbz_path.name}.{os.getpid()}-{i}.tmp")
+                    if journal is not None:
+                        journal.record("start", folder=task["folder"], staging=staging)
+                    futures[i] = (pool.submit(pack_folder, task, staging, force_pillow), staging)
+
+        for i, task in enumerate(tasks):
+            folder = task["folder"]
+            if task["status"] == "uptodate":
+                uptodate_folders.append(folder)
+                continue
+            if task["status"] == "skip":
+                fail_folders.append(folder)
+                continue
+            if task["status"] == "error":
+                print(f"  ✗ 打包 {folder} 时出错: {task['error']}")
+                fail_folders.append(folder)
+                continue
+            cbz_path = task["cbz_path"]
+            staging = None
+            try:
+                if i in futures:
+                    future, staging = futures[i]
+                    result = future.result()
+                    os.replace(staging, cbz_path)
+                    _fsync_dir(cbz_path.parent)
+                    if _page_cache is not None:
+                        _page_cache.hits += result["hits"]
+                        _page_cache.misses += result["misses"]
+                    if _profiler is not None:
+                        _profiler.merge(result["profile"])
+                else:
+                    staging = cbz_path.with_name(f"{cbz_path.name}.{os.getpid()}.tmp")
+                    if journal is not None:
+                        journal.record("start", folder=folder, staging=staging)
+                    result = pack_folder(task, staging, force_pillow, page_pool)
+                    os.replace(staging, cbz_path)
+                    _fsync_dir(cbz_path.parent)
+                if journal is not None:
+                    journal.record(
+                        "done",
+                        folder=folder,
+                        cbz=cbz_path,
+                        pages=result["pages"],
+                        size=result["size"],
+                        digest=_pages_digest(task["images"]),
+                    )
+                if _profiler is not None:
+                    _profiler.folders.append((result["seconds"], str(folder)))
+                pages, saved = result["pages"], result["saved"]
+                # 简洁成功信息：相对路径 + 页数 + 卷号 + 语言
+                try:
+                    rel_cbz = cbz_path.relative_to(root_dir)
+                except ValueError:
+                    rel_cbz = cbz_path
+                info = f"{pages}页"
+                if task["volume"] is not None:
+                    info += f" Vol.{task['volume']}"
+                if task["lang_iso"]:
+                    info += f" {task['lang_iso']}"
+                if saved > 0:
+                    info += f"，省 {_format_saved(saved)}"
+                print(f"  ✓ {rel_cbz}（{info}）")
+                success_folders.append(folder)
+                catalog_note(cbz_path)
+            except Exception as e:
+                if staging is not None:
+                    with contextlib.suppress(OSError):
+                        staging.unlink()
+                print(f"  ✗ 打包 {folder} 时出错: {e}")
+                fail_folders.append(folder)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if page_pool is not None:
+            page_pool.shutdown(cancel_futures=True)
+    return success_folders, fail_folders, uptodate_folders
+
+
+def _clear_source_folder(folder: Path, remove_dir: bool) -> int | None:
+    """
+    删除单个源文件夹的内容（保留 .cbz 与书库目录）：只列一次目录；
+    支持 dir_fd 的平台（Linux / macOS）打开目录 fd 后逐个 unlinkat，不再为每个文件解析一遍完整路径
+
+    remove_dir: 没有保留任何条目时移除文件夹本身（根目录传 False）
+
+    Returns:
+        删除的文件数；文件夹已不存在时返回 None
+    """
+    use_fd = os.unlink in os.supports_dir_fd and os.scandir in os.supports_fd
+    try:
+        fd = os.open(folder, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0)) if use_fd else None
+        with os.scandir(folder if fd is None else fd) as it:
+            entries = list(it)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    files = 0
+    kept = False
+    try:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(folder / entry.name)
+            elif entry.name.lower().endswith(".cbz") or entry.name.startswith(_CATALOG_NAME):
+                kept = True  # 保留生成的 CBZ 与书库目录（含 -wal / -shm）
+            else:
+                if fd is None:
+                    os.unlink(folder / entry.name)
+                else:
+                    os.unlink(entry.name, dir_fd=fd)
+                files += 1
+    finally:
+        if fd is not None:
+            os.close(fd)
+    if remove_dir and not kept:
+        # 删除期间又有新文件写入时目录非空，保留文件夹
+        with contextlib.suppress(OSError):
+            os.rmdir(folder)
+    return files
+
+
+def delete_source_folders(
+    folders: list[Path],
+    index: dict[Path, dict],
+    root_dir: Path,
+    journal: PackJournal,
+    renames: dict[Path, Path] | None = None,
+    threads: int = 8,
+) -> int:
+    """
+    删除已打包的源文件夹，返回删除的文件夹数
+
+    folders: 扫描索引中的原路径；renames: 打包后的文件夹重命名（外层 series 可能已改名）
+    只删除日志中已完成、且 CBZ 通过完整性检查（verify_packed_cbz）的文件夹，其余保留并提示。
+    排除刚生成的 .cbz（单个漫画 / 根目录场景 CBZ 就在源文件夹内），删除其余源文件；
+    删除后若文件夹已空且不是根目录，再移除空文件夹本身
+    threads 个线程同时删除不同文件夹（unlink 等待 I/O 时释放 GIL，网络共享上往返可以重叠）；
+    自底向上：文件夹要等其下所有待删文件夹完成后才开始，无需全局按深度排序。
+    非图片文件的提示来自扫描索引，不再为此单独列目录。
+    每个文件夹开始删除前记录 deleting、删完记录 deleted（均 fsync）
+    """
+    renames = renames or {}
+    origs: dict[Path, Path] = {}  # 当前路径 -> 扫描索引中的原路径
+    for orig in folders:
+        record = journal.done.get(orig)
+        if record is None or not verify_packed_cbz(
+            _remap_path(Path(record["cbz"]), renames), record
+        ):
+            print(f"  ⚠ {orig.name} 的 CBZ 未通过完整性检查，保留源文件夹")
+            continue
+        origs[_remap_path(orig, renames)] = orig
+    if not origs:
+        return 0
+    # 每个文件夹最近的待删祖先，以及各文件夹还在等待的待删子孙数
+    parent_of = {folder: next((p for p in folder.parents if p in origs), None) for folder in origs}
+    waiting = dict.fromkeys(origs, 0)
+    for parent in parent_of.values():
+        if parent is not None:
+            waiting[parent] += 1
+
+    start = time.perf_counter()
+    deleted = files = 0
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        futures: dict[Future, Path] = {}
+
+        def submit(folder: Path) -> None:
+            journal.record("deleting", folder=folder)
+            futures[pool.submit(_clear_source_folder, folder, folder != root_dir)] = folder
+
+        for folder, count in waiting.items():
+            if count == 0:
+                submit(folder)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                folder = futures.pop(future)
+                orig = origs[folder]
+                try:
+                    removed = future.result()
+                except Exception as e:
+                    print(f"  ✗ 删除 {folder} 时出错: {e}")
+                    removed = None
+                if removed is not None:
+                    others = index[orig]["others"]
+                    if others:
+                        print(f"  ⚠ {folder.name} 含 {len(others)} 个非图片文件，已一并删除")
+                    try:
+                        rel_del = folder.relative_to(root_dir)
+                        if str(rel_del) == ".":
+                            rel_del = f"<根目录: {root_dir.name}>"
+                    except ValueError:
+                        rel_del = folder
+                    print(f"  已删除: {rel_del}")
+                    deleted += 1
+                    files += removed
+                    journal.record("deleted", folder=folder)
+                parent = parent_of[folder]
+                if parent is not None:
+                    waiting[parent] -= 1
+                    if waiting[parent] == 0:
+                        submit(parent)
+    seconds = time.perf_counter() - start
+    print(
+        f"  删除 {files} 个文件，用时 {seconds:.2f} 秒"
+        f"（{files / max(seconds, 1e-6):.0f} 文件/秒，{max(1, threads)} 线程）"
+    )
+    return deleted
+
+
+def ask_folder_dialog(initial_dir: Path) -> Path | None:
+    """
+    弹出系统文件夹选择窗口，返回所选目录
+
+    - 基于 tkinter（Python 标准库，跨平台），Windows 下为原生文件夹对话框
+    - 无 tkinter / 无图形环境 / 用户取消时返回 None
     """
     try:
         import tkinter as tk
@@ -652,129 +2659,1882 @@ def ask_folder_dialog(initial_dir: Path) -> Path | None:
     return Path(result) if result else None
 
 
-def _read_cbz_language(cbz: Path) -> str | None:
-    """读取 CBZ 内已有 ComicInfo.xml 的 LanguageISO（无该标签/文件时返回 None）"""
+# ---- 只读 CBZ（mmap）----
+
+
+class _ViewReader:
+    """memoryview 上的最小只读文件对象（read/seek/tell）：宽高解析读取 mmap 中的条目，不复制整页"""
+
+    def __init__(self, view: memoryview):
+        self.view = view
+        self.pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        end = len(self.view) if n is None or n < 0 else min(len(self.view), self.pos + n)
+        data = bytes(self.view[self.pos : end])
+        self.pos = max(self.pos, end)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.pos, os.SEEK_END: len(self.view)}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def tell(self) -> int:
+        return self.pos
+
+    def __enter__(self) -> _ViewReader:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.view.release()
+
+
+class CbzReader:
+    """
+    基于 mmap 的只读 CBZ：打开时只解析 EOCD 与 central directory（一次 mmap + 几 KB 解析）
+
+    - 条目为 zipfile.ZipInfo（字段与 zipfile 一致），infolist / namelist / NameToInfo /
+      start_dir / comment 与 zipfile.ZipFile 同名，可直接交给 entry_info、zip_dead_bytes、
+      copy_raw_entry 等函数
+    - view(info) 返回条目内容：STORED 条目是 mmap 的 memoryview 切片（零复制），
+      宽高解析（open）与 ComicInfo.xml 读取都不复制页面数据；DEFLATED 条目解压后返回
+    - sequential=True 时提示内核按顺序大块预读（整本读取，如 --verify）
+    不是 zip 或目录损坏时抛出 zipfile.BadZipFile；用完须 close（或用 with），
+    Windows 下映射未关闭时无法替换 / 删除该文件
+    """
+
+    def __init__(self, path: Path, sequential: bool = False):
+        self.path = path
+        self.mm: mmap.mmap | None = None
+        self.buffer: memoryview | None = None
+        self._zipfile: zipfile.ZipFile | None = None
+        self._data_offsets: dict[str, int] = {}
+        self.fp = open(path, "rb")  # noqa: SIM115 - 与映射同生命周期，close 时关闭
+        try:
+            self.size = os.fstat(self.fp.fileno()).st_size
+            if self.size < zipfile.sizeEndCentDir:
+                raise zipfile.BadZipFile(f"文件过小，不是 zip: {path.name}")
+            self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+            if sequential and hasattr(mmap, "MADV_SEQUENTIAL"):
+                self.mm.madvise(mmap.MADV_SEQUENTIAL)
+            self.buffer = memoryview(self.mm)
+            try:
+                self._parse()
+            except struct.error as e:  # 兜底：截断 / 错位的记录统一按损坏 zip 报告
+                raise zipfile.BadZipFile(f"zip 记录损坏: {path.name}") from e
+        except BaseException:
+            self.close()
+            raise
+
+    def _parse(self) -> None:
+        """解析 EOCD（含 ZIP64）与 central directory"""
+        mm = self.mm
+        # EOCD 在文件末尾，之后最多跟 65535 字节的注释
+        pos = mm.rfind(
+            zipfile.stringEndArchive, max(0, self.size - zipfile.sizeEndCentDir - 0xFFFF)
+        )
+        if pos < 0 or pos + zipfile.sizeEndCentDir > self.size:
+            raise zipfile.BadZipFile(f"找不到 EOCD 记录: {self.path.name}")
+        eocd = struct.unpack(zipfile.structEndArchive, mm[pos : pos + zipfile.sizeEndCentDir])
+        count = eocd[zipfile._ECD_ENTRIES_TOTAL]
+        cd_size = eocd[zipfile._ECD_SIZE]
+        cd_offset = eocd[zipfile._ECD_OFFSET]
+        comment_start = pos + zipfile.sizeEndCentDir
+        self.comment = bytes(mm[comment_start : comment_start + eocd[zipfile._ECD_COMMENT_SIZE]])
+        locator = pos - zipfile.sizeEndCentDir64Locator
+        if locator >= 0 and mm[locator : locator + 4] == zipfile.stringEndArchive64Locator:
+            offset = struct.unpack(
+                zipfile.structEndArchive64Locator,
+                mm[locator : locator + zipfile.sizeEndCentDir64Locator],
+            )[2]
+            if offset + zipfile.sizeEndCentDir64 > locator:
+                raise zipfile.BadZipFile(f"ZIP64 EOCD 超出范围: {self.path.name}")
+            record = struct.unpack(
+                zipfile.structEndArchive64, mm[offset : offset + zipfile.sizeEndCentDir64]
+            )
+            if record[0] != zipfile.stringEndArchive64:
+                raise zipfile.BadZipFile(f"ZIP64 EOCD 损坏: {self.path.name}")
+            count, cd_size, cd_offset = record[7], record[8], record[9]
+        if cd_offset + cd_size > pos:
+            raise zipfile.BadZipFile(f"central directory 超出范围: {self.path.name}")
+        self.start_dir = cd_offset
+        self.filelist: list[zipfile.ZipInfo] = []
+        self.NameToInfo: dict[str, zipfile.ZipInfo] = {}
+        p = cd_offset
+        for _ in range(count):
+            if p + zipfile.sizeCentralDir > pos:
+                raise zipfile.BadZipFile(f"central directory 不完整: {self.path.name}")
+            centdir = struct.unpack(zipfile.structCentralDir, mm[p : p + zipfile.sizeCentralDir])
+            if centdir[zipfile._CD_SIGNATURE] != zipfile.stringCentralDir:
+                raise zipfile.BadZipFile(f"central directory 损坏: {self.path.name}")
+            p += zipfile.sizeCentralDir
+            name_len = centdir[zipfile._CD_FILENAME_LENGTH]
+            extra_len = centdir[zipfile._CD_EXTRA_FIELD_LENGTH]
+            comment_len = centdir[zipfile._CD_COMMENT_LENGTH]
+            flags = centdir[zipfile._CD_FLAG_BITS]
+            name = bytes(mm[p : p + name_len]).decode("utf-8" if flags & 0x800 else "cp437")
+            info = zipfile.ZipInfo(name)
+            info.extra = bytes(mm[p + name_len : p + name_len + extra_len])
+            info.comment = bytes(
+                mm[p + name_len + extra_len : p + name_len + extra_len + comment_len]
+            )
+            p += name_len + extra_len + comment_len
+            (
+                info.create_version,
+                info.create_system,
+                info.extract_version,
+                info.reserved,
+                info.flag_bits,
+                info.compress_type,
+                t,
+                d,
+                info.CRC,
+                info.compress_size,
+                info.file_size,
+            ) = centdir[1:12]
+            info.volume, info.internal_attr, info.external_attr = centdir[15:18]
+            info.header_offset = centdir[zipfile._CD_LOCAL_HEADER_OFFSET]
+            info.date_time = (
+                (d >> 9) + 1980,
+                (d >> 5) & 0xF,
+                d & 0x1F,
+                t >> 11,
+                (t >> 5) & 0x3F,
+                (t & 0x1F) * 2,
+            )
+            self._apply_zip64(info)
+            self.filelist.append(info)
+            self.NameToInfo[info.filename] = info
+
+    @staticmethod
+    def _apply_zip64(info: zipfile.ZipInfo) -> None:
+        """32 位字段为 0xFFFFFFFF 时从 ZIP64 扩展字段（0x0001）取实际值（顺序同 zipfile）"""
+        fields = ("file_size", "compress_size", "header_offset")
+        if all(getattr(info, field) != 0xFFFFFFFF for field in fields):
+            return
+        extra, pos = info.extra, 0
+        while pos + 4 <= len(extra):
+            tag, length = struct.unpack("<HH", extra[pos : pos + 4])
+            if tag == 0x0001:
+                data, idx = extra[pos + 4 : pos + 4 + length], 0
+                for field in fields:
+                    if getattr(info, field) == 0xFFFFFFFF:
+                        if idx + 8 > len(data):
+                            raise zipfile.BadZipFile(f"ZIP64 扩展字段不完整: {info.filename}")
+                        setattr(info, field, struct.unpack_from("<Q", data, idx)[0])
+                        idx += 8
+                return
+            pos += 4 + length
+
+    def infolist(self) -> list[zipfile.ZipInfo]:
+        return self.filelist
+
+    def namelist(self) -> list[str]:
+        return [info.filename for info in self.filelist]
+
+    def data_offset(self, info: zipfile.ZipInfo) -> int:
+        """条目数据在文件中的起点（读取本地文件头的文件名 / 扩展字段长度）"""
+        offset = self._data_offsets.get(info.filename)
+        if offset is None:
+            start = info.header_offset
+            header = self.mm[start : start + zipfile.sizeFileHeader]
+            if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+                raise zipfile.BadZipFile(f"本地文件头损坏: {info.filename}")
+            fields = struct.unpack(zipfile.structFileHeader, header)
+            offset = (
+                start
+                + zipfile.sizeFileHeader
+                + fields[zipfile._FH_FILENAME_LENGTH]
+                + fields[zipfile._FH_EXTRA_FIELD_LENGTH]
+            )
+            self._data_offsets[info.filename] = offset
+        return offset
+
+    def raw(self, info: zipfile.ZipInfo) -> memoryview:
+        """条目的压缩数据（memoryview 切片，零复制）"""
+        start = self.data_offset(info)
+        if start + info.compress_size > self.size:
+            raise zipfile.BadZipFile(f"条目数据不完整: {info.filename}")
+        return self.buffer[start : start + info.compress_size]
+
+    def view(self, info: zipfile.ZipInfo) -> memoryview:
+        """条目内容：STORED 直接是 mmap 切片（零复制），DEFLATED 解压，其余方式经 zipfile 读取"""
+        if info.compress_type == zipfile.ZIP_STORED:
+            return self.raw(info)
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            with self.raw(info) as raw:
+                return memoryview(zlib.decompress(raw, -15))
+        if self._zipfile is None:
+            self._zipfile = zipfile.ZipFile(self.fp)
+        return memoryview(self._zipfile.read(info))
+
+    def read(self, info: zipfile.ZipInfo | str) -> bytes:
+        """条目内容的副本（需要 bytes 时使用，如提交到进程池）"""
+        if isinstance(info, str):
+            info = self.NameToInfo[info]
+        with self.view(info) as data:
+            return bytes(data)
+
+    def open(self, info: zipfile.ZipInfo) -> _ViewReader:
+        """条目内容的只读文件对象（with 结束时释放切片），供宽高解析只读开头几 KB"""
+        return _ViewReader(self.view(info))
+
+    def close(self) -> None:
+        if self._zipfile is not None:
+            self._zipfile.close()
+        if self.buffer is not None:
+            with contextlib.suppress(BufferError):
+                self.buffer.release()
+        if self.mm is not None:
+            # 调用方仍持有切片时映射无法立即关闭，留给垃圾回收
+            with contextlib.suppress(BufferError):
+                self.mm.close()
+        self.fp.close()
+
+    def __enter__(self) -> CbzReader:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def copy_raw_entry(src: CbzReader, info: zipfile.ZipInfo, zf_out: zipfile.ZipFile) -> None:
+    """
+    将 zip 条目的压缩数据原样复制到 zf_out（不解压、不重新压缩）
+
+    沿用原条目的文件名、时间、属性、压缩方式、CRC 与大小（central directory 中的值），
+    在 zf_out 当前写入位置写出本地文件头 + 压缩数据，并登记到 zf_out 的 central directory。
+    由于 CRC/大小已知，新的本地文件头直接写入这些值，不再需要尾部 data descriptor
+    （zipfile 未提供原样复制接口，这里按其写入流程维护 filelist / NameToInfo / start_dir）。
+    压缩数据是源 CBZ 映射的切片，直接写出，不经中间缓冲
+    """
+    out_info = copy.copy(info)
+    out_info.flag_bits &= ~0x08  # CRC/大小已写入本地文件头，去掉 data descriptor 标志
+    with src.raw(info) as data:
+        fp = _begin_raw_entry(zf_out, out_info)
+        fp.write(data)
+    _end_raw_entry(zf_out, out_info)
+
+
+# 原地修补的回滚日志后缀：记录修补前的文件长度，崩溃后截断回原长度即恢复原归档
+_PATCH_JOURNAL_SUFFIX = ".patch"
+
+# 原地修补残留的无效字节（旧 ComicInfo.xml、旧 central directory）超过文件大小的
+# 该比例时，更新模式改为整体重写（压实）
+_COMPACT_RATIO = 0.1
+
+
+def _patch_journal(cbz: Path) -> Path:
+    """原地修补回滚日志路径（与 CBZ 同目录）"""
+    return cbz.with_name(cbz.name + _PATCH_JOURNAL_SUFFIX)
+
+
+def recover_cbz_patch(cbz: Path) -> bool:
+    """
+    恢复被中断的原地修补：存在回滚日志时把 CBZ 截断回修补前的长度
+
+    修补只在原文件末尾追加（旧 central directory 与 EOCD 保持完整），
+    截断后即为修补前的完整归档。日志记录了修补对象的身份（设备 / inode）与旧 EOCD：
+    只有仍是同一个文件、且旧 EOCD 原样还在时才截断；CBZ 已被重新打包 / 压实重写
+    （os.replace 换成了别的文件）或日志无法解析时只丢弃日志。返回是否执行了回滚
+    """
+    journal = _patch_journal(cbz)
+    if not journal.is_file():
+        return False
+    recovered = False
     try:
-        with zipfile.ZipFile(str(cbz)) as zf:
-            if "ComicInfo.xml" not in zf.namelist():
-                return None
-            xml = zf.read("ComicInfo.xml").decode("utf-8")
-            m = re.search(r"<LanguageISO>([^<]+)</LanguageISO>", xml)
-            return m.group(1).strip() if m else None
+        state = json.loads(journal.read_text(encoding="ascii"))
+        orig_size, eocd = state["size"], bytes.fromhex(state["eocd"])
+        with open(cbz, "r+b") as f:
+            st = os.fstat(f.fileno())
+            if (st.st_dev, st.st_ino) == (state["dev"], state["ino"]) and st.st_size > orig_size:
+                f.seek(state["eocd_offset"])
+                if state["eocd_offset"] + len(eocd) <= orig_size and f.read(len(eocd)) == eocd:
+                    f.truncate(orig_size)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    recovered = True
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # CBZ 已不存在 / 日志损坏：无从回滚
+    journal.unlink()
+    _fsync_dir(cbz.parent)
+    return recovered
+
+
+def zip_dead_bytes(zf: zipfile.ZipFile | CbzReader, file_size: int) -> int:
+    """
+    估算 zip 中未被 central directory 引用的字节数（原地修补残留的旧条目与旧目录）
+
+    本地文件头的 extra 长度按 central directory 中的值估算，结果仅用于判断是否需要压实
+    """
+    live = 0
+    for info in zf.infolist():
+        live += zipfile.sizeFileHeader + len(info.filename.encode("utf-8")) + len(info.extra)
+        live += info.compress_size
+    return max(0, zf.start_dir - live)
+
+
+def patch_cbz(
+    cbz: Path,
+    xml_content: str | None = None,
+    pages: list[tuple[Path, str]] | None = None,
+) -> None:
+    """
+    原地修补 CBZ：替换 ComicInfo.xml 和/或追加新页，不重写已有条目
+
+    - 新条目追加在原文件末尾（旧 central directory 之后），再写出新的
+      central directory 与 EOCD；旧 ComicInfo.xml 不再被引用，成为无效字节
+      （可由更新模式的压实重写清除）
+    - 崩溃安全：修补前将原文件长度、身份（设备 / inode）与旧 EOCD 写入回滚日志并 fsync
+      （连同目录项），修补完成并 fsync 后删除日志；中途中断时 recover_cbz_patch
+      截断回原长度，归档保持修补前的状态
+    - I/O 只有新条目 + central directory，与归档大小无关
+
+    xml_content: 新的 ComicInfo.xml（None 时保留原有）
+    pages: 追加的新页 [(图片路径, 归档内名称), ...]
+    """
+    recover_cbz_patch(cbz)
+    journal = _patch_journal(cbz)
+    with open(cbz, "r+b") as f:
+        orig_size = f.seek(0, os.SEEK_END)
+        endrec = zipfile._EndRecData(f)
+        if endrec is None:
+            raise zipfile.BadZipFile(f"找不到 EOCD 记录: {cbz.name}")
+        eocd_offset = endrec[zipfile._ECD_LOCATION]
+        f.seek(eocd_offset)
+        st = os.fstat(f.fileno())
+        state = {
+            "size": orig_size,
+            "dev": st.st_dev,
+            "ino": st.st_ino,
+            "eocd_offset": eocd_offset,
+            "eocd": f.read(zipfile.sizeEndCentDir).hex(),
+        }
+        with open(journal, "w", encoding="ascii") as j:
+            j.write(json.dumps(state))
+            j.flush()
+            os.fsync(j.fileno())
+        _fsync_dir(cbz.parent)
+        with zipfile.ZipFile(f, "a") as zf:
+            # 从文件末尾开始写，保留旧 central directory 供回滚
+            zf.start_dir = orig_size
+            if xml_content is not None:
+                old = zf.NameToInfo.pop("ComicInfo.xml", None)
+                if old is not None:
+                    zf.filelist.remove(old)
+                zf.writestr("ComicInfo.xml", xml_content)
+                # central directory 中把 ComicInfo.xml 排在最前（与打包时一致）
+                zf.filelist.insert(0, zf.filelist.pop())
+            for path, arcname in pages or []:
+                zf.write(str(path), arcname)
+        f.flush()
+        os.fsync(f.fileno())
+    journal.unlink()
+    _fsync_dir(cbz.parent)
+
+
+def parse_comic_info(xml: str | bytes) -> dict:
+    """
+    解析 ComicInfo.xml 中本脚本生成的字段
+
+    Returns:
+        {"title", "series", "writer", "volume", "language",
+         "pages": [(ImageSize, ImageWidth, ImageHeight), ...]}
+        （缺失为 "" / None；pages 按 <Pages> 中的顺序，属性缺失或非数字为 None）
+    """
+    root = ElementTree.fromstring(xml)
+
+    def text(tag: str) -> str:
+        return (root.findtext(tag) or "").strip()
+
+    def number(page: ElementTree.Element, attr: str) -> int | None:
+        value = page.get(attr, "")
+        return int(value) if value.isdigit() else None
+
+    volume = text("Volume")
+    return {
+        "title": text("Title"),
+        "series": text("Series"),
+        "writer": text("Writer"),
+        "volume": int(volume) if volume.isdigit() else None,
+        "language": text("LanguageISO") or None,
+        "pages": [
+            (number(page, "ImageSize"), number(page, "ImageWidth"), number(page, "ImageHeight"))
+            for page in root.iterfind("Pages/Page")
+        ],
+    }
+
+
+def _read_cbz_comic_info(reader: CbzReader) -> dict | None:
+    """
+    读取并解析 CBZ 内已有的 ComicInfo.xml（无该文件或无法解析时返回 None）
+
+    返回 parse_comic_info 的字段，另加 "xml"：原始 XML 字节（供比较是否变化）
+    """
+    if "ComicInfo.xml" not in reader.NameToInfo:
+        return None
+    try:
+        xml = reader.read("ComicInfo.xml")
+        return {**parse_comic_info(xml), "xml": xml}
     except Exception:
         return None
 
 
-def update_main(
-    root_dir: Path, language_iso_mode: str, lang_fixed: str | None, volume_mode: str
-) -> None:
+def _normalize_comic_info(xml: str | bytes) -> str:
+    """规范化 ComicInfo.xml 以比较内容：统一编码、去掉 BOM、换行与标签之间的空白"""
+    if isinstance(xml, bytes):
+        xml = xml.decode("utf-8", "replace")
+    return re.sub(r">\s+<", "><", xml.lstrip("\ufeff").strip())
+
+
+def parse_since(value: str) -> float:
+    """
+    解析 --since：日期 / 时间（2026-10-01、2026-10-01T08:00）或相对时长
+    （30m、12h、7d、2w），返回 Unix 时间戳
+    """
+    m = re.fullmatch(r"(\d+)\s*([mhdw])", value.strip().lower())
+    if m:
+        unit = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}[m.group(2)]
+        return time.time() - int(m.group(1)) * unit
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"无法解析时间: {value}（例：2026-10-01、2026-10-01T08:00、12h、7d）"
+        ) from None
+
+
+def select_update_targets(metas: list[dict], root_dir: Path, select: dict) -> list[dict]:
+    """
+    按 --since / --glob / --series 缩小更新范围（只看文件名与 mtime，不打开归档）
+
+    select: {"since": 时间戳或 None, "globs": [模式, ...] 或 None, "series": 子串或 None}
+    glob 匹配相对 root 的路径（/ 分隔）或文件名；series 不区分大小写匹配系列名子串
+    """
+    since = select.get("since")
+    globs = select.get("globs") or []
+    series = (select.get("series") or "").casefold()
+    selected: list[dict] = []
+    for m in metas:
+        cbz = m["cbz"]
+        if series and series not in m["series"].casefold():
+            continue
+        if globs:
+            rel = cbz.relative_to(root_dir).as_posix()
+            if not any(fnmatch.fnmatch(rel, g) or fnmatch.fnmatch(cbz.name, g) for g in globs):
+                continue
+        if since is not None:
+            try:
+                if cbz.stat().st_mtime < since:
+                    continue
+            except OSError:
+                continue  # 列举后已被移走 / 删除（网络共享、并行的监视 / 打包）
+        selected.append(m)
+    return selected
+
+
+def cbz_image_infos(
+    zf: CbzReader,
+    entries: list[zipfile.ZipInfo],
+    pages: list[tuple[int | None, int | None, int | None]],
+    force_pillow: bool = False,
+) -> tuple[list[tuple[int, int | None, int | None]], int]:
+    """
+    CBZ 图片条目的 (字节数, 宽, 高)：复用已知的宽高，只探测新增 / 变化的页，都不读取页面数据
+
+    - 先按条目的 CRC32 + 大小（central directory 中的值）查页面缓存：按内容识别，
+      同样大小的另一张图也不会误用。打包时已按写出的内容记录每一页
+    - 没有任何一页命中时（别处打包、缓存已淘汰），退回已有 <Pages> 的记录（ComicInfo 的
+      Page 不记录名称 / CRC，只能按位置：顺序即页码顺序，与按名称自然排序的图片条目
+      一一对应）：第 i 页的 ImageSize 与第 i 个条目的大小一致、且宽高齐全时沿用
+    - 其余页面（新增、替换或原本缺少宽高）读文件头探测并写入缓存
+    force_pillow 时全部重新探测
+
+    Returns:
+        (image_infos, 探测的页数)
+    """
+    cache = _page_cache
+    hits = [
+        cache.get(_entry_cache_key(info)) if cache is not None and not force_pillow else None
+        for info in entries
+    ]
+    # 有页面命中说明缓存认识这本 CBZ：未命中的页就是新增 / 替换的，不再按位置沿用
+    by_position = not force_pillow and not any(hits)
+    image_infos: list[tuple[int, int | None, int | None]] = []
+    probed = 0
+    for i, info in enumerate(entries):
+        if hits[i] is not None:
+            image_infos.append((info.file_size, hits[i][0], hits[i][1]))
+            continue
+        size, width, height = pages[i] if i < len(pages) else (None, None, None)
+        if by_position and size == info.file_size and width is not None and height is not None:
+            image_infos.append((info.file_size, width, height))
+            continue
+        image_infos.append(entry_info(zf, info, force_pillow, lookup=False))
+        probed += 1
+    return image_infos, probed
+
+
+def _optimize_cbz_entries(
+    zf: CbzReader,
+    entries: list[zipfile.ZipInfo],
+    zf_out: zipfile.ZipFile,
+    page_pool: Executor | None,
+) -> list[int]:
+    """
+    将图片条目无损优化后按原顺序写入 zf_out，返回各条目写出后的大小
+
+    条目在当前线程按顺序读取，提交到 page_pool 并行优化（最多领先写出 2×CPU 核数个条目，
+    内存占用与归档大小无关；page_pool 为 None 时在当前线程逐个优化）；
+    优化后的条目以 ZIP_STORED 写入，无法变小的条目原样复制
+    """
+
+    def optimized() -> Iterator[bytes | None]:
+        if page_pool is None:
+            for info in entries:
+                yield optimize_page_lossless(zf.read(info))
+            return
+        window = 2 * (os.cpu_count() or 1)
+
+        def submit(info: zipfile.ZipInfo) -> Future:
+            return page_pool.submit(optimize_page_lossless, zf.read(info))
+
+        pending = [submit(info) for info in entries[:window]]
+        for i in range(len(entries)):
+            data = pending[i].result()
+            pending[i] = None
+            if i + window < len(entries):
+                pending.append(submit(entries[i + window]))
+            yield data
+
+    sizes: list[int] = []
+    for info, data in zip(entries, optimized()):
+        if data is None:
+            copy_raw_entry(zf, info, zf_out)
+            sizes.append(info.file_size)
+            continue
+        out_info = copy.copy(info)
+        out_info.flag_bits &= ~0x08
+        out_info.compress_type = zipfile.ZIP_STORED
+        out_info.file_size = out_info.compress_size = len(data)
+        out_info.CRC = zlib.crc32(data)
+        fp = _begin_raw_entry(zf_out, out_info)
+        fp.write(data)
+        _end_raw_entry(zf_out, out_info)
+        sizes.append(len(data))
+    return sizes
+
+
+def update_cbz(
+    task: dict,
+    force_pillow: bool = False,
+    compact: bool = False,
+    optimize: bool = False,
+    page_pool: Executor | None = None,
+    ask: Callable[[str | None], tuple[str, int | None, str | None]] | None = None,
+) -> dict:
+    """
+    更新单个 CBZ 的 ComicInfo.xml（update_main 的单文件步骤）
+
+    task: {"cbz", "series", "writer", "title", "volume", "lang_iso", "missing_lang"}；
+    ask 非空时（交互模式）以已有 LanguageISO 调用，返回 (标题, 卷号, LanguageISO)，
+    取代 task 中预先解析的值；ask 为空时不做任何交互，可在子进程中运行（--jobs 并行）
+    - 先回滚被中断的原地修补；CBZ 只映射一次，替换 / 修补原文件前关闭映射
+    - 未变化页面的宽高沿用已有 ComicInfo.xml（cbz_image_infos）
+    - 新 XML 与已有 XML 规范化后相同时不写入（--compact / --optimize-lossless 除外）
+    - 缺省原地修补；--compact、--optimize-lossless 或无效字节过多时整体重写（压实）
+    page_pool: 无损优化页面的进程池（None 时在当前线程优化）
+
+    Returns:
+        {"status": "patch" / "rewrite" / "unchanged" / "has_lang"（--missing-lang 跳过）,
+         "recovered": 是否回滚了中断的修补, "current_lang", "title", "volume", "lang_iso",
+         "pages": 页数, "probed": 探测宽高的页数, "saved": 无损优化节省的字节数,
+         "hits" / "misses": 页面缓存命中 / 未命中数}；缓存计数供并行时汇总到主进程
+    """
+    cbz: Path = task["cbz"]
+    cache = _page_cache
+    hits0, misses0 = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    result: dict = {"recovered": recover_cbz_patch(cbz), "hits": 0, "misses": 0, "saved": 0}
+    with CbzReader(cbz) as zf:
+        # 已有 ComicInfo.xml：当前语言 + 各页已记录的大小 / 宽高
+        existing = _read_cbz_comic_info(zf) or {"language": None, "pages": [], "xml": None}
+        result["current_lang"] = existing["language"]
+        if task.get("missing_lang") and existing["language"]:
+            result["status"] = "has_lang"
+            return result
+        if ask is not None:
+            title, volume, lang_iso = ask(existing["language"])
+        else:
+            title, volume, lang_iso = task["title"], task["volume"], task["lang_iso"]
+        result.update(title=title, volume=volume, lang_iso=lang_iso)
+
+        def build_xml(image_infos: list[tuple[int, int | None, int | None]]) -> str:
+            return build_comic_info_xml(
+                title,
+                task["series"],
+                task["writer"],
+                image_infos,
+                volume=volume,
+                language_iso=lang_iso,
+            )
+
+        # 读取 CBZ 内图片元数据（大小取自 central directory；未变化的页沿用
+        # ComicInfo.xml 中的宽高，其余优先查页面缓存，未命中时只读条目开头几 KB）
+        entries = sorted(
+            (
+                info
+                for info in zf.infolist()
+                if Path(info.filename).suffix.lower() in IMAGE_EXTENSIONS
+            ),
+            key=lambda info: natural_key(info.filename),
+        )
+        image_infos, result["probed"] = cbz_image_infos(
+            zf, entries, existing["pages"], force_pillow
+        )
+        result["pages"] = len(image_infos)
+        xml_content = build_xml(image_infos)
+        if (
+            not compact
+            and not optimize
+            and existing["xml"] is not None
+            and _normalize_comic_info(existing["xml"]) == _normalize_comic_info(xml_content)
+        ):
+            result["status"] = "unchanged"
+        else:
+            file_size = zf.size
+            rewrite = (
+                compact or optimize or zip_dead_bytes(zf, file_size) > file_size * _COMPACT_RATIO
+            )
+            result["status"] = "rewrite" if rewrite else "patch"
+        # 重写 CBZ：图片条目压缩数据原样复制（或无损优化后写入）+ 新 ComicInfo.xml
+        # （写在末尾、central directory 中排在首位），再替换原文件
+        if result["status"] == "rewrite":
+            tmp = cbz.with_name(f"{cbz.name}.{os.getpid()}.tmp")
+            try:
+                with zipfile.ZipFile(str(tmp), "w") as zf_out:
+                    zf_out.comment = zf.comment  # 与 patch 路径一致，保留归档注释
+                    if optimize:
+                        sizes = _optimize_cbz_entries(zf, entries, zf_out, page_pool)
+                        result["saved"] = sum(info.file_size for info in entries) - sum(sizes)
+                        image_infos = [(size, w, h) for size, (_, w, h) in zip(sizes, image_infos)]
+                        xml_content = build_xml(image_infos)
+                    else:
+                        for info in entries:
+                            copy_raw_entry(zf, info, zf_out)
+                    zf_out.writestr("ComicInfo.xml", xml_content)
+                    zf_out.filelist.insert(0, zf_out.filelist.pop())
+                _fsync_path(tmp)
+            except BaseException:
+                with contextlib.suppress(OSError):
+                    tmp.unlink()
+                raise
+    if result["status"] == "rewrite":
+        os.replace(tmp, cbz)
+        _fsync_dir(cbz.parent)
+    elif result["status"] == "patch":
+        patch_cbz(cbz, xml_content)
+    if cache is not None:
+        cache.flush()
+        result.update(hits=cache.hits - hits0, misses=cache.misses - misses0)
+    return result
+
+
+def update_main(
+    root_dir: Path,
+    language_iso_mode: str,
+    lang_fixed: str | None,
+    volume_mode: str,
+    force_pillow: bool = False,
+    compact: bool = False,
+    optimize: bool = False,
+    select: dict | None = None,
+    jobs: int = 1,
+) -> bool:
+    """
+    更新模式：扫描 root 下所有 .cbz，逐个重新生成 ComicInfo.xml（单个 CBZ 见 update_cbz）
+
+    支持与打包模式一致的 --lang / --volume 模式（skip / fixed / interactive、skip / auto / input）：
+    - volume auto 时做系列级卷号推断（同系列存在更高卷号时，无卷号推断为第 1 卷）
+    - 页面宽高按 CRC32 + 大小查页面缓存，或沿用已有 ComicInfo.xml 的记录（cbz_image_infos），
+      只探测新增 / 变化的页：只改语言或卷号时每个 CBZ 只读 XML
+    - LanguageISO 交互时：已有语言「跳过=保留现状」，并提供「置空」选项去掉语言
+    - 新 XML 与已有 XML（规范化后）相同时跳过写入：对已整理过的库重复运行只读 XML；
+      --compact / --optimize-lossless 时仍然重写
+    - select（--since / --glob / --series，见 select_update_targets）在打开任何归档前
+      缩小范围（卷号推断仍基于全部 CBZ）；"missing_lang" 为真（--missing-lang）时
+      只更新 ComicInfo.xml 中没有 LanguageISO 的 CBZ（只读 XML 判断）
+    - 缺省原地修补（patch_cbz）：在归档末尾追加新 ComicInfo.xml 与新 central directory，
+      I/O 只有几 KB；中断后下次运行自动回滚（recover_cbz_patch）
+    - compact=True（--compact）或原地修补残留过多时整体重写：图片条目的压缩数据
+      原样复制（不解压、不重新压缩，内存占用与归档大小无关），用新 CBZ 替换原文件
+    - optimize=True（--optimize-lossless）时总是重写：图片条目无损优化
+      （optimize_page_lossless），无法变小的条目原样复制，并输出每个 CBZ 节省的字节数
+    - jobs > 1（--jobs）且无需交互（--lang 固定 / skip、--volume auto / skip）时，
+      标题 / 卷号 / 语言在主进程预先解析，CBZ 分发到进程池并行更新，主进程按顺序
+      收集结果并打印，输出与统计与串行一致；交互模式总是串行。串行无损优化时页面
+      提交到按 CPU 核数创建的进程池，并行时各进程自行优化
+
+    Returns:
+        是否没有更新失败的 CBZ
+    """
+    cbz_files = sorted(
+        (p for p in root_dir.rglob("*.cbz") if p.is_file()),
+        key=lambda p: natural_key(str(p.relative_to(root_dir))),
+    )
+    if not cbz_files:
+        print("未找到 CBZ 文件！")
+        return True
+
+    # 第一遍：解析元数据 + （auto 时）系列级卷号推断
+    metas: list[dict] = []
+    for cbz in cbz_files:
+        writer, raw_title = parse_name(cbz.stem)
+        clean, explicit_vol = detect_volume(raw_title)
+        series = clean if explicit_vol is not None else raw_title
+        metas.append(
+            {
+                "cbz": cbz,
+                "writer": writer,
+                "raw_title": raw_title,
+                "series": series,
+                "explicit_vol": explicit_vol,
+                "series_key": f"{writer}|{series}",
+            }
+        )
+    # 卷号推断与打包共用 infer_series_volumes；显式卷号时 resolve_volume 仍以标题为准
+    inferred_map: dict[Path, int | None] = {}
+    if volume_mode == "auto":
+        inferred_map = infer_series_volumes(
+            [VolumeEntry(m["cbz"], m["series_key"], m["explicit_vol"]) for m in metas]
+        )
+
+    select = select or {}
+    found = len(metas)
+    metas = select_update_targets(metas, root_dir, select)
+    print("=" * 60)
+    if len(metas) == found:
+        print(f"CBZ 更新工具：找到 {found} 个 CBZ")
+    else:
+        print(f"CBZ 更新工具：找到 {found} 个 CBZ，筛选后 {len(metas)} 个")
+    print("=" * 60)
+
+    # 更新任务：无需交互时在这里解析标题 / 卷号 / 语言（可交给子进程）
+    interactive = language_iso_mode == "interactive" or volume_mode == "input"
+    tasks: list[dict] = []
+    for m in metas:
+        task = {
+            "cbz": m["cbz"],
+            "series": m["series"],
+            "writer": m["writer"],
+            "missing_lang": bool(select.get("missing_lang")),
+        }
+        if not interactive:
+            task["title"], task["volume"] = resolve_volume(
+                m["raw_title"], m["cbz"].name, volume_mode, inferred_map.get(m["cbz"])
+            )
+            task["lang_iso"] = choose_language(m["cbz"].name, language_iso_mode, lang_fixed)
+        tasks.append(task)
+
+    def header(idx: int, task: dict, volume: int | None, cur_lang: str | None) -> None:
+        vol_str = f"Vol.{volume}" if volume is not None else "无卷号"
+        print("-" * 60)
+        print(f"  [{idx}/{len(tasks)}] {task['cbz'].name}")
+        print(f"       系列: {task['series']} | {vol_str} | 当前语言: {cur_lang or '无'}")
+
+    def asker(idx: int, task: dict, raw_title: str) -> Callable:
+        cbz = task["cbz"]
+
+        def ask(cur_lang: str | None) -> tuple[str, int | None, str | None]:
+            # Volume 解析（auto 静默；input 交互，prompt 含文件名可识别）
+            title, volume = resolve_volume(raw_title, cbz.name, volume_mode, inferred_map.get(cbz))
+            # 先打印分隔与当前项标题，再询问语言，避免与上一项看混
+            header(idx, task, volume, cur_lang)
+            lang_iso = choose_language(
+                cbz.name, language_iso_mode, lang_fixed, current_lang=cur_lang
+            )
+            return title, volume, lang_iso
+
+        return ask
+
+    updated = 0
+    failed = 0
+    unchanged = 0
+    has_lang = 0
+    total_saved = 0
+    pool = page_pool = None
+    futures: list[Future] = []
+    if jobs > 1 and not interactive and len(tasks) > 1:
+        cache_path = _page_cache.path if _page_cache is not None else None
+        pool = ProcessPoolExecutor(
+            max_workers=jobs, initializer=_init_pack_worker, initargs=(cache_path,)
+        )
+        futures = [pool.submit(update_cbz, task, force_pillow, compact, optimize) for task in tasks]
+        print(f"{jobs} 进程并行更新")
+    elif optimize:
+        page_pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+    try:
+        for idx, task in enumerate(tasks, 1):
+            cbz = task["cbz"]
+            ask = asker(idx, task, metas[idx - 1]["raw_title"]) if interactive else None
+            try:
+                if futures:
+                    result = futures[idx - 1].result()
+                    if _page_cache is not None:
+                        _page_cache.hits += result["hits"]
+                        _page_cache.misses += result["misses"]
+                else:
+                    result = update_cbz(task, force_pillow, compact, optimize, page_pool, ask)
+            except Exception as e:
+                print(f"  ✗ 更新 {cbz.name} 失败: {e}")
+                failed += 1
+                continue
+            catalog_note(cbz)
+            if result["status"] == "has_lang":
+                has_lang += 1
+                continue
+            if not interactive:
+                header(idx, task, result["volume"], result["current_lang"])
+            if result["recovered"]:
+                print(f"  ↺ {cbz.name}: 上次原地更新被中断，已回滚")
+            if result["status"] == "unchanged":
+                print("  = 未变化，跳过")
+                unchanged += 1
+                continue
+            vol_str = f"Vol.{result['volume']}" if result["volume"] is not None else "无卷号"
+            new_lang = result["lang_iso"] or "无语言"
+            how = "重写压实" if result["status"] == "rewrite" else "原地更新"
+            if optimize:
+                how = f"无损优化，省 {_format_saved(result['saved'])}"
+                total_saved += result["saved"]
+            if result["probed"]:
+                how += f"，探测 {result['probed']} 页宽高"
+            print(f"  ✓ 已更新（{result['pages']}页 {vol_str} 语言:{new_lang}，{how}）")
+            updated += 1
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if page_pool is not None:
+            page_pool.shutdown(cancel_futures=True)
+    print("=" * 60)
+    print(f"已更新 {updated} 个 CBZ")
+    if unchanged:
+        print(f"未变化跳过 {unchanged} 个")
+    if has_lang:
+        print(f"已有 LanguageISO 跳过 {has_lang} 个（--missing-lang）")
+    if failed:
+        print(f"失败 {failed} 个")
+    if optimize:
+        print(f"无损优化共节省 {_format_saved(total_saved)}")
+    return failed == 0
+
+
+def append_main(src_dir: Path, cbz: Path, force_pillow: bool = False) -> None:
+    """
+    追加模式：把 src_dir 内的图片作为新页追加到已有 CBZ 末尾（--append-to）
+
+    - 新页按名称自然升序，归档内名称接续已有页码（如已有 001-020，新页为 021、022...）
+    - 原地修补（patch_cbz），已有页不重写；ComicInfo.xml 保留原有
+      Title/Series/Volume/Writer/LanguageISO，重新生成 PageCount 与 Pages
+    """
+    images = sorted(get_image_files(src_dir), key=lambda f: natural_key(f.name))
+    if not images:
+        print("未找到要追加的图片！")
+        return
+    recover_cbz_patch(cbz)
+    with CbzReader(cbz) as zf:
+        entries = sorted(
+            (
+                info
+                for info in zf.infolist()
+                if Path(info.filename).suffix.lower() in IMAGE_EXTENSIONS
+            ),
+            key=lambda info: natural_key(info.filename),
+        )
+        image_infos = [entry_info(zf, info, force_pillow) for info in entries]
+        if "ComicInfo.xml" in zf.NameToInfo:
+            meta = parse_comic_info(zf.read("ComicInfo.xml").decode("utf-8"))
+        else:
+            writer, title = parse_name(cbz.stem)
+            meta = {"title": title, "series": title, "writer": writer}
+            meta["volume"] = meta["language"] = None
+        existing = set(zf.NameToInfo)
+
+    total = len(entries) + len(images)
+    digits = max(3, len(str(total)))
+    pages: list[tuple[Path, str]] = []
+    for i, img in enumerate(images, len(entries) + 1):
+        arcname = f"{str(i).zfill(digits)}{img.suffix.lower()}"
+        if arcname in existing:
+            raise FileExistsError(f"{cbz.name} 内已存在 {arcname}，无法追加")
+        pages.append((img, arcname))
+        image_infos.append(page_info(img, force_pillow))
+
+    xml_content = build_comic_info_xml(
+        meta["title"],
+        meta["series"],
+        meta["writer"],
+        image_infos,
+        volume=meta["volume"],
+        language_iso=meta["language"],
+    )
+    patch_cbz(cbz, xml_content, pages)
+    catalog_note(cbz)
+    print(f"  ✓ 已追加 {len(images)} 页到 {cbz.name}（共 {total} 页）")
+
+
+# ---- 完整性校验（--verify）----
+# 每个 CBZ 报告的问题条数上限（整本损坏时不刷屏）
+_VERIFY_MAX_ERRORS = 5
+
+
+def verify_cbz(cbz: Path) -> dict:
+    """
+    校验单个 CBZ（在进程池中运行）：
+
+    - central directory：可解析、无重名条目；每个条目的本地文件头签名、文件名、压缩方式
+      （无 data descriptor 时还有 CRC / 大小）与目录一致，数据区互不重叠且位于目录之前
+    - 每个条目的 CRC32：STORED 条目直接对 mmap 的 memoryview 计算（不复制），
+      其余压缩方式解压后计算
+    - ComicInfo.xml：PageCount 与 <Pages> 中的 Page 数等于图片条目数，各页 ImageSize
+      与条目大小一致，ImageWidth / ImageHeight 与条目实际宽高一致（只解析文件头）
+    整个归档经 CbzReader 映射后按顺序访问（MADV_SEQUENTIAL，由内核大块预读）
+
+    Returns:
+        {"path", "size": 字节数, "entries": 条目数, "errors": [问题, ...],
+         "warnings": [提示, ...]}
+    """
+    result: dict = {"path": cbz, "size": 0, "entries": 0, "errors": [], "warnings": []}
+    errors: list[str] = result["errors"]
+    try:
+        result["size"] = cbz.stat().st_size
+        if result["size"] == 0:
+            errors.append("空文件")
+            return result
+        with CbzReader(cbz, sequential=True) as reader:
+            _verify_entries(reader, result)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        errors.append(f"无法读取: {e}")
+    del errors[_VERIFY_MAX_ERRORS:]
+    return result
+
+
+def _verify_entries(zf: CbzReader, result: dict) -> None:
+    """verify_cbz 的条目 / ComicInfo.xml 检查（问题追加到 result["errors"]）"""
+    errors: list[str] = result["errors"]
+    infos = zf.infolist()
+    result["entries"] = len(infos)
+    if len({info.filename for info in infos}) != len(infos):
+        errors.append("central directory 中有重名条目")
+    view = zf.buffer
+    data_ranges: list[tuple[int, int, str]] = []
+    data_offsets: dict[str, int] = {}
+    for info in infos:
+        offset = info.header_offset
+        header = view[offset : offset + zipfile.sizeFileHeader]
+        if len(header) < zipfile.sizeFileHeader:
+            errors.append(f"{info.filename}: 本地文件头超出文件末尾")
+            continue
+        fields = struct.unpack(zipfile.structFileHeader, header)
+        if fields[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+            errors.append(f"{info.filename}: 本地文件头签名错误")
+            continue
+        name_len = fields[zipfile._FH_FILENAME_LENGTH]
+        extra_len = fields[zipfile._FH_EXTRA_FIELD_LENGTH]
+        name_start = offset + zipfile.sizeFileHeader
+        encoding = "utf-8" if info.flag_bits & 0x800 else "cp437"
+        if bytes(view[name_start : name_start + name_len]).decode(encoding, "replace") != (
+            info.orig_filename
+        ):
+            errors.append(f"{info.filename}: 本地文件头中的文件名与目录不一致")
+        if fields[zipfile._FH_COMPRESSION_METHOD] != info.compress_type:
+            errors.append(f"{info.filename}: 本地文件头中的压缩方式与目录不一致")
+        # 无 data descriptor 且非 ZIP64 时，本地文件头的 CRC / 大小必须与目录一致
+        if not info.flag_bits & 0x08 and fields[zipfile._FH_COMPRESSED_SIZE] != 0xFFFFFFFF:
+            local = (
+                fields[zipfile._FH_CRC],
+                fields[zipfile._FH_COMPRESSED_SIZE],
+                fields[zipfile._FH_UNCOMPRESSED_SIZE],
+            )
+            if local != (info.CRC, info.compress_size, info.file_size):
+                errors.append(f"{info.filename}: 本地文件头中的 CRC / 大小与目录不一致")
+        data_start = name_start + name_len + extra_len
+        data_offsets[info.filename] = data_start
+        data_ranges.append((offset, data_start + info.compress_size, info.filename))
+    data_ranges.sort()
+    for (_, end, name), (next_start, _, _) in zip(data_ranges, data_ranges[1:]):
+        if end > next_start:
+            errors.append(f"{name}: 数据区与下一个条目重叠")
+    if data_ranges and data_ranges[-1][1] > zf.start_dir:
+        errors.append(f"{data_ranges[-1][2]}: 数据区延伸进 central directory")
+    if errors:
+        return  # 结构已损坏，不再逐条目校验
+
+    # CRC：STORED 条目对 mmap 原地计算；其余压缩方式解压后计算
+    for info in infos:
+        if info.flag_bits & 0x01:
+            errors.append(f"{info.filename}: 加密条目，无法校验")
+        elif info.compress_type == zipfile.ZIP_STORED:
+            if info.compress_size != info.file_size:
+                errors.append(f"{info.filename}: STORED 条目的压缩前后大小不一致")
+                continue
+            start = data_offsets[info.filename]
+            if zlib.crc32(view[start : start + info.file_size]) != info.CRC:
+                errors.append(f"{info.filename}: CRC 不匹配")
+        else:
+            try:
+                with zf.view(info) as data:
+                    if zlib.crc32(data) != info.CRC:
+                        errors.append(f"{info.filename}: CRC 不匹配")
+            except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError) as e:
+                errors.append(f"{info.filename}: {e}")
+    if errors:
+        return
+
+    images = sorted(
+        (info for info in infos if Path(info.filename).suffix.lower() in IMAGE_EXTENSIONS),
+        key=lambda info: natural_key(info.filename),
+    )
+    if "ComicInfo.xml" not in zf.NameToInfo:
+        result["warnings"].append("缺少 ComicInfo.xml")
+        return
+    try:
+        root = ElementTree.fromstring(zf.read("ComicInfo.xml"))
+    except ElementTree.ParseError as e:
+        errors.append(f"ComicInfo.xml 无法解析: {e}")
+        return
+    page_count = (root.findtext("PageCount") or "").strip()
+    if page_count != str(len(images)):
+        errors.append(f"PageCount 为 {page_count or '空'}，图片条目有 {len(images)} 个")
+    pages = root.findall("Pages/Page")
+    if len(pages) != len(images):
+        errors.append(f"<Pages> 有 {len(pages)} 页，图片条目有 {len(images)} 个")
+        return
+    for page, info in zip(pages, images):
+        label = f"第 {page.get('Image', '?')} 页（{info.filename}）"
+        size = page.get("ImageSize")
+        if size is not None and size != str(info.file_size):
+            errors.append(f"{label}: ImageSize {size} ≠ 条目大小 {info.file_size}")
+        if page.get("ImageWidth") is None and page.get("ImageHeight") is None:
+            continue
+        with zf.open(info) as entry:
+            width, height = _read_image_size_uncached(entry)
+        if width is None:
+            result["warnings"].append(f"{label}: 无法读取宽高")
+            continue
+        stored = (page.get("ImageWidth"), page.get("ImageHeight"))
+        actual = (str(width), str(height))
+        if any(s is not None and s != a for s, a in zip(stored, actual)):
+            errors.append(f"{label}: 宽高 {stored[0]}×{stored[1]} ≠ 实际 {width}×{height}")
+
+
+def verify_main(root_dir: Path, jobs: int) -> bool:
+    """
+    校验模式（--verify）：在 jobs 个进程中并行校验 root 下所有 CBZ（见 verify_cbz），
+    输出吞吐量与有问题的归档列表。root 为单个 .cbz 文件时只校验该文件
+
+    Returns:
+        是否全部通过
+    """
+    if root_dir.is_file():
+        cbz_files = [root_dir]
+        root_dir = root_dir.parent
+    else:
+        cbz_files = sorted(
+            (p for p in root_dir.rglob("*.cbz") if p.is_file()),
+            key=lambda p: natural_key(str(p.relative_to(root_dir))),
+        )
+    if not cbz_files:
+        print("未找到 CBZ 文件！")
+        return True
+    print(f"校验 {len(cbz_files)} 个 CBZ（{jobs} 进程）...")
+    start = time.perf_counter()
+    total_bytes = 0
+    bad: list[dict] = []
+    warned = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for result in pool.map(verify_cbz, cbz_files, chunksize=4):
+            total_bytes += result["size"]
+            rel = result["path"].relative_to(root_dir)
+            if result["errors"]:
+                bad.append(result)
+                print(f"  ✗ {rel}")
+                for error in result["errors"]:
+                    print(f"      {error}")
+            elif result["warnings"]:
+                warned += 1
+                print(f"  ⚠ {rel}: {'；'.join(result['warnings'][:_VERIFY_MAX_ERRORS])}")
+    seconds = time.perf_counter() - start
+    print("=" * 60)
+    print(
+        f"校验 {len(cbz_files)} 个 CBZ、{_format_saved(total_bytes)}，用时 {seconds:.2f} 秒"
+        f"（{total_bytes / max(seconds, 1e-6) / (1 << 20):.0f} MB/s）"
+    )
+    print(f"通过 {len(cbz_files) - len(bad)} 个，有问题 {len(bad)} 个，提示 {warned} 个")
+    if bad:
+        print("有问题的 CBZ：")
+        for result in bad:
+            print(f"  {result['path']}")
+    return not bad
+
+
+# ---- 重复检测（--find-duplicates）----
+# 页面指纹为 (字节数, CRC32)：CBZ 条目直接取 central directory 中的值，不读任何页面数据；
+# 散图只在大小与其他页面撞车时才读取（先读开头 _DUP_PARTIAL 字节，仍撞车才算整页 CRC）
+_DUP_PARTIAL = 64 * 1024
+# 出现在超过这么多来源中的页面（空白页、汉化组声明页等）不参与相似度计算
+_DUP_COMMON_LIMIT = 8
+# 近似重复阈值：共同页面数 / 较少一方的页数
+_NEAR_DUP_RATIO = 0.9
+
+
+def _file_crc32(path: Path, limit: int | None = None) -> int:
+    """文件（前 limit 字节）的 CRC32，与 zip central directory 中的 CRC 可直接比较"""
+    crc = 0
+    remaining = limit
+    with open(path, "rb") as f:
+        while chunk := f.read(_COPY_CHUNK if remaining is None else min(_COPY_CHUNK, remaining)):
+            crc = zlib.crc32(chunk, crc)
+            if remaining is not None:
+                remaining -= len(chunk)
+                if remaining <= 0:
+                    break
+    return crc
+
+
+def find_duplicates_main(root_dir: Path, threads: int = 8) -> None:
+    """
+    重复检测模式：在 root 下所有 CBZ 与散图文件夹之间查找重复 / 近似重复的卷
+
+    - 完全重复：页面指纹序列完全相同（如带 / 不带 (C108)、[DL] 的同一卷）
+    - 近似重复：共同页面占较少一方的 _NEAR_DUP_RATIO 以上（如多一张封面、少一页声明），
+      完全重复的一组只列出其中第一个来源
+    - 重复页面：出现在多个来源中的页面数与可回收的字节数
+    散图按 大小 → 开头 _DUP_PARTIAL 字节的 CRC → 整页 CRC 逐级过滤，只读必要的数据；
+    指纹基于 CRC32，结果为候选（同大小页面的 CRC 碰撞概率极低，但并非不可能）
+    """
+    start = time.perf_counter()
+    # 来源：{"name": 显示名, "pages": [(大小, CRC) 或散图未定的 Path, ...]}
+    sources: list[dict] = []
+    cbz_sizes: set[int] = set()
+    for cbz in sorted(root_dir.rglob("*.cbz"), key=lambda p: natural_key(str(p))):
+        try:
+            with CbzReader(cbz) as zf:
+                entries = sorted(
+                    (
+                        info
+                        for info in zf.infolist()
+                        if Path(info.filename).suffix.lower() in IMAGE_EXTENSIONS
+                    ),
+                    key=lambda info: natural_key(info.filename),
+                )
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"  ✗ 跳过 {cbz.name}: {e}")
+            continue
+        pages = [(info.file_size, info.CRC) for info in entries if info.file_size]
+        cbz_sizes.update(size for size, _ in pages)
+        sources.append({"name": cbz.relative_to(root_dir).as_posix(), "pages": pages})
+    loose: list[tuple[dict, int, Path, int]] = []  # (来源, 页序, 路径, 大小)
+    for folder, entry in scan_library(root_dir, threads).items():
+        name = folder.relative_to(root_dir).as_posix() or "."
+        source = {"name": f"{name}/", "pages": []}
+        for img, st in entry["images"]:
+            if st.st_size:
+                loose.append((source, len(source["pages"]), img, st.st_size))
+                source["pages"].append(img)
+        sources.append(source)
+
+    # 散图逐级过滤：大小唯一的页面不可能重复，不读取；与 CBZ 页面大小相同的直接算整页 CRC
+    # （CBZ 条目只有整页 CRC）；只与散图撞车的先比开头部分，仍撞车再算整页
+    loose_count: dict[int, int] = {}
+    for _, _, _, size in loose:
+        loose_count[size] = loose_count.get(size, 0) + 1
+    full = [item for item in loose if item[3] in cbz_sizes]
+    partial = [item for item in loose if item[3] not in cbz_sizes and loose_count[item[3]] > 1]
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        heads = list(pool.map(lambda item: _file_crc32(item[2], _DUP_PARTIAL), partial))
+        head_groups: dict[tuple[int, int], list[tuple]] = {}
+        for item, head in zip(partial, heads):
+            if item[3] <= _DUP_PARTIAL:  # 整个文件已读完，开头 CRC 即整页 CRC
+                item[0]["pages"][item[1]] = (item[3], head)
+            else:
+                head_groups.setdefault((item[3], head), []).append(item)
+        full += [item for group in head_groups.values() if len(group) > 1 for item in group]
+        for item, crc in zip(full, pool.map(lambda item: _file_crc32(item[2]), full)):
+            item[0]["pages"][item[1]] = (item[3], crc)
+    # 仍未确定指纹的散图页面是唯一的：换成各不相同的占位指纹 ("u", 序号)，
+    # 仍计入页序列（完全重复）与页数（近似重复的分母），但不进倒排索引
+    unique = 0
+    for src in sources:
+        pages = src["pages"]
+        for pos, page in enumerate(pages):
+            if not isinstance(page, tuple):
+                pages[pos] = ("u", unique)
+                unique += 1
+        src["keys"] = set(pages)
+
+    # 倒排索引：页面指纹 → 出现的来源（不含唯一页面的占位指纹）
+    owners: dict[tuple[int, int], list[int]] = {}
+    for i, src in enumerate(sources):
+        for key in src["keys"]:
+            if key[0] != "u":
+                owners.setdefault(key, []).append(i)
+
+    exact: dict[tuple, list[int]] = {}
+    for i, src in enumerate(sources):
+        if src["pages"]:
+            exact.setdefault(tuple(src["pages"]), []).append(i)
+    exact_groups = [ids for ids in exact.values() if len(ids) > 1]
+    # 完全重复的一组只以第一个来源参与近似比较，避免同一关系按组内成员重复列出
+    duplicate_of = {i: ids[0] for ids in exact_groups for i in ids[1:]}
+
+    shared: dict[tuple[int, int], int] = {}
+    for ids in owners.values():
+        if 1 < len(ids) <= _DUP_COMMON_LIMIT:
+            for a_pos, a in enumerate(ids):
+                for b in ids[a_pos + 1 :]:
+                    shared[a, b] = shared.get((a, b), 0) + 1
+    near = []
+    for (a, b), count in shared.items():
+        if a in duplicate_of or b in duplicate_of:
+            continue
+        smaller = min(len(sources[a]["keys"]), len(sources[b]["keys"]))
+        if count >= smaller * _NEAR_DUP_RATIO:
+            near.append((count / smaller, a, b, count))
+    near.sort(key=lambda item: (-item[0], item[1], item[2]))
+
+    dup_pages = {key: ids for key, ids in owners.items() if len(ids) > 1}
+    wasted = sum(key[0] * (len(ids) - 1) for key, ids in dup_pages.items())
+
+    print("=" * 60)
+    print(
+        f"重复检测：{len(sources)} 个来源（CBZ + 散图文件夹），"
+        f"散图 {len(loose)} 页中读取开头 {len(partial)} 页、整页 {len(full)} 页，"
+        f"用时 {time.perf_counter() - start:.2f} 秒"
+    )
+    print("=" * 60)
+    if exact_groups:
+        print(f"完全重复（{len(exact_groups)} 组）：")
+        for ids in exact_groups:
+            print(f"  ≡ {len(sources[ids[0]]['pages'])}页")
+            for i in ids:
+                print(f"      {sources[i]['name']}")
+    if near:
+        print(f"近似重复（{len(near)} 对）：")
+        for ratio, a, b, count in near:
+            sa, sb = sources[a], sources[b]
+            print(f"  ≈ {ratio:.0%} 共同 {count} 页")
+            print(f"      {sa['name']}（{len(sa['pages'])}页，独有 {len(sa['keys']) - count} 页）")
+            print(f"      {sb['name']}（{len(sb['pages'])}页，独有 {len(sb['keys']) - count} 页）")
+    if not exact_groups and not near:
+        print("未发现重复的卷。")
+    print(f"跨来源重复页面: {len(dup_pages)} 张，可回收约 {_format_saved(wasted)}")
+
+
+# ---- 书库目录（--catalog，SQLite）----
+# 每个 CBZ 一行（系列 / 卷号 / 语言 / 页数 / 封面位置…）+ 每页一行（大小 / 宽高），
+# 阅读器与脚本直接查询，不必打开所有 CBZ；按 (大小, mtime) 增量维护
+
+# 目录文件名（缺省放在 root 下）；root 下已有该文件时打包 / --update 自动随手更新
+_CATALOG_NAME = ".cbz_catalog.sqlite"
+
+# 当前进程使用的目录（main 打开，None 表示不维护）
+_catalog: Catalog | None = None
+
+# --catalog-query 的内置查询：名称 -> (说明, SQL)
+CATALOG_QUERIES: dict[str, tuple[str, str]] = {
+    "missing-lang": (
+        "没有 LanguageISO 的 CBZ",
+        "SELECT path FROM cbz WHERE language IS NULL ORDER BY path",
+    ),
+    "missing-volume": (
+        "没有卷号的 CBZ",
+        "SELECT path FROM cbz WHERE volume IS NULL ORDER BY path",
+    ),
+    "volume-gaps": (
+        "卷号不连续的系列（列出缺少的卷号）",
+        "WITH RECURSIVE s(writer, series, top) AS ("
+        " SELECT writer, series, MAX(volume) FROM cbz WHERE volume IS NOT NULL"
+        " GROUP BY writer, series),"
+        " n(writer, series, top, v) AS (SELECT writer, series, top, 1 FROM s"
+        " UNION ALL SELECT writer, series, top, v + 1 FROM n WHERE v < top)"
+        " SELECT '[' || n.writer || '] ' || n.series || '  缺 Vol.' || n.v FROM n"
+        " WHERE NOT EXISTS (SELECT 1 FROM cbz c WHERE c.writer = n.writer"
+        " AND c.series = n.series AND c.volume = n.v) ORDER BY n.writer, n.series, n.v",
+    ),
+    "no-dimensions": (
+        "有页面缺少宽高的 CBZ",
+        "SELECT DISTINCT c.path FROM cbz c JOIN pages p ON p.path = c.path"
+        " WHERE p.width IS NULL OR p.height IS NULL ORDER BY c.path",
+    ),
+}
+
+
+def default_catalog_path(root_dir: Path) -> Path:
+    """目录文件默认位置：root 下的 .cbz_catalog.sqlite"""
+    return root_dir / _CATALOG_NAME
+
+
+def catalog_record(cbz: Path, st: os.stat_result) -> tuple[tuple, list[tuple]]:
+    """
+    读取单个 CBZ 的目录记录（只读 central directory 与 ComicInfo.xml）
+
+    字段优先取 ComicInfo.xml，没有时由文件名推导；页面大小 / 宽高沿用 XML 中的记录，
+    与条目不一致的页才读文件头（cbz_image_infos）。封面为按名称排序的第一个图片条目，
+    STORED 时记录其数据在文件中的偏移与长度（阅读器可直接读取，无需解析 zip）
+
+    Returns:
+        (cbz 表一行, [pages 表各行])
+    """
+    with CbzReader(cbz) as zf:
+        existing = _read_cbz_comic_info(zf)
+        entries = sorted(
+            (
+                info
+                for info in zf.infolist()
+                if Path(info.filename).suffix.lower() in IMAGE_EXTENSIONS
+            ),
+            key=lambda info: natural_key(info.filename),
+        )
+        image_infos, _ = cbz_image_infos(zf, entries, existing["pages"] if existing else [])
+        cover_offset = cover_size = None
+        if entries and entries[0].compress_type == zipfile.ZIP_STORED:
+            cover_offset, cover_size = zf.data_offset(entries[0]), entries[0].compress_size
+    if existing:
+        writer, series, title = existing["writer"], existing["series"], existing["title"]
+        volume, language = existing["volume"], existing["language"]
+    else:
+        writer, title = parse_name(cbz.stem)
+        series, volume = detect_volume(title)
+        series = series if volume is not None else title
+        language = None
+    path = str(cbz)
+    row = (
+        path,
+        st.st_size,
+        st.st_mtime_ns,
+        writer,
+        series,
+        title,
+        volume,
+        language,
+        len(entries),
+        cover_offset,
+        cover_size,
+        int(time.time()),
+    )
+    pages = [(path, i, size, w, h) for i, (size, w, h) in enumerate(image_infos)]
+    return row, pages
+
+
+class Catalog:
+    """
+    书库目录（SQLite）：
+
+    - cbz：path（绝对路径）、size、mtime_ns、writer、series、title、volume、language、
+      pages（页数）、cover_offset / cover_size（STORED 封面数据的位置，否则 NULL）、indexed
+    - pages：path、page（0 起）、size、width、height
+    (size, mtime_ns) 与文件系统一致的 CBZ 视为未变化，不再打开；
+    WAL 模式，阅读器可在打包 / 更新进行时并发查询
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS cbz (path TEXT PRIMARY KEY, size INTEGER, "
+            "mtime_ns INTEGER, writer TEXT, series TEXT, title TEXT, volume INTEGER, "
+            "language TEXT, pages INTEGER, cover_offset INTEGER, cover_size INTEGER, "
+            "indexed INTEGER) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS pages (path TEXT REFERENCES cbz(path) "
+            "ON DELETE CASCADE, page INTEGER, size INTEGER, width INTEGER, height INTEGER, "
+            "PRIMARY KEY (path, page)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS cbz_series ON cbz(writer, series, volume);"
+            "CREATE INDEX IF NOT EXISTS cbz_language ON cbz(language);"
+            "CREATE INDEX IF NOT EXISTS cbz_volume ON cbz(volume);"
+        )
+        self.conn.commit()
+
+    def stamps(self, root_dir: Path) -> dict[str, tuple[int, int]]:
+        """root 下已登记 CBZ 的 {path: (size, mtime_ns)}"""
+        prefix = str(root_dir).rstrip(os.sep) + os.sep
+        rows = self.conn.execute(
+            "SELECT path, size, mtime_ns FROM cbz WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix),
+        )
+        return {path: (size, mtime) for path, size, mtime in rows}
+
+    def put(self, cbz: Path, st: os.stat_result | None = None) -> None:
+        """登记 / 刷新单个 CBZ（读取失败时删除其记录）"""
+        try:
+            st = st or cbz.stat()
+            row, pages = catalog_record(cbz, st)
+        except (OSError, zipfile.BadZipFile):
+            self.remove([str(cbz)])
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM cbz WHERE path = ?", (row[0],))
+            self.conn.execute(f"INSERT INTO cbz VALUES ({', '.join('?' * len(row))})", row)
+            self.conn.executemany("INSERT INTO pages VALUES (?, ?, ?, ?, ?)", pages)
+
+    def refresh(self, cbz: Path) -> None:
+        """文件的 (大小, mtime) 与记录不同（或未登记）时重新登记"""
+        try:
+            st = cbz.stat()
+        except OSError:
+            self.remove([str(cbz)])
+            return
+        row = self.conn.execute(
+            "SELECT size, mtime_ns FROM cbz WHERE path = ?", (str(cbz),)
+        ).fetchone()
+        if row != (st.st_size, st.st_mtime_ns):
+            self.put(cbz, st)
+
+    def remove(self, paths: list[str]) -> None:
+        with self.conn:
+            self.conn.executemany("DELETE FROM cbz WHERE path = ?", ((p,) for p in paths))
+
+    def query(self, sql: str) -> list[tuple]:
+        return self.conn.execute(sql).fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def open_catalog(path: Path | None) -> None:
+    """打开当前进程的书库目录（path 为 None 或打开失败时不维护）"""
+    global _catalog
+    if path is None:
+        return
+    try:
+        _catalog = Catalog(path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"[提示] 书库目录不可用（{e}），本次不更新目录")
+        _catalog = None
+
+
+def close_catalog() -> None:
+    """关闭当前进程的书库目录"""
+    global _catalog
+    if _catalog is not None:
+        with contextlib.suppress(sqlite3.Error):
+            _catalog.close()
+        _catalog = None
+
+
+def catalog_note(cbz: Path) -> None:
+    """打包 / 更新 / 追加写出 CBZ 后随手登记（未启用目录或登记失败时忽略）"""
+    if _catalog is not None:
+        try:
+            _catalog.refresh(cbz)
+        except sqlite3.Error as e:
+            print(f"  [提示] 书库目录未更新 {cbz.name}: {e}")
+
+
+def catalog_main(root_dir: Path, query: str | None = None) -> None:
+    """
+    目录模式（--catalog）：按文件系统增量刷新 root 下的书库目录，可附带内置查询
+
+    一次 rglob + stat 找出新增 / 大小或 mtime 变化的 CBZ，只打开这些 CBZ
+    （只读 central directory 与 ComicInfo.xml）；已不存在的 CBZ 从目录删除
+    """
+    catalog = _catalog
+    if catalog is None:
+        print("[错误] 书库目录未打开")
+        return
+    start = time.perf_counter()
+    known = catalog.stamps(root_dir)
+    seen: set[str] = set()
+    changed: list[tuple[Path, os.stat_result]] = []
+    for cbz in sorted(root_dir.rglob("*.cbz"), key=lambda p: natural_key(str(p))):
+        try:
+            st = cbz.stat()
+        except OSError:
+            continue
+        if not S_ISREG(st.st_mode):
+            continue
+        path = str(cbz)
+        seen.add(path)
+        if known.get(path) != (st.st_size, st.st_mtime_ns):
+            changed.append((cbz, st))
+    gone = [path for path in known if path not in seen]
+    for cbz, st in changed:
+        catalog.put(cbz, st)
+    catalog.remove(gone)
+    total = catalog.conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(pages), 0), COALESCE(SUM(size), 0) FROM cbz"
+    ).fetchone()
+    print("=" * 60)
+    print(
+        f"书库目录: {len(seen)} 个 CBZ，新增 / 变化 {len(changed)} 个，移除 {len(gone)} 个，"
+        f"用时 {time.perf_counter() - start:.2f} 秒"
+    )
+    print(f"  共 {total[0]} 个 CBZ、{total[1]} 页、{total[2] / 1024**3:.2f} GB — {catalog.path}")
+    print("=" * 60)
+    if query is None:
+        return
+    desc, sql = CATALOG_QUERIES[query]
+    start = time.perf_counter()
+    rows = catalog.query(sql)
+    print(f"{desc}：{len(rows)} 条（查询 {(time.perf_counter() - start) * 1000:.1f} ms）")
+    for row in rows:
+        print(f"  {row[0]}")
+
+
+# ---- 监视模式（--watch）----
+_WATCH_QUIET = 10.0  # 缺省静默窗口（秒）：文件夹这么久没有变化才视为下载完成
+_WATCH_POLL_INTERVAL = 5.0  # 轮询回退时两次检查之间的间隔（秒）
+# 下载中的临时文件后缀：文件夹内存在这些文件时视为仍在下载，继续等待
+_PARTIAL_SUFFIXES = {".part", ".crdownload", ".download", ".tmp", ".aria2", ".!qb", ".!ut"}
+
+# inotify 常量（<sys/inotify.h>）
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_INOTIFY_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_ONLYDIR
+)
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len（其后是 len 字节的文件名）
+
+
+def _is_own_output(name: str) -> bool:
+    """本脚本自己写出的文件（CBZ、并行打包的临时文件、原地更新日志、书库目录），不触发监视"""
+    lower = name.lower()
+    return lower.endswith(".cbz") or ".cbz." in lower or lower.startswith(_CATALOG_NAME)
+
+
+def _watch_signature(folder: Path) -> tuple:
+    """文件夹内容签名：(文件名, 大小, mtime_ns) 升序元组（不含本脚本的输出），目录不可读时为空"""
+    entries = []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file() and not _is_own_output(entry.name):
+                    st = entry.stat()
+                    entries.append((entry.name, st.st_size, st.st_mtime_ns))
+    except OSError:
+        return ()
+    return tuple(sorted(entries))
+
+
+class InotifyWatcher:
     """
-    更新模式：扫描 root 下所有 .cbz，逐个重新生成 ComicInfo.xml
+    Linux inotify 目录树监视（ctypes 直接调用 libc，无第三方依赖）
 
-    支持与打包模式一致的 --lang / --volume 模式（skip / fixed / interactive、skip / auto / input）：
-    - volume auto 时做系列级卷号推断（同系列存在更高卷号时，无卷号推断为第 1 卷）
-    - LanguageISO 交互时：已有语言「跳过=保留现状」，并提供「置空」选项去掉语言
-    - 图片条目原样复制（不重新压缩），仅替换 ComicInfo.xml，用新 CBZ 替换原文件
+    每个目录一个 watch，新建 / 移入的子目录（连同其下已有的子目录）自动加入；
+    wait() 阻塞在 select 上直到有事件或超时，空闲时不占 CPU
+    非 Linux（libc 无 inotify_init1）或初始化失败时构造函数抛出 AttributeError / OSError
     """
-    cbz_files = sorted(
-        (p for p in root_dir.rglob("*.cbz") if p.is_file()),
-        key=lambda p: natural_key(str(p.relative_to(root_dir))),
-    )
-    if not cbz_files:
-        print("未找到 CBZ 文件！")
-        return
 
-    # 第一遍：解析元数据 + （auto 时）系列级卷号推断
-    metas: list[dict] = []
-    for cbz in cbz_files:
-        writer, raw_title = parse_name(cbz.stem)
-        clean, explicit_vol = detect_volume(raw_title)
-        series = clean if explicit_vol is not None else raw_title
-        metas.append(
-            {
-                "cbz": cbz,
-                "writer": writer,
-                "raw_title": raw_title,
-                "series": series,
-                "explicit_vol": explicit_vol,
-                "series_key": f"{writer}|{series}",
-            }
-        )
-    inferred_map: dict[Path, int] = {}
-    if volume_mode == "auto":
-        groups: dict[str, list[dict]] = {}
-        for m in metas:
-            groups.setdefault(m["series_key"], []).append(m)
-        for m in metas:
-            if m["explicit_vol"] is None:
-                sibs = groups[m["series_key"]]
-                no_vol = [x for x in sibs if x["explicit_vol"] is None]
-                has_vol = [x["explicit_vol"] for x in sibs if x["explicit_vol"] is not None]
-                if len(no_vol) == 1 and has_vol and max(has_vol) > 1:
-                    inferred_map[m["cbz"]] = 1  # 推断为第 1 卷
+    def __init__(self, root: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._init = libc.inotify_init1
+        self._add_watch = libc.inotify_add_watch
+        self._rm_watch = libc.inotify_rm_watch
+        self.fd = self._init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 失败: {os.strerror(err)}")
+        self.paths: dict[int, Path] = {}  # watch 描述符 -> 目录
+        try:
+            self.add_tree(root)
+        except BaseException:
+            os.close(self.fd)  # 调用方会回退到轮询，不泄漏 inotify 实例
+            raise
+
+    def add_tree(self, top: Path) -> list[Path]:
+        """为 top 及其全部子目录加 watch，返回加入的目录；watch 数达到上限时抛出 OSError"""
+        added = []
+        for directory, _ in walk_directories(top, _list_library_dir):
+            wd = self._add_watch(self.fd, os.fsencode(directory), _INOTIFY_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch 数量达到上限（fs.inotify.max_user_watches）")
+                continue  # 目录已消失 / 无权限
+            self.paths[wd] = directory
+            added.append(directory)
+        return added
+
+    def _drop_tree(self, top: Path) -> None:
+        """目录被移走：移除它及其子目录的 watch（移入新位置时由 IN_MOVED_TO 重新加入）"""
+        for wd, directory in list(self.paths.items()):
+            if directory == top or top in directory.parents:
+                self._rm_watch(self.fd, wd)
+                del self.paths[wd]
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        """等待最多 timeout 秒（None 为一直等待），返回内容有变化的目录"""
+        touched: set[Path] = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return touched
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+                offset += _INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & _IN_Q_OVERFLOW:
+                    # 事件队列溢出：无法知道丢了哪些事件，全部目录重新检查（增量指纹跳过未变的）
+                    touched.update(self.paths.values())
+                    continue
+                directory = self.paths.get(wd)
+                if directory is None:
+                    continue
+                if mask & _IN_IGNORED:
+                    del self.paths[wd]
+                    continue
+                if not name:
+                    continue
+                path = directory / name
+                if mask & _IN_ISDIR:
+                    if mask & _IN_MOVED_FROM:
+                        self._drop_tree(path)
+                    elif mask & (_IN_CREATE | _IN_MOVED_TO):
+                        try:
+                            touched.update(self.add_tree(path))
+                        except OSError as e:
+                            print(f"  ⚠ 无法监视新目录 {path}: {e}")
+                elif not _is_own_output(name):
+                    touched.add(directory)
+        return touched
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    轮询回退（Windows / macOS / inotify 不可用）：每 interval 秒 stat 一遍已知目录，
+    只重新列举 mtime 变化（增删了条目）的目录；最近变化过的目录在 settle 秒内另比较内容签名，
+    以发现仍在写入的文件（追加写入不改变目录 mtime）
+    """
 
-    print("=" * 60)
-    print(f"CBZ 更新工具：找到 {len(cbz_files)} 个 CBZ")
-    print("=" * 60)
+    def __init__(self, root: Path, interval: float, settle: float):
+        self.interval = interval
+        self.settle = settle
+        self.dirs: dict[Path, int] = {}  # 目录 -> mtime_ns
+        self.recent: dict[Path, tuple[tuple, float]] = {}  # 目录 -> (内容签名, 最后变化时间)
+        self.next_poll = time.monotonic() + interval
+        self.add_tree(root)
+
+    def add_tree(self, top: Path) -> list[Path]:
+        """登记 top 及其全部子目录，返回登记的目录"""
+        added = []
+        for directory, _ in walk_directories(top, _list_library_dir):
+            try:
+                self.dirs[directory] = directory.stat().st_mtime_ns
+            except OSError:
+                continue
+            added.append(directory)
+        return added
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        """等待到下一次轮询或 timeout 秒（先到者），返回内容有变化的目录"""
+        now = time.monotonic()
+        delay = self.next_poll - now
+        if timeout is not None:
+            delay = min(delay, timeout)
+        if delay > 0:
+            time.sleep(delay)
+        now = time.monotonic()
+        touched: set[Path] = set()
+        if now < self.next_poll:
+            return touched
+        self.next_poll = now + self.interval
+        for directory, mtime in list(self.dirs.items()):
+            try:
+                current = directory.stat().st_mtime_ns
+            except OSError:
+                del self.dirs[directory]
+                self.recent.pop(directory, None)
+                continue
+            if current == mtime:
+                continue
+            self.dirs[directory] = current
+            touched.add(directory)
+            with contextlib.suppress(OSError), os.scandir(directory) as it:
+                for entry in it:
+                    sub = Path(entry.path)
+                    if entry.is_dir(follow_symlinks=False) and sub not in self.dirs:
+                        touched.update(self.add_tree(sub))
+        for directory, (signature, since) in list(self.recent.items()):
+            if directory in touched:
+                continue
+            current = _watch_signature(directory)
+            if current != signature:
+                self.recent[directory] = (current, now)
+                touched.add(directory)
+            elif now - since > self.settle:
+                del self.recent[directory]
+        for directory in touched:
+            self.recent[directory] = (_watch_signature(directory), now)
+        return touched
+
+    def close(self) -> None:
+        pass
+
+
+def watch_pack_folders(folders: list[Path], root_dir: Path, settings: dict) -> None:
+    """
+    打包监视模式中已静默的文件夹（只列举这些文件夹与卷号推断所需的同系列文件夹，不扫描整棵树）
 
-    updated = 0
-    for idx, m in enumerate(metas, 1):
-        cbz = m["cbz"]
+    settings: out_dir / volume_mode / language_iso_mode / lang_fixed / conflict_mode /
+    delete_mode / jobs / threads / force_pillow / profile / optimize（启动时确定，不再询问）
+    打包总是增量的：打包指纹未变的文件夹（如重复事件、事件队列溢出后的全量检查）直接跳过
+    """
+    index: dict[Path, dict] = {}
+    metas: list[dict] = []
+    for folder in folders:
         try:
-            cur_lang = _read_cbz_language(cbz) if language_iso_mode == "interactive" else None
-            # Volume 解析（auto 静默；input 交互，prompt 含文件名可识别）
-            title, volume = resolve_volume(
-                m["raw_title"], cbz.name, volume_mode, inferred_map.get(cbz)
-            )
-            vol_str = f"Vol.{volume}" if volume is not None else "无卷号"
-            lang_str = cur_lang if cur_lang else "无"
+            depth = len(folder.relative_to(root_dir).parts)
+            _, (images, others) = _list_library_dir(folder)
+        except (OSError, ValueError):
+            continue  # 已被移走 / 删除
+        if not images:
+            continue  # 系列文件夹、已删除源图片的文件夹等
+        images.sort(key=lambda item: natural_key(item[0].name))
+        index[folder] = {"depth": depth, "images": images, "others": others}
+        metas.append(comic_meta(folder, root_dir, depth, images))
+    if not metas:
+        return
+    metas.sort(key=lambda m: natural_key(str(m["folder"].relative_to(root_dir))))
 
-            # 先打印分隔与当前项标题，再询问语言，避免与上一项看混
-            print("-" * 60)
-            print(f"  [{idx}/{len(metas)}] {cbz.name}")
-            print(f"       系列: {m['series']} | {vol_str} | 当前语言: {lang_str}")
-            lang_iso = choose_language(
-                cbz.name, language_iso_mode, lang_fixed, current_lang=cur_lang
-            )
+    volume_mode = settings["volume_mode"]
+    volume_map: dict[Path, int | None] = {}
+    if volume_mode == "auto":
+        # 卷号推断需要同系列的其他卷（"无卷号推断为第 1 卷"），只列举这些系列文件夹
+        context = list(metas)
+        for series in {m["folder"].parent for m in metas if m["depth"] >= 2}:
+            try:
+                subdirs, _ = _list_library_dir(series)
+            except OSError:
+                continue
+            for sub in subdirs:
+                if sub in index:
+                    continue
+                with contextlib.suppress(OSError):
+                    if _list_library_dir(sub)[1][0]:
+                        depth = len(sub.relative_to(root_dir).parts)
+                        context.append(comic_meta(sub, root_dir, depth, []))
+        volume_map = infer_volumes(context)
+
+    print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] {len(metas)} 个文件夹已就绪，开始打包...")
+    tasks = plan_pack(
+        metas,
+        root_dir,
+        settings["out_dir"],
+        volume_mode,
+        volume_map,
+        settings["language_iso_mode"],
+        settings["lang_fixed"],
+        settings["conflict_mode"],
+        True,
+        settings["profile"],
+        settings["optimize"],
+    )
+    # 日志只为删除前的完整性检查记录完成情况（与 --resume 的日志分开，批次结束即删除）
+    journal = PackJournal(pack_journal_path(root_dir).with_suffix(".watch.jsonl"), root_dir)
+    success_folders, fail_folders, uptodate_folders = run_pack_plan(
+        tasks, root_dir, settings["jobs"], settings["force_pillow"], journal
+    )
+    summary = f"成功 {len(success_folders)} 个"
+    if uptodate_folders:
+        summary += f"，已是最新 {len(uptodate_folders)} 个"
+    if fail_folders:
+        summary += f"，失败 {len(fail_folders)} 个"
+    print(f"  {summary}")
+    if settings["delete_mode"] == "delete" and success_folders:
+        deleted = delete_source_folders(
+            success_folders, index, root_dir, journal, threads=settings["threads"]
+        )
+        print(f"  已删除 {deleted} 个源文件夹")
+    journal.finish()
 
-            # 读取 CBZ 内图片元数据（大小 + 宽高）
-            with zipfile.ZipFile(str(cbz)) as zf:
-                names = sorted(
-                    (n for n in zf.namelist() if Path(n).suffix.lower() in IMAGE_EXTENSIONS),
-                    key=natural_key,
-                )
-                image_infos: list[tuple[int, int | None, int | None]] = []
-                images: dict[str, tuple[bytes, int]] = {}
-                for n in names:
-                    data = zf.read(n)
-                    width, height = read_image_size(data)
-                    image_infos.append((len(data), width, height))
-                    images[n] = (data, zf.getinfo(n).compress_type)
-
-                xml_content = build_comic_info_xml(
-                    title,
-                    m["series"],
-                    m["writer"],
-                    image_infos,
-                    volume=volume,
-                    language_iso=lang_iso,
-                )
 
-                # 重写 CBZ：图片原样复制 + 新 ComicInfo.xml，再替换原文件
-                tmp = cbz.with_name(cbz.name + ".tmp")
-                with zipfile.ZipFile(str(tmp), "w") as zf_out:
-                    zf_out.writestr("ComicInfo.xml", xml_content)
-                    for n, (data, ct) in images.items():
-                        zf_out.writestr(n, data, compress_type=ct)
-            os.replace(tmp, cbz)
+def watch_main(
+    root_dir: Path,
+    settings: dict,
+    quiet: float = _WATCH_QUIET,
+    interval: float = _WATCH_POLL_INTERVAL,
+) -> None:
+    """
+    监视模式（--watch）：持续监视 root，新增或变化的漫画文件夹静默 quiet 秒后自动打包
 
-            new_lang = lang_iso if lang_iso else "无语言"
-            print(f"  ✓ 已更新（{len(image_infos)}页 {vol_str} 语言:{new_lang}）")
-            updated += 1
-        except Exception as e:
-            print(f"  ✗ 更新 {cbz.name} 失败: {e}")
-    print("=" * 60)
-    print(f"已更新 {updated} 个 CBZ")
+    Linux 用 inotify（事件驱动，空闲时阻塞在 select 上，不占 CPU），其余平台或 inotify
+    不可用时每 interval 秒轮询一次目录 mtime。文件夹内任何文件（图片或下载临时文件）
+    有变化都会重新计时；含 .part / .crdownload 等下载临时文件时继续等待。
+    启动时已存在的文件夹不打包（先正常运行一次）；不重命名文件夹（下载工具可能仍在写入）
+    Ctrl+C 退出
+    """
+    try:
+        watcher = InotifyWatcher(root_dir)
+        method = "inotify"
+        count = len(watcher.paths)
+    except (AttributeError, OSError) as e:
+        if not isinstance(e, AttributeError):
+            print(f"[提示] inotify 不可用（{e}），改为轮询")
+        watcher = PollingWatcher(root_dir, interval, quiet)
+        method = f"每 {interval:g} 秒轮询"
+        count = len(watcher.dirs)
+    print(f"监视 {root_dir}（{count} 个目录，{method}，静默 {quiet:g} 秒后打包），Ctrl+C 退出")
+    sys.stdout.flush()
+    pending: dict[Path, float] = {}  # 目录 -> 静默期截止时间（time.monotonic）
+    try:
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0.0, min(pending.values()) - time.monotonic())
+            for directory in watcher.wait(timeout):
+                pending[directory] = time.monotonic() + quiet
+            now = time.monotonic()
+            ready = []
+            for directory, deadline in list(pending.items()):
+                if deadline > now:
+                    continue
+                del pending[directory]
+                with contextlib.suppress(OSError):
+                    if any(
+                        os.path.splitext(name)[1].lower() in _PARTIAL_SUFFIXES
+                        for name in os.listdir(directory)
+                    ):
+                        pending[directory] = now + quiet  # 仍在下载
+                        continue
+                ready.append(directory)
+            if ready:
+                watch_pack_folders(ready, root_dir, settings)
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        print("\n已停止监视。")
+    finally:
+        watcher.close()
 
 
 def wait_for_exit():
@@ -842,6 +4602,54 @@ def main() -> None:
     parser.add_argument(
         "-k", "--keep", action="store_true", help="打包后保留源文件夹（不询问，默认行为）"
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help=(
+            "并行打包进程数（缺省 1 串行；0 表示 CPU 核数），交互选择在打包前统一完成；"
+            "--update 的并行进程数（需要交互时串行）；--verify 的校验进程数（缺省 CPU 核数）"
+        ),
+    )
+    parser.add_argument(
+        "--pillow",
+        action="store_true",
+        help="强制用 Pillow 读取图片宽高（旧行为，跳过内置文件头解析）",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=sorted(TRANSCODE_PROFILES),
+        default=None,
+        help=(
+            "打包时按设备配置转码页面（缩小分辨率并重新编码，需要 Pillow）："
+            + "；".join(f"{name} {spec['desc']}" for name, spec in TRANSCODE_PROFILES.items())
+        ),
+    )
+    parser.add_argument(
+        "--optimize-lossless",
+        action="store_true",
+        help=(
+            "无损优化页面（打包与 --update）：删除 JPEG 元数据段、PNG 以最高级别重新压缩、"
+            "RGB 实为灰度的 PNG 转单通道，输出每个 CBZ 节省的字节数"
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="续传上次中断的打包：跳过已完成且校验通过的文件夹，继续其余文件夹与删除阶段",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="增量打包：已有 CBZ 的打包指纹与文件夹一致（页面与元数据未变）时跳过",
+    )
+    parser.add_argument(
+        "--scan-threads",
+        type=int,
+        default=8,
+        help="并发扫描 / 删除目录的线程数（缺省 8；NAS/网络共享可调大，1 为逐目录处理）",
+    )
     parser.add_argument("-y", "--yes", action="store_true", help="跳过所有确认")
     parser.add_argument("--dry-run", action="store_true", help="仅预览，不实际打包")
     parser.add_argument(
@@ -853,16 +4661,137 @@ def main() -> None:
             "（支持与打包一致的 --lang / --volume，图片原样保留）"
         ),
     )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="更新模式下整体重写 CBZ（清除原地更新残留的旧 ComicInfo.xml / 旧目录）",
+    )
+    parser.add_argument(
+        "--since",
+        type=parse_since,
+        default=None,
+        metavar="TIME",
+        help="更新模式只处理此后修改过的 CBZ（2026-10-01、2026-10-01T08:00 或 12h、7d）",
+    )
+    parser.add_argument(
+        "--glob",
+        action="append",
+        default=None,
+        metavar="PATTERN",
+        help="更新模式只处理相对路径或文件名匹配的 CBZ（可重复，任一匹配即可）",
+    )
+    parser.add_argument(
+        "--series",
+        default=None,
+        metavar="TEXT",
+        help="更新模式只处理系列名包含该文本的 CBZ（不区分大小写）",
+    )
+    parser.add_argument(
+        "--missing-lang",
+        action="store_true",
+        help="更新模式只处理 ComicInfo.xml 中没有 LanguageISO 的 CBZ",
+    )
+    parser.add_argument(
+        "--append-to",
+        metavar="CBZ",
+        default=None,
+        help="将 root 内的图片作为新页原地追加到指定 CBZ 末尾（不重写已有页）",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "监视模式：持续监视 root，新增 / 变化的漫画文件夹静默一段时间后自动打包"
+            "（Linux 用 inotify，其余平台轮询；Ctrl+C 退出）"
+        ),
+    )
+    parser.add_argument(
+        "--watch-quiet",
+        type=float,
+        default=_WATCH_QUIET,
+        metavar="SECONDS",
+        help=f"监视模式的静默窗口：文件夹多少秒内无变化才打包（缺省 {_WATCH_QUIET:g}）",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=_WATCH_POLL_INTERVAL,
+        metavar="SECONDS",
+        help=f"监视模式无 inotify 时的轮询间隔（缺省 {_WATCH_POLL_INTERVAL:g}）",
+    )
+    parser.add_argument(
+        "--profile-report",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="JSON",
+        help=(
+            "打包结束时输出分阶段计时（墙钟 / CPU / 读写字节 / 系统调用次数、最慢文件夹、"
+            "峰值内存）；给出文件名时另写 JSON（Chrome trace 格式）"
+        ),
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help=(
+            "校验 root 下所有 CBZ（或 root 指定的单个 CBZ）：central directory 一致性、"
+            "各条目 CRC、ComicInfo.xml 的 PageCount / Pages / 页面大小与宽高，多进程并行"
+        ),
+    )
+    parser.add_argument(
+        "--find-duplicates",
+        action="store_true",
+        help="查找 root 下重复 / 近似重复的 CBZ 与散图文件夹（只读，CBZ 只读 central directory）",
+    )
+    parser.add_argument(
+        "--catalog",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="FILE",
+        help=(
+            f"建立 / 增量刷新书库目录（SQLite，缺省 root/{_CATALOG_NAME}）：每个 CBZ 的"
+            "系列、卷号、语言、页数、页面宽高与封面位置；目录存在时打包与 --update 随手更新"
+        ),
+    )
+    parser.add_argument(
+        "--catalog-query",
+        choices=sorted(CATALOG_QUERIES),
+        default=None,
+        help="刷新书库目录后执行内置查询（missing-lang 无语言、volume-gaps 缺卷等）",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不使用页面元数据缓存（每次都重新读取图片宽高）",
+    )
+    parser.add_argument(
+        "--cache-file",
+        default=None,
+        help=f"页面元数据缓存文件（缺省 {default_cache_path()}）",
+    )
+    parser.add_argument("--cache-stats", action="store_true", help="结束时输出页面缓存命中统计")
     args = parser.parse_args()
+    # -j 缺省：打包串行，--verify 用全部 CPU 核；0 表示 CPU 核数
+    cpus = os.cpu_count() or 1
+    if args.jobs is None:
+        jobs = cpus if args.verify else 1
+    else:
+        jobs = args.jobs if args.jobs > 0 else cpus
 
-    # 检测依赖
+    # 检测依赖：内置头部解析覆盖常见格式，Pillow 仅作回退；--pillow 时必须安装
     if Image is None:
-        print("[错误] 未找到 Pillow，无法读取图片宽高。请先安装依赖：")
-        print(
-            "  uv pip install --python scripts/.venv/Scripts/python.exe -r scripts/requirements.txt"
-        )
-        wait_for_exit()
-        return
+        if args.pillow or args.profile:
+            flag = "--pillow" if args.pillow else "--profile"
+            print(f"[错误] 未找到 Pillow，无法使用 {flag}。请先安装依赖：")
+            print(
+                "  uv pip install --python scripts/.venv/Scripts/python.exe"
+                " -r scripts/requirements.txt"
+            )
+            wait_for_exit()
+            return
+        print("[提示] 未找到 Pillow：仅用内置头部解析读取宽高")
+        print("       （JPEG/PNG/WebP/GIF/BMP/AVIF/HEIF；其余格式不写 ImageWidth/ImageHeight）")
 
     print("=" * 60)
     print("批量 CBZ 打包工具")
@@ -888,11 +4817,64 @@ def main() -> None:
             root_dir = selected.resolve() if selected else default_dir
         else:
             root_dir = default_dir
+    # 校验模式：只读，root 可以是单个 CBZ
+    if args.verify and root_dir.is_file():
+        ok = verify_main(root_dir, jobs)
+        wait_for_exit()
+        sys.exit(0 if ok else 1)
     if not root_dir.is_dir():
         print(f"[错误] 目录不存在 / Directory not found: {root_dir}")
         wait_for_exit()
+        sys.exit(1)
+
+    # 分阶段计时（--profile-report）：从这里开始计总用时
+    if args.profile_report is not None:
+        global _profiler
+        _profiler = Profiler()
+
+    # 页面元数据缓存（--no-cache 关闭；--cache-file 指定位置）
+    if not args.no_cache:
+        open_page_cache(Path(args.cache_file) if args.cache_file else default_cache_path())
+
+    if args.verify:
+        ok = verify_main(root_dir, jobs)
+        wait_for_exit()
+        sys.exit(0 if ok else 1)
+
+    # 重复检测模式：只读，不打包
+    if args.find_duplicates:
+        find_duplicates_main(root_dir, args.scan_threads)
+        wait_for_exit()
         return
 
+    # 书库目录：--catalog / --catalog-query 时打开（缺省 root 下的 .cbz_catalog.sqlite）；
+    # 已存在时打包 / 更新 / 追加写出 CBZ 后随手登记
+    catalog_path = Path(args.catalog).resolve() if args.catalog else default_catalog_path(root_dir)
+    catalog_mode = args.catalog is not None or args.catalog_query is not None
+    if catalog_mode or catalog_path.is_file():
+        open_catalog(catalog_path)
+    if catalog_mode and not (args.update or args.append_to):
+        catalog_main(root_dir, args.catalog_query)
+        wait_for_exit()
+        return
+
+    # 追加模式：root 内的图片作为新页原地追加到已有 CBZ
+    if args.append_to:
+        target = Path(args.append_to).resolve()
+        ok = False
+        if not target.is_file():
+            print(f"[错误] CBZ 不存在: {target}")
+        else:
+            try:
+                append_main(root_dir, target, args.pillow)
+                ok = True
+            except Exception as e:
+                print(f"  ✗ 追加到 {target.name} 失败: {e}")
+        if args.cache_stats:
+            print_cache_stats()
+        wait_for_exit()
+        sys.exit(0 if ok else 1)
+
     # 更新模式：重写已有 CBZ 的 ComicInfo.xml（支持与打包一致的 --lang / --volume 模式）
     if args.update:
         language_iso_mode, lang_fixed = ask_lang_mode(args)
@@ -900,9 +4882,26 @@ def main() -> None:
         volume_labels = {"skip": "跳过（不生成）", "auto": "自动检测", "input": "交互式输入"}
         print(f"Volume 模式: {volume_labels[volume_mode]}")
         print()
-        update_main(root_dir, language_iso_mode, lang_fixed, volume_mode)
+        ok = update_main(
+            root_dir,
+            language_iso_mode,
+            lang_fixed,
+            volume_mode,
+            args.pillow,
+            args.compact,
+            args.optimize_lossless,
+            {
+                "since": args.since,
+                "globs": args.glob,
+                "series": args.series,
+                "missing_lang": args.missing_lang,
+            },
+            jobs,
+        )
+        if args.cache_stats:
+            print_cache_stats()
         wait_for_exit()
-        return
+        sys.exit(0 if ok else 1)
 
     out_dir = Path(args.out).resolve() if args.out else None
     print(f"根目录: {root_dir}")
@@ -955,16 +4954,68 @@ def main() -> None:
     print(f"冲突处理方案: {conflict_labels[conflict_mode]}")
     print()
 
+    # 监视模式：之后无人值守，逐文件夹交互的选项无法使用
+    if args.watch:
+        if language_iso_mode == "interactive" or volume_mode == "input" or conflict_mode == "ask":
+            print(
+                "[错误] 监视模式不支持逐文件夹交互"
+                "（--lang interactive / --volume input / --conflict ask）"
+            )
+            wait_for_exit()
+            return
+        settings = {
+            "out_dir": out_dir,
+            "volume_mode": volume_mode,
+            "language_iso_mode": language_iso_mode,
+            "lang_fixed": lang_fixed,
+            "conflict_mode": conflict_mode,
+            "delete_mode": delete_mode,
+            "jobs": jobs,
+            "threads": args.scan_threads,
+            "force_pillow": args.pillow,
+            "profile": args.profile,
+            "optimize": args.optimize_lossless,
+        }
+        watch_main(root_dir, settings, args.watch_quiet, args.watch_interval)
+        if args.cache_stats:
+            print_cache_stats()
+        return
+
+    # 打包日志：上次运行中断（Ctrl+C / 掉电 / 磁盘写满）时可 --resume 续传
+    journal_path = pack_journal_path(root_dir)
+    resumed = load_pack_journal(journal_path)
+    if resumed is not None and not args.resume:
+        print(
+            f"[提示] 上次打包未正常结束（已完成 {len(resumed['done'])}/{resumed['planned']} 个），"
+            "可用 --resume 续传；本次从头开始"
+        )
+        resumed = None
+    elif args.resume and resumed is None:
+        print("[提示] 没有未完成的打包记录，从头开始")
+    if resumed is not None:
+        # 清理中断时正在写的临时文件
+        for staging in resumed["staging"]:
+            with contextlib.suppress(OSError):
+                staging.unlink()
+
     # 扫描包含图片的文件夹
     print("正在扫描图片文件夹...")
-    comics = find_comic_folders(root_dir)
+    scan_stats: dict = {}
+    with profile_phase("scan"):
+        index = scan_library(root_dir, args.scan_threads, scan_stats)
+        comics = find_comic_folders(root_dir, index)
+    rate = scan_stats["dirs"] / max(scan_stats["seconds"], 1e-6)
+    print(
+        f"扫描 {scan_stats['dirs']} 个目录，用时 {scan_stats['seconds']:.2f} 秒"
+        f"（{rate:.0f} 目录/秒）"
+    )
 
     if not comics:
         print("未找到包含图片的文件夹！")
         wait_for_exit()
         return
 
-    total_images = sum(len(get_image_files(folder)) for folder, _ in comics)
+    total_images = sum(len(index[folder]["images"]) for folder, _ in comics)
     print(f"\n找到 {len(comics)} 个包含图片的文件夹，共 {total_images} 张图片：")
     if language_iso_mode != "skip":
         if language_iso_mode == "fixed":
@@ -979,29 +5030,56 @@ def main() -> None:
     # 收集元数据 + 推断卷号
     # auto 模式：同系列存在更高卷号时，无显式卷号的漫画自动推断为第 1 卷
     metas: list[dict] = []
-    for folder, depth in comics:
-        meta = derive_metadata(folder, root_dir, depth)
-        meta["folder"] = folder
-        meta["depth"] = depth
-        # series 分组键：两层结构用外层系列文件夹路径，单层结构每本自成一组
-        meta["series_key"] = str(folder.parent) if depth >= 2 else str(folder)
-        # 系列头显示名：两层用外层文件夹名（含 [作者]），单层用本文件夹名
-        meta["series_display"] = folder.parent.name if depth >= 2 else folder.name
-        metas.append(meta)
-    volume_map: dict[Path, int | None] = infer_volumes(metas) if volume_mode == "auto" else {}
-
-    # 按卷号排序（仅 auto 模式）：先按系列分组（自然序），系列内按推断卷号升序，
-    # 无卷号的排本系列最后；skip/input 模式保持名称顺序
-    if volume_mode == "auto":
-        metas.sort(
-            key=lambda m: (
-                natural_key(m["series_key"]),
-                volume_map[m["folder"]] if volume_map[m["folder"]] is not None else 10**9,
-                natural_key(m["title"]),
+    with profile_phase("metadata"):
+        for folder, depth in comics:
+            metas.append(comic_meta(folder, root_dir, depth, index[folder]["images"]))
+    with profile_phase("volume"):
+        volume_map: dict[Path, int | None] = infer_volumes(metas) if volume_mode == "auto" else {}
+
+        # 按卷号排序（仅 auto 模式）：先按系列分组（自然序），系列内按推断卷号升序，
+        # 无卷号的排本系列最后；skip/input 模式保持名称顺序
+        if volume_mode == "auto":
+            metas.sort(
+                key=lambda m: (
+                    natural_key(m["series_key"]),
+                    volume_map[m["folder"]] if volume_map[m["folder"]] is not None else 10**9,
+                    natural_key(m["title"]),
+                )
             )
-        )
-        # 同步打包循环顺序（预览遍历 metas，打包遍历 comics）
-        comics = [(m["folder"], m["depth"]) for m in metas]
+            # 同步打包循环顺序（预览遍历 metas，打包遍历 comics）
+            comics = [(m["folder"], m["depth"]) for m in metas]
+
+    # 续传：上次已完成、页面未变且 CBZ 校验通过的文件夹不再打包（卷号推断仍基于全部文件夹）
+    # 上次删除到一半的文件夹只剩部分页面：CBZ 完好时只补完删除，否则保留现场，都不重新打包
+    carried: dict[Path, dict] = {}
+    interrupted: list[Path] = []
+    if resumed is not None:
+        remaining = []
+        for meta in metas:
+            folder = meta["folder"]
+            record = resumed["done"].get(folder)
+            if record is not None and folder in resumed["deleting"]:
+                if verify_packed_cbz(Path(record["cbz"]), record):
+                    carried[folder] = record
+                    interrupted.append(folder)
+                else:
+                    print(
+                        f"  ⚠ {folder.name} 上次删除中断且 CBZ 未通过完整性检查，跳过（请手动检查）"
+                    )
+            elif (
+                record is not None
+                and folder not in resumed["deleted"]
+                and record["digest"] == _pages_digest(meta["images"])
+                and verify_packed_cbz(Path(record["cbz"]), record)
+            ):
+                carried[folder] = record
+            else:
+                remaining.append(meta)
+        metas = remaining
+        total_images = sum(len(m["images"]) for m in metas)
+        print(f"续传：跳过上次已完成的 {len(carried)} 个文件夹")
+        if interrupted:
+            print(f"续传：{len(interrupted)} 个文件夹上次删除中断，将补完删除")
 
     # ---- 预览：按系列分组、列对齐显示（* = 推断卷号，? = 待逐文件夹选择）----
     print("=" * 72)
@@ -1010,7 +5088,7 @@ def main() -> None:
     prev_key = None
     for meta in metas:
         folder = meta["folder"]
-        n = len(get_image_files(folder))
+        n = len(meta["images"])
 
         # 卷号显示（* 表示推断）
         volume_str = "-"
@@ -1056,122 +5134,43 @@ def main() -> None:
             wait_for_exit()
             return
 
-    # 逐文件夹打包
-    success_folders: list[Path] = []
-    fail_folders: list[Path] = []
-    success_cbzs = 0
-
-    print("\n开始打包...")
-    for folder, depth in comics:
-        try:
-            meta = derive_metadata(folder, root_dir, depth)
-
-            # ---- Volume 处理（复用抽象函数，与更新模式一致）----
-            clean, volume = resolve_volume(
-                meta["title"], meta["cbz_name"], volume_mode, volume_map.get(folder)
-            )
-            meta["title"] = clean
-            if depth <= 1:
-                meta["series"] = clean  # 一层时 title == series
-
-            # ---- LanguageISO 逐文件夹处理（复用抽象函数）----
-            lang_iso = choose_language(meta["cbz_name"], language_iso_mode, lang_fixed)
-
-            # 排序图片：固定按名称升序（自然排序），命名已由重命名脚本保证顺序
-            images = get_image_files(folder)
-            images.sort(key=lambda f: natural_key(f.name))
-
-            # 读取图片元数据（大小 + 宽高）
-            image_infos: list[tuple[int, int | None, int | None]] = []
-            for img in images:
-                size = img.stat().st_size
-                width, height = read_image_size(img)
-                image_infos.append((size, width, height))
-
-            xml_content = build_comic_info_xml(
-                meta["title"],
-                meta["series"],
-                meta["writer"],
-                image_infos,
-                volume=volume,
-                language_iso=lang_iso,
-            )
-
-            # 决定 CBZ 输出位置：
-            # - 两层结构（漫画在 series 内）：放 series 文件夹内，与漫画文件夹同级，不嵌套
-            # - 单层结构（单个漫画直接含图）：放漫画文件夹内部，避免上移到根目录
-            if out_dir:
-                cbz_dir = out_dir
-            elif depth >= 2:
-                cbz_dir = folder.parent
-            else:
-                cbz_dir = folder
-            cbz_path = cbz_dir / f"{meta['cbz_name']}.cbz"
-
-            # 文件名冲突处理（--conflict 决定：覆盖 / 自动重命名 / 逐文件询问）
-            if cbz_path.exists():
-                if conflict_mode == "overwrite":
-                    pass  # 直接覆盖
-                elif conflict_mode == "rename":
-                    cbz_path = find_available_path(cbz_path)
-                    print(f"  ↪ 文件名冲突，自动重命名为: {cbz_path.name}")
-                elif conflict_mode == "ask":
-                    print(f"  ⚠ {cbz_path.name} 已存在，如何处理？")
-                    print("    1. 覆盖   2. 自动重命名   3. 手动输入文件名   4. 跳过")
-                    ch = ask_option(
-                        "    请选择 (1-4，直接回车默认跳过): ",
-                        {"1", "2", "3", "4"},
-                        "4",
-                    )
-                    if ch == "2":
-                        cbz_path = find_available_path(cbz_path)
-                        print(f"  ↪ 自动重命名为: {cbz_path.name}")
-                    elif ch == "3":
-                        renamed = False
-                        while True:
-                            new_name = input(
-                                "    请输入新文件名（含扩展名，直接回车跳过）: "
-                            ).strip()
-                            if not new_name:
-                                break
-                            new_path = cbz_dir / new_name
-                            if new_path.exists():
-                                print(f"    ⚠ {new_name} 也已存在，请换一个名字")
-                                continue
-                            cbz_path = new_path
-                            renamed = True
-                            break
-                        if not renamed:
-                            print(f"  ⚠ 跳过: {cbz_path.name}")
-                            fail_folders.append(folder)
-                            continue
-                    elif ch != "1":
-                        print(f"  ⚠ 跳过: {cbz_path.name}")
-                        fail_folders.append(folder)
-                        continue
-
-            cbz_dir.mkdir(parents=True, exist_ok=True)
-            create_cbz(images, cbz_path, xml_content)
-            # 简洁成功信息：相对路径 + 页数 + 卷号 + 语言
-            try:
-                rel_cbz = cbz_path.relative_to(root_dir)
-            except ValueError:
-                rel_cbz = cbz_path
-            info = f"{len(images)}页"
-            if volume is not None:
-                info += f" Vol.{volume}"
-            if lang_iso:
-                info += f" {lang_iso}"
-            print(f"  ✓ {rel_cbz}（{info}）")
-            success_folders.append(folder)
-            success_cbzs += 1
-
-        except Exception as e:
-            print(f"  ✗ 打包 {folder} 时出错: {e}")
-            fail_folders.append(folder)
+    # 先生成打包计划（所有交互在此完成），再串行或并行（--jobs）执行
+    with profile_phase("plan"):
+        tasks = plan_pack(
+            metas,
+            root_dir,
+            out_dir,
+            volume_mode,
+            volume_map,
+            language_iso_mode,
+            lang_fixed,
+            conflict_mode,
+            args.incremental,
+            args.profile,
+            args.optimize_lossless,
+        )
+    notes = []
+    if jobs > 1:
+        notes.append(f"{jobs} 进程并行")
+    if args.profile:
+        notes.append(f"转码 {TRANSCODE_PROFILES[args.profile]['desc']}")
+    if args.optimize_lossless:
+        notes.append("无损优化")
+    print(f"\n开始打包（{'，'.join(notes)}）..." if notes else "\n开始打包...")
+    journal = PackJournal(journal_path, root_dir)
+    for record in carried.values():
+        journal.record(**record)
+    for folder in interrupted:
+        journal.record("deleting", folder=folder)  # 再次中断时仍只补完删除
+    success_folders, fail_folders, uptodate_folders = run_pack_plan(
+        tasks, root_dir, jobs, args.pillow, journal
+    )
+    success_cbzs = len(success_folders)
 
     print()
     print(f"成功打包: {success_cbzs} 个 CBZ")
+    if uptodate_folders:
+        print(f"已是最新（跳过）: {len(uptodate_folders)} 个")
     if fail_folders:
         print(f"失败: {len(fail_folders)} 个")
 
@@ -1185,81 +5184,49 @@ def main() -> None:
         target = folder if depth <= 1 else folder.parent
         if target not in candidates:
             candidates.append(target)
-    for cand in candidates:
-        new_name = clean_folder_name(cand.name)
-        if new_name == cand.name:
-            continue
-        new_path = cand.with_name(new_name)
-        if new_path.exists():
-            print(f"  ⚠ 目标文件夹已存在，跳过重命名: {new_path}")
-            continue
-        try:
-            cand.rename(new_path)
-            rename_map[cand] = new_path
-            print(f"  ↪ 重命名文件夹: {cand.name} -> {new_name}")
-        except Exception as e:
-            print(f"  ✗ 重命名 {cand.name} 失败: {e}")
-
-    # 若外层 series 被重命名，更新 success_folders 路径（供删除源文件夹使用）
-    if rename_map:
-        updated_success: list[Path] = []
-        for p in success_folders:
-            for old, new in rename_map.items():
-                if p == old or old in p.parents:
-                    p = new / p.relative_to(old)
-                    break
-            updated_success.append(p)
-        success_folders = updated_success
+    with profile_phase("rename"):
+        for cand in candidates:
+            new_name = clean_folder_name(cand.name)
+            if new_name == cand.name:
+                continue
+            new_path = cand.with_name(new_name)
+            if new_path.exists():
+                print(f"  ⚠ 目标文件夹已存在，跳过重命名: {new_path}")
+                continue
+            try:
+                cand.rename(new_path)
+                rename_map[cand] = new_path
+                journal.record("rename", old=cand, new=new_path)
+                print(f"  ↪ 重命名文件夹: {cand.name} -> {new_name}")
+            except Exception as e:
+                print(f"  ✗ 重命名 {cand.name} 失败: {e}")
 
     # 删除策略：根据开头选择的删除模式执行
     delete_folders = delete_mode == "delete"
 
-    deleted = 0
-    if delete_folders and success_folders:
+    # 删除已打包的源文件夹（含续传时上次已完成的）；上次删除中断的文件夹无论删除模式都补完。
+    # 外层 series 被重命名时按 rename_map 换算当前路径，完整性检查在 delete_source_folders 中
+    delete_targets = success_folders + list(carried) if delete_folders else list(interrupted)
+    if delete_targets:
         print("\n删除源文件夹...")
-        # 先删深层，再删浅层，避免父目录残留
-        # 关键：排除刚生成的 .cbz（单个漫画/根目录场景 CBZ 就在源文件夹内），
-        # 删除其余源文件；删除后若文件夹已空且不是根目录，再移除空文件夹本身
-        for folder in sorted(success_folders, key=lambda p: len(p.parts), reverse=True):
-            try:
-                if not (folder.exists() and folder.is_dir()):
-                    continue
-                # 提示将一并删除的非图片、非 CBZ 文件
-                others = [
-                    f
-                    for f in folder.iterdir()
-                    if f.is_file()
-                    and f.suffix.lower() not in IMAGE_EXTENSIONS
-                    and f.suffix.lower() != ".cbz"
-                ]
-                if others:
-                    print(f"  ⚠ {folder.name} 含 {len(others)} 个非图片文件，将一并删除")
-                for item in list(folder.iterdir()):
-                    if item.is_file() and item.suffix.lower() == ".cbz":
-                        continue  # 保留生成的 CBZ
-                    if item.is_dir():
-                        shutil.rmtree(item)
-                    else:
-                        item.unlink()
-                # 删除后若文件夹已空且不是根目录，移除空文件夹本身
-                if folder != root_dir and not any(folder.iterdir()):
-                    folder.rmdir()
-                try:
-                    rel_del = folder.relative_to(root_dir)
-                    if str(rel_del) == ".":
-                        rel_del = f"<根目录: {root_dir.name}>"
-                except ValueError:
-                    rel_del = folder
-                print(f"  已删除: {rel_del}")
-                deleted += 1
-            except Exception as e:
-                print(f"  ✗ 删除 {folder} 时出错: {e}")
+        with profile_phase("delete"):
+            deleted = delete_source_folders(
+                delete_targets, index, root_dir, journal, rename_map, args.scan_threads
+            )
         print(f"已删除 {deleted} 个源文件夹")
+    journal.finish()
 
+    if args.cache_stats:
+        print_cache_stats()
+    if _profiler is not None:
+        _profiler.report(Path(args.profile_report) if args.profile_report else None)
     print("\n" + "=" * 60)
     print("处理完成！")
     print("=" * 60)
     wait_for_exit()
+    # 有打包失败的文件夹时以非零状态退出（与 --verify 一致），供脚本 / 基准测试判断
+    if fail_folders:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1268,6 +5235,11 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n\n操作已被用户中断。")
         wait_for_exit()
+        sys.exit(130)
     except Exception as e:
         print(f"\n发生错误: {e}")
         wait_for_exit()
+        sys.exit(1)
+    finally:
+        close_page_cache()
+        close_catalog()
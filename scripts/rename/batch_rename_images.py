@@ -13,9 +13,11 @@
 5. 选择移动（删除子文件夹）或复制（保留子文件夹）文件到根目录
 
 使用方法：
-python batch_rename_images.py [根目录]
+python batch_rename_images.py [根目录] [--scan-threads N]
 - 不传参数时默认处理脚本所在目录（即把脚本放在目标文件夹根目录下运行）
 - 传入参数时处理指定目录
+- --scan-threads N：并发扫描目录的线程数（缺省 8；SMB/NFS 网络共享上可调大，
+  1 为逐目录扫描），扫描结束显示速率（目录/秒）
 - 本脚本仅依赖标准库，任何装有 Python 的环境均可直接运行；
   也可用 uv 统一运行（自动选择合适的 Python 版本）：
     uv run batch_rename_images.py
@@ -40,10 +42,13 @@ python batch_rename_images.py [根目录]
   请使用复制模式或在文件夹内原地重命名
 """
 
+import argparse
+import os
 import platform
 import re
 import shutil
-import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
 # 支持的图片格式
@@ -144,32 +149,88 @@ def get_image_files(directory: Path, sort_option: str = "name_asc") -> list[Path
     return apply_sort(image_files, sort_option)
 
 
-def scan_subdirectories(root_dir: Path, sort_option: str = "name_asc") -> dict[Path, list[Path]]:
+def walk_directories(root: Path, list_dir, threads: int = 1):
+    """
+    并发遍历目录树：list_dir(目录) -> (子目录列表, 结果)，逐个产出 (目录, 结果)
+
+    threads > 1 时用线程池同时列出多个目录（列目录 / stat 在等待 I/O 时释放 GIL），
+    NAS / SMB / NFS 上每次列目录的网络往返可以重叠，不再按目录数串行累加；
+    产出顺序为完成顺序，调用方自行排序。无法读取的目录（OSError）静默跳过
+
+    注意：与 batch_pack_cbz.py 中的 walk_directories 逐字相同（两个脚本各自独立运行，
+    不共享模块），修改时必须同时修改两处
+    """
+    if threads <= 1:
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                subdirs, result = list_dir(directory)
+            except OSError:
+                continue
+            stack.extend(subdirs)
+            yield directory, result
+        return
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = {pool.submit(list_dir, root): root}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory = pending.pop(future)
+                try:
+                    subdirs, result = future.result()
+                except OSError:
+                    continue
+                for sub in subdirs:
+                    pending[pool.submit(list_dir, sub)] = sub
+                yield directory, result
+
+
+def scan_subdirectories(
+    root_dir: Path,
+    sort_option: str = "name_asc",
+    threads: int = 1,
+    stats: dict | None = None,
+) -> dict[Path, list[Path]]:
     """
     递归扫描根目录下的所有子文件夹及其包含的图片（支持多层嵌套）
 
     Args:
         root_dir: 根目录路径
         sort_option: 图片排序方式
+        threads: 并发列目录的线程数（>1 时多个目录同时扫描，适合网络共享）
+        stats: 传入 dict 时填入 "dirs"（扫描目录数）与 "seconds"（用时）
 
     Returns:
-        字典，键为子文件夹路径，值为该文件夹中已排序的图片文件列表
+        字典，键为子文件夹路径（按路径逐级自然排序，即深度优先、同级按名称），
+        值为该文件夹中已排序的图片文件列表
     """
-    subdirs_images: dict[Path, list[Path]] = {}
-
-    def scan_recursive(directory: Path):
-        """递归扫描目录"""
-        for item in sorted(directory.iterdir(), key=lambda p: natural_key(p.name)):
-            if item.is_dir():
-                # 获取当前目录的图片
-                images = get_image_files(item, sort_option)
-                if images:
-                    subdirs_images[item] = images
-                # 递归扫描子目录
-                scan_recursive(item)
 
-    scan_recursive(root_dir)
-    return subdirs_images
+    def list_dir(directory: Path) -> tuple[list[Path], list[Path]]:
+        """列出单个目录：返回 (子目录列表, 已排序的图片列表)"""
+        subdirs: list[Path] = []
+        images: list[Path] = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir():
+                    subdirs.append(Path(entry.path))
+                elif entry.is_file() and Path(entry.name).suffix.lower() in IMAGE_EXTENSIONS:
+                    images.append(Path(entry.path))
+        return subdirs, apply_sort(images, sort_option)
+
+    start = time.perf_counter()
+    found: list[tuple[Path, list[Path]]] = []
+    dirs = 0
+    for directory, images in walk_directories(root_dir, list_dir, threads):
+        dirs += 1
+        if directory != root_dir and images:
+            found.append((directory, images))
+    # 按相对路径逐级自然排序，与逐层递归（同级按名称升序）的顺序一致
+    found.sort(key=lambda item: [natural_key(p) for p in item[0].relative_to(root_dir).parts])
+    if stats is not None:
+        stats["dirs"] = dirs
+        stats["seconds"] = time.perf_counter() - start
+    return dict(found)
 
 
 def generate_new_filename(
@@ -327,6 +388,16 @@ def _handle_parenthesis_suffix(target_dir: Path, name_part: str, ext_part: str)
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="批量重命名并移动/复制图片文件")
+    parser.add_argument("root", nargs="?", default=None, help="根目录（缺省为脚本所在目录）")
+    parser.add_argument(
+        "--scan-threads",
+        type=int,
+        default=8,
+        help="并发扫描目录的线程数（缺省 8；NAS/网络共享可调大，1 为逐目录扫描）",
+    )
+    args = parser.parse_args()
+
     # 检测操作系统
     system_name = platform.system()
     print("=" * 60)
@@ -336,7 +407,7 @@ def main():
     print()
 
     # 获取根目录：优先命令行参数，缺省为脚本所在目录
-    root_dir = Path(sys.argv[1]).resolve() if len(sys.argv) > 1 else Path(__file__).resolve().parent
+    root_dir = Path(args.root).resolve() if args.root else Path(__file__).resolve().parent
     root_name = root_dir.name
 
     if not root_dir.is_dir():
@@ -363,7 +434,13 @@ def main():
 
     # 扫描子文件夹
     print("正在扫描子文件夹...")
-    subdirs_images = scan_subdirectories(root_dir, sort_option)
+    scan_stats: dict = {}
+    subdirs_images = scan_subdirectories(root_dir, sort_option, args.scan_threads, scan_stats)
+    rate = scan_stats["dirs"] / max(scan_stats["seconds"], 1e-6)
+    print(
+        f"扫描 {scan_stats['dirs']} 个目录，用时 {scan_stats['seconds']:.2f} 秒"
+        f"（{rate:.0f} 目录/秒）"
+    )
 
     if not subdirs_images:
         print("未找到包含图片的子文件夹！")
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "Pillow",
+# ]
+# ///
+"""
+batch_pack_cbz.py 基准测试脚本
+
+功能：
+1. 生成合成漫画库：可配置系列数、每系列卷数、一层 / 两层结构、每卷页数、图片格式、
+   分辨率与单页字节数（页面为极小但有效的 JPEG / PNG / WebP，按需填充到指定大小）
+2. 对 batch_pack_cbz.py 运行计时场景，输出表格并写入 JSON 结果文件
+
+场景：
+- scan      进程内调用 scan_library + find_comic_folders（--scan-threads 1 与 8 两种）
+- micro     进程内调用 read_image_size / build_comic_info_xml / create_cbz
+- dry-run   子进程运行 --dry-run（完整启动、扫描、元数据推导与预览）
+- pack      子进程运行打包（-k，覆盖已有 CBZ）
+- update    子进程运行 --update（原地修补 ComicInfo.xml）
+- delete    子进程运行打包并删除源文件夹（-d，每次在库的副本上运行，复制不计时）
+- infer     进程内调用 infer_volumes（系列级卷号推断），不读合成库：--infer-entries 条
+            （缺省 100000）、每系列 --infer-series 卷（缺省 1000，每系列一本无卷号），
+            另测 1/10 规模并报告峰值内存，用于确认时间与内存随条目数线性增长
+dry-run / pack / update 各有 cold / warm 两种变体：cold 每次删除页面元数据缓存
+（有权限时同时清空操作系统页缓存：Linux 下写 /proc/sys/vm/drop_caches，需要 root），
+warm 先运行一次预热、之后复用缓存
+
+使用方法：
+python bench_batch_pack_cbz.py [选项]
+  --workdir 目录      工作目录（缺省临时目录，结束时删除；指定时保留生成的库）
+  --out 文件          JSON 结果文件（缺省 bench_results.json）
+  --series N          系列数（缺省 20）
+  --volumes N         每系列卷数（缺省 3；--layout one 时为单本数 = series × volumes）
+  --layout {one,two}  one 每本漫画一个文件夹 / two 系列文件夹内嵌单卷文件夹（缺省 two）
+  --pages N           每卷页数（缺省 30）
+  --formats 列表      页面格式，逗号分隔并轮流使用：jpg,png,webp（缺省 jpg,png）
+  --size 宽x高        页面分辨率（缺省 1200x1700）
+  --page-kb N         每页填充到约 N KB（缺省 0 不填充；用于测量真实 I/O 量）
+  --repeat N          每个场景重复次数，报告最小值与中位数（缺省 3）
+  --scenarios 列表    逗号分隔，缺省全部：scan,micro,dry-run,pack,update,delete,infer
+  --jobs N            pack / delete 场景传给 -j（缺省 1）
+  --seed N            随机种子（缺省 0，相同参数生成完全相同的库）
+  --infer-entries N   infer 场景的条目数（缺省 100000）
+  --infer-series N    infer 场景每系列的卷数（缺省 1000）
+  --generate-only 目录  只生成合成库到指定目录，不运行基准
+
+示例：
+  uv run bench_batch_pack_cbz.py --series 50 --pages 40 --page-kb 300 --out nightly.json
+
+依赖：
+- PNG 页面由标准库直接生成；JPEG / WebP 页面需要 Pillow（每种灰度只编码一次，之后复用）
+- 与 batch_pack_cbz.py 位于同一目录（进程内场景直接导入该模块）
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+# Windows 下强制 UTF-8 输出
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8", errors="replace")
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PACK_SCRIPT = SCRIPT_DIR / "batch_pack_cbz.py"
+sys.path.insert(0, str(SCRIPT_DIR))
+import batch_pack_cbz as bpc  # noqa: E402
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - 便于给出友好提示
+    Image = None
+
+ALL_SCENARIOS = ["scan", "micro", "dry-run", "pack", "update", "delete", "infer"]
+# 页面灰度种类：同格式同灰度的编码结果只生成一次
+_SHADES = 16
+# 子进程运行打包脚本时的通用参数：不触发任何交互
+_NONINTERACTIVE = ["-y", "--lang", "skip", "--volume", "skip", "--conflict", "overwrite"]
+
+
+# ---- 合成页面 ----
+
+
+def _png_chunk(ctype: bytes, body: bytes) -> bytes:
+    return (
+        len(body).to_bytes(4, "big")
+        + ctype
+        + body
+        + zlib.crc32(body, zlib.crc32(ctype)).to_bytes(4, "big")
+    )
+
+
+def make_png(width: int, height: int, shade: int) -> bytes:
+    """纯标准库生成单色灰度 PNG（8 位灰度，整图同一灰度，压缩后很小）"""
+    row = b"\0" + bytes([shade]) * width
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + _png_chunk(b"IHDR", ihdr)
+        + _png_chunk(b"IDAT", zlib.compress(row * height, 9))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def make_page(fmt: str, width: int, height: int, shade: int) -> bytes:
+    """生成一页有效图片（jpg / png / webp）"""
+    if fmt == "png":
+        return make_png(width, height, shade)
+    if Image is None:
+        raise RuntimeError(f"生成 {fmt} 页面需要 Pillow")
+    buf = io.BytesIO()
+    Image.new("L", (width, height), shade).save(
+        buf, {"jpg": "JPEG", "webp": "WEBP"}[fmt], quality=80
+    )
+    return buf.getvalue()
+
+
+def pad_page(fmt: str, data: bytes, target: int, rng: random.Random) -> bytes:
+    """
+    用随机字节把页面填充到约 target 字节（使每页内容不同、CRC 计算与 I/O 量真实）
+
+    PNG 插入私有辅助块 paDd；JPEG / WebP 追加在 EOI / RIFF 之后（解码器忽略尾部数据）
+    """
+    extra = target - len(data)
+    if extra <= 12:
+        return data
+    if fmt == "png":
+        return data[:-12] + _png_chunk(b"paDd", rng.randbytes(extra - 12)) + data[-12:]
+    return data + rng.randbytes(extra)
+
+
+# ---- 合成漫画库 ----
+
+
+def generate_library(
+    root: Path,
+    series: int,
+    volumes: int,
+    layout: str,
+    pages: int,
+    formats: list[str],
+    size: tuple[int, int],
+    page_kb: int,
+    seed: int,
+) -> dict:
+    """
+    生成合成漫画库，返回统计 {"folders", "pages", "bytes"}
+
+    layout="two"：root/[作者N] 系列N/[作者N] 系列N V/001.jpg ...（两层，带卷号）
+    layout="one"：root/[作者N] 标题N-V/001.jpg ...（每本一个文件夹）
+    命名已符合 batch_pack_cbz.py 的规范（打包后不会重命名文件夹），便于重复运行
+    """
+    rng = random.Random(seed)
+    templates: dict[tuple[str, int], bytes] = {}
+    folders = total_pages = total_bytes = 0
+    root.mkdir(parents=True, exist_ok=True)
+    for s in range(1, series + 1):
+        for v in range(1, volumes + 1):
+            if layout == "two":
+                folder = root / f"[作者{s}] 系列{s}" / f"[作者{s}] 系列{s} {v}"
+            else:
+                folder = root / f"[作者{s}] 标题{s}-{v}"
+            folder.mkdir(parents=True, exist_ok=True)
+            folders += 1
+            for p in range(1, pages + 1):
+                fmt = formats[(folders + p) % len(formats)]
+                shade = rng.randrange(_SHADES) * (256 // _SHADES)
+                key = (fmt, shade)
+                if key not in templates:
+                    templates[key] = make_page(fmt, size[0], size[1], shade)
+                data = pad_page(fmt, templates[key], page_kb * 1024, rng)
+                (folder / f"{p:03d}.{fmt}").write_bytes(data)
+                total_pages += 1
+                total_bytes += len(data)
+    return {"folders": folders, "pages": total_pages, "bytes": total_bytes}
+
+
+# ---- 计时 ----
+
+
+def drop_os_cache() -> bool:
+    """尽力清空操作系统页缓存（Linux + root），返回是否成功"""
+    if sys.platform != "linux":
+        return False
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+    except OSError:
+        return False
+    return True
+
+
+def run_script(args: list[str]) -> None:
+    """子进程运行 batch_pack_cbz.py，退出码非零（有打包 / 更新失败或发生错误）时抛出 RuntimeError"""
+    proc = subprocess.run(
+        [sys.executable, str(PACK_SCRIPT), *args],
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(proc.stdout.splitlines()[-10:])
+        raise RuntimeError(f"batch_pack_cbz.py {' '.join(args)} 失败：\n{tail}\n{proc.stderr}")
+
+
+def measure(repeat: int, run, before=None) -> list[float]:
+    """重复 repeat 次：每次先调用 before()（不计时），再计时 run()，返回各次用时（秒）"""
+    times = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+class Bench:
+    """收集各场景结果并输出表格 / JSON"""
+
+    def __init__(self, workdir: Path, library: Path, stats: dict, args: argparse.Namespace):
+        self.workdir = workdir
+        self.library = library
+        self.stats = stats
+        self.args = args
+        self.cache_file = workdir / "page_cache.sqlite"
+        self.results: list[dict] = []
+        self.os_cache_dropped = False
+
+    def record(self, scenario: str, variant: str, times: list[float], units: dict | None = None):
+        """记录一个场景：units 为 {"folders": n, "pages": n, "bytes": n}（用于计算吞吐）"""
+        units = units or self.stats
+        best = min(times)
+        result = {
+            "scenario": scenario,
+            "variant": variant,
+            "runs": len(times),
+            "min_s": round(best, 4),
+            "median_s": round(statistics.median(times), 4),
+            "times_s": [round(t, 4) for t in times],
+        }
+        for key in ("folders", "pages", "bytes"):
+            if units.get(key):
+                result[key] = units[key]
+                result[f"{key}_per_s"] = round(units[key] / best, 1) if best > 0 else None
+        self.results.append(result)
+        rate = f"{units['pages'] / best:,.0f} 页/秒" if units.get("pages") and best > 0 else ""
+        print(
+            f"  {scenario:<8} {variant:<14} 最小 {best:8.3f}s  "
+            f"中位 {statistics.median(times):8.3f}s  {rate}"
+        )
+
+    def cold(self) -> None:
+        """cold 变体的准备：删除页面元数据缓存，尽力清空系统页缓存"""
+        for suffix in ("", "-wal", "-shm"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(f"{self.cache_file}{suffix}")
+        self.os_cache_dropped = drop_os_cache() or self.os_cache_dropped
+
+    def script_args(self, *extra: str) -> list[str]:
+        return [str(self.library), *_NONINTERACTIVE, "--cache-file", str(self.cache_file), *extra]
+
+    # ---- 场景 ----
+
+    def scan(self) -> None:
+        for threads in (1, 8):
+            times = measure(
+                self.args.repeat,
+                lambda t=threads: bpc.find_comic_folders(
+                    self.library, bpc.scan_library(self.library, t)
+                ),
+            )
+            self.record("scan", f"threads={threads}", times)
+
+    def micro(self) -> None:
+        index = bpc.scan_library(self.library, 8)
+        # 进程内未打开页面缓存：测量的是头部解析本身
+        images = [img for entry in index.values() for img, _ in entry["images"]]
+        times = measure(self.args.repeat, lambda: [bpc.read_image_size(img) for img in images])
+        self.record("micro", "read_image_size", times, {"pages": len(images)})
+
+        infos = [(1 << 20, 1200, 1700)] * self.args.pages
+        n = 1000
+        times = measure(
+            self.args.repeat,
+            lambda: [
+                bpc.build_comic_info_xml("标题", "系列", "作者", infos, volume=1, language_iso="ja")
+                for _ in range(n)
+            ],
+        )
+        self.record("micro", "build_xml×1000", times, {"folders": n, "pages": n * len(infos)})
+
+        folder, entry = next(iter(index.items()))
+        out = self.workdir / "micro.cbz"
+
+        def xml(image_infos: list[tuple[int, int | None, int | None]]) -> str:
+            return bpc.build_comic_info_xml(folder.name, "", "", image_infos)
+
+        times = measure(self.args.repeat, lambda: bpc.create_cbz(entry["images"], out, xml))
+        units = {
+            "folders": 1,
+            "pages": len(entry["images"]),
+            "bytes": sum(st.st_size for _, st in entry["images"]),
+        }
+        self.record("micro", "create_cbz", times, units)
+        out.unlink()
+
+    def dry_run(self) -> None:
+        args = self.script_args("-k", "--dry-run")
+        self.record(
+            "dry-run", "cold", measure(self.args.repeat, lambda: run_script(args), self.cold)
+        )
+        run_script(args)
+        self.record("dry-run", "warm", measure(self.args.repeat, lambda: run_script(args)))
+
+    def pack(self) -> None:
+        args = self.script_args("-k", "-j", str(self.args.jobs))
+        self.record("pack", "cold", measure(self.args.repeat, lambda: run_script(args), self.cold))
+        run_script(args)
+        self.record("pack", "warm", measure(self.args.repeat, lambda: run_script(args)))
+
+    def update(self) -> None:
+        # 需要已有 CBZ：pack 场景未运行时先打包一次（不计时）
+        if not any(self.library.rglob("*.cbz")):
+            run_script(self.script_args("-k"))
+        args = self.script_args("-u")
+        self.record(
+            "update", "cold", measure(self.args.repeat, lambda: run_script(args), self.cold)
+        )
+        run_script(args)
+        self.record("update", "warm", measure(self.args.repeat, lambda: run_script(args)))
+
+    def delete(self) -> None:
+        copy = self.workdir / "delete-copy"
+
+        def prepare() -> None:
+            shutil.rmtree(copy, ignore_errors=True)
+            shutil.copytree(self.library, copy)
+            for cbz in list(copy.rglob("*.cbz")):
+                cbz.unlink()
+
+        args = [str(copy), *_NONINTERACTIVE, "--no-cache", "-d", "-j", str(self.args.jobs)]
+        self.record(
+            "delete", "pack+delete", measure(self.args.repeat, lambda: run_script(args), prepare)
+        )
+        shutil.rmtree(copy, ignore_errors=True)
+
+    def infer(self) -> None:
+        total, per_series = self.args.infer_entries, max(1, self.args.infer_series)
+        for n in sorted({max(1, total // 10), total}):
+            # 两层结构的元数据：每系列第 1 本无卷号（应推断为 Vol.1），其余为 "系列篇 k"
+            # （系列名不以数字结尾，否则会被识别为卷号）
+            metas = []
+            for i in range(n):
+                series, vol = divmod(i, per_series)
+                title = f"系列{series}篇" if vol == 0 else f"系列{series}篇 {vol + 1}"
+                metas.append(
+                    {
+                        "folder": Path(f"/lib/s{series}/v{vol}"),
+                        "title": title,
+                        "series_key": f"/lib/s{series}",
+                    }
+                )
+            times = measure(self.args.repeat, lambda m=metas: bpc.infer_volumes(m))
+            self.record("infer", f"n={n}", times, {"folders": n})
+            tracemalloc.start()
+            volumes = bpc.infer_volumes(metas)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.results[-1]["peak_kb"] = peak // 1024
+            assert volumes[metas[0]["folder"]] == (1 if per_series > 1 else None)
+            print(f"  {'':<8} {'':<14} 峰值内存 {peak / (1 << 20):.1f} MB")
+
+    def write(self, out: Path) -> None:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pillow": Image is not None,
+            "os_cache_dropped": self.os_cache_dropped,
+            "library": {
+                "series": self.args.series,
+                "volumes": self.args.volumes,
+                "layout": self.args.layout,
+                "pages_per_volume": self.args.pages,
+                "formats": self.args.formats,
+                "size": self.args.size,
+                "page_kb": self.args.page_kb,
+                "seed": self.args.seed,
+                **self.stats,
+            },
+            "jobs": self.args.jobs,
+            "results": self.results,
+        }
+        out.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def parse_size(text: str) -> tuple[int, int]:
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="batch_pack_cbz.py 基准测试与合成漫画库生成")
+    parser.add_argument("--workdir", default=None, help="工作目录（缺省临时目录，结束时删除）")
+    parser.add_argument("--out", default="bench_results.json", help="JSON 结果文件")
+    parser.add_argument("--series", type=int, default=20, help="系列数")
+    parser.add_argument("--volumes", type=int, default=3, help="每系列卷数")
+    parser.add_argument("--layout", choices=["one", "two"], default="two", help="一层 / 两层结构")
+    parser.add_argument("--pages", type=int, default=30, help="每卷页数")
+    parser.add_argument("--formats", default="jpg,png", help="页面格式（逗号分隔：jpg,png,webp）")
+    parser.add_argument("--size", default="1200x1700", help="页面分辨率 宽x高")
+    parser.add_argument("--page-kb", type=int, default=0, help="每页填充到约 N KB（0 不填充）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景重复次数")
+    parser.add_argument("--scenarios", default=",".join(ALL_SCENARIOS), help="要运行的场景")
+    parser.add_argument("--jobs", type=int, default=1, help="pack / delete 场景的 -j")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--infer-entries", type=int, default=100_000, help="infer 场景条目数")
+    parser.add_argument("--infer-series", type=int, default=1000, help="infer 场景每系列卷数")
+    parser.add_argument("--generate-only", metavar="DIR", default=None, help="只生成合成库")
+    args = parser.parse_args()
+
+    formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+    unknown = set(formats) - {"jpg", "png", "webp"}
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    bad = set(scenarios) - set(ALL_SCENARIOS)
+    if unknown or bad or not formats:
+        parser.error(f"未知的格式或场景: {', '.join(sorted(unknown | bad)) or '（空）'}")
+    if Image is None and set(formats) - {"png"}:
+        parser.error("生成 JPEG / WebP 页面需要 Pillow（或使用 --formats png）")
+    gen_args = (
+        args.series,
+        args.volumes,
+        args.layout,
+        args.pages,
+        formats,
+        parse_size(args.size),
+        args.page_kb,
+        args.seed,
+    )
+
+    if args.generate_only:
+        start = time.perf_counter()
+        stats = generate_library(Path(args.generate_only), *gen_args)
+        print(
+            f"已生成 {stats['folders']} 个文件夹、{stats['pages']} 页、"
+            f"{stats['bytes'] / (1 << 20):.1f} MB（{time.perf_counter() - start:.1f} 秒）"
+        )
+        return
+
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench_cbz_"))
+    library = workdir / "library"
+    try:
+        shutil.rmtree(library, ignore_errors=True)
+        print(f"生成合成库: {library}")
+        stats = generate_library(library, *gen_args)
+        print(
+            f"  {stats['folders']} 个文件夹、{stats['pages']} 页、"
+            f"{stats['bytes'] / (1 << 20):.1f} MB"
+        )
+        bench = Bench(workdir, library, stats, args)
+        print(f"运行场景（每个 {args.repeat} 次）：")
+        for name in ALL_SCENARIOS:
+            if name in scenarios:
+                getattr(bench, name.replace("-", "_"))()
+        bench.write(Path(args.out))
+        print(f"结果已写入: {args.out}")
+        if not bench.os_cache_dropped and {"dry-run", "pack", "update"} & set(scenarios):
+            print("[提示] 无法清空系统页缓存（需要 Linux + root），cold 变体仅清空页面元数据缓存")
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()